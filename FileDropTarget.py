@@ -1,4 +1,10 @@
 import wx
+from folder_scanner import FolderScanner
+
+# Word 文档生成器接受的图片格式（按文件头识别，见 image_io.sniff_image_format），拖放和文件对话框共用
+DOC_IMAGE_FORMATS = ("JPEG", "PNG")
+
+
 class FileDropTarget(wx.FileDropTarget):
     """实现文件拖放功能的辅助类"""
 
@@ -6,9 +12,23 @@ class FileDropTarget(wx.FileDropTarget):
         """初始化目标 Frame"""
         super().__init__()
         self.frame = frame
+        # Word 文档只插入 JPEG / PNG；拖入的文件夹在后台递归扫描，按文件头识别格式
+        self.scanner = FolderScanner(formats=DOC_IMAGE_FORMATS)
+        # 扫描编号：取消后递增，已经通过 wx.CallAfter 排队的旧批次据此丢弃
+        self.generation = 0
 
     def OnDropFiles(self, x, y, filenames):
-        """处理拖放文件事件，仅接受图片格式"""
-        image_files = [f for f in filenames if f.lower().endswith(('.png', '.jpg', '.jpeg'))]
-        self.frame.add_images(image_files)
-        return True
\ No newline at end of file
+        """处理拖放文件事件，仅接受图片格式，识别出的图片分批加入列表"""
+        generation = self.generation
+        self.scanner.start(filenames, on_batch=lambda batch: wx.CallAfter(self.add_batch, generation, batch))
+        return True
+
+    def add_batch(self, generation, batch):
+        """在界面线程中加入一批扫描结果；扫描已被取消时丢弃"""
+        if generation == self.generation:
+            self.frame.add_images(batch)
+
+    def cancel(self):
+        """取消正在进行的扫描，并丢弃已排队但尚未加入列表的批次"""
+        self.generation += 1
+        self.scanner.cancel()
\ No newline at end of file
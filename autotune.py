@@ -0,0 +1,220 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+漂白参数自动调节
+
+在缩小后的代理图像上统计对比度、噪声和背景亮度，快速推算
+bg_strength / text_strength / gray_preservation / blur_size 以及自适应阈值的
+block_size / c。结果按“证件预设 + 输入文件指纹”缓存，同一份文档只需调节一次。
+"""
+import os
+import json
+import threading
+from collections import OrderedDict
+
+import cv2
+import numpy as np
+from loguru import logger
+
+from image_io import load_image, write_bytes
+
+# 代理图像的最长边（像素）
+PROXY_MAX_SIDE = 512
+
+# 各证件预设的基础参数：户口本纸张有底纹，背景去除需要更强
+PRESET_DEFAULTS = {
+    "hukou": {"bg_strength": 0.85, "text_strength": 1.3, "gray_preservation": 0.5, "blur_size": 5},
+    "id_card": {"bg_strength": 0.8, "text_strength": 1.2, "gray_preservation": 0.6, "blur_size": 3},
+    "student_card": {"bg_strength": 0.8, "text_strength": 1.2, "gray_preservation": 0.6, "blur_size": 5},
+    "custom": {"bg_strength": 0.8, "text_strength": 1.2, "gray_preservation": 0.6, "blur_size": 5},
+}
+
+
+def _clamp(value, low, high):
+    return max(low, min(high, value))
+
+
+def _odd(value):
+    value = int(round(value))
+    return value if value % 2 == 1 else value + 1
+
+
+def file_fingerprint(path):
+    """
+    计算输入文件指纹（绝对路径 + 修改时间 + 文件大小），文件被修改后指纹随之变化
+
+    参数:
+        path (str): 图片路径
+
+    返回:
+        str: 指纹字符串
+    """
+    stat = os.stat(path)
+    return f"{os.path.abspath(path)}|{stat.st_mtime_ns}|{stat.st_size}"
+
+
+def make_proxy(img, max_side=PROXY_MAX_SIDE):
+    """
+    生成用于统计的灰度代理图像
+
+    参数:
+        img (PIL.Image): 输入图像
+        max_side (int): 代理图像最长边
+
+    返回:
+        numpy.ndarray: 灰度代理图像
+    """
+    proxy = img.convert("L")
+    proxy.thumbnail((max_side, max_side))
+    return np.array(proxy)
+
+
+def measure_image_stats(gray):
+    """
+    统计代理图像的简单指标
+
+    参数:
+        gray (numpy.ndarray): 灰度图像
+
+    返回:
+        dict: contrast（1%~99% 分位亮度差）、noise（与中值滤波结果的平均差异）、
+              background（背景亮度，取 90% 分位）
+    """
+    low, high = np.percentile(gray, (1, 99))
+    noise = float(np.mean(cv2.absdiff(gray, cv2.medianBlur(gray, 3))))
+    return {
+        "contrast": float(high - low),
+        "noise": noise,
+        "background": float(np.percentile(gray, 90)),
+    }
+
+
+def tune_params(stats, preset="custom", target_width=None):
+    """
+    根据图像统计指标推算漂白参数
+
+    参数:
+        stats (dict): measure_image_stats 的结果
+        preset (str): 证件预设名称，见 PRESET_DEFAULTS
+        target_width (int): 全分辨率处理时的图像宽度（像素），用于确定阈值邻域大小
+
+    返回:
+        dict: 可直接传给 utils.apply_bleach_stage 的参数
+    """
+    params = dict(PRESET_DEFAULTS.get(preset, PRESET_DEFAULTS["custom"]))
+    contrast, noise, background = stats["contrast"], stats["noise"], stats["background"]
+
+    # 噪声越大模糊核越大
+    if noise < 2:
+        params["blur_size"] = 3
+    elif noise < 5:
+        params["blur_size"] = max(params["blur_size"], 5)
+    else:
+        params["blur_size"] = 7
+
+    # 背景越暗、越不均匀，背景去除越强
+    params["bg_strength"] = round(_clamp(params["bg_strength"] + (230 - background) / 250, 0.5, 0.95), 2)
+    # 对比度低时加强文字，同时少保留原图灰度
+    params["text_strength"] = round(_clamp(params["text_strength"] + (80 - contrast) / 200, 1.0, 1.8), 2)
+    params["gray_preservation"] = round(_clamp(params["gray_preservation"] + (contrast - 80) / 400, 0.3, 0.9), 2)
+
+    # 阈值邻域约为图像宽度的 1/40，C 随对比度和噪声增大
+    params["block_size"] = _odd(_clamp((target_width or 1400) / 40, 15, 75))
+    params["c"] = int(round(_clamp(contrast / 10 + noise, 5, 25)))
+    return params
+
+
+class AutoTuner:
+    """
+    带缓存的参数自动调节器
+
+    缓存键为 (预设, 文件指纹, 目标宽度)，可选地持久化到 JSON 文件，
+    同一份文档重复合并时直接复用已选参数。条目数超过上限时淘汰最久未使用的条目；
+    新增的条目只在调用 save() 时写入文件，一批图片处理完再保存一次即可。
+    """
+
+    def __init__(self, cache_path=None, max_entries=5000):
+        """
+        参数:
+            cache_path (str): 缓存文件路径，为 None 时只在内存中缓存
+            max_entries (int): 缓存条目数的上限
+        """
+        self.cache_path = cache_path
+        self.max_entries = max_entries
+        self._cache = OrderedDict()
+        self._dirty = False
+        self._lock = threading.Lock()
+        if cache_path and os.path.exists(cache_path):
+            try:
+                with open(cache_path, "r", encoding="utf-8") as f:
+                    self._cache = OrderedDict(json.load(f))
+                self._evict()
+            except Exception as e:
+                logger.error(f"读取参数缓存失败：{e}")
+
+    def _evict(self):
+        # 文件中的条目按最近使用的顺序保存，超出上限时从最旧的开始淘汰
+        while len(self._cache) > self.max_entries:
+            self._cache.popitem(last=False)
+            self._dirty = True
+
+    @staticmethod
+    def _key(preset, fingerprint, target_width):
+        return f"{preset}|{target_width}|{fingerprint}"
+
+    def params_for(self, path, preset="custom", target_width=None):
+        """
+        获取图片的漂白参数，命中缓存时不读取图像
+
+        参数:
+            path (str): 图片路径
+            preset (str): 证件预设名称
+            target_width (int): 全分辨率处理时的图像宽度（像素）
+
+        返回:
+            dict: 漂白参数
+        """
+        key = self._key(preset, file_fingerprint(path), target_width)
+        with self._lock:
+            if key in self._cache:
+                self._cache.move_to_end(key)
+                return dict(self._cache[key])
+
+        # 合并时已解码的图像直接从共享缓存取得；否则 JPEG 以低分辨率解码，避免为统计指标解码整张原图
+        img = load_image(path, (PROXY_MAX_SIDE, PROXY_MAX_SIDE))
+        params = self.params_for_image(img, preset, target_width)
+
+        with self._lock:
+            self._cache[key] = params
+            self._dirty = True
+            self._evict()
+        return dict(params)
+
+    @staticmethod
+    def params_for_image(img, preset="custom", target_width=None):
+        """对已打开的图像直接推算参数（不使用缓存）"""
+        stats = measure_image_stats(make_proxy(img))
+        params = tune_params(stats, preset, target_width)
+        logger.debug(f"自动参数：{stats} -> {params}")
+        return params
+
+    def save(self):
+        """将缓存写入 JSON 文件（先写临时文件再改名，中断时不会留下损坏的缓存），没有新条目时不写"""
+        if not self.cache_path:
+            return
+        with self._lock:
+            if not self._dirty:
+                return
+            data = json.dumps(self._cache, ensure_ascii=False, indent=1)
+            self._dirty = False
+        try:
+            write_bytes(self.cache_path, data.encode("utf-8"))
+        except Exception as e:
+            with self._lock:
+                self._dirty = True
+            logger.error(f"保存参数缓存失败：{e}")
+
+    def clear(self):
+        with self._lock:
+            self._cache.clear()
+            self._dirty = True
@@ -0,0 +1,248 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+无界面的图片生成 Word 工具
+
+与图片生成 Word 界面使用相同的图片准备和文档写出流程：图片在线程池中并行缩小、重新压缩，
+按输入顺序逐张写入 .docx（输出为 .pdf 时以相同的版式写成 PDF），可在服务器上批量生成报告，
+结束时输出各阶段耗时。
+
+命令行示例:
+    python batch_doc.py 报告图片目录 -o 报告.docx --dpi 200 --margin 1.27 --workers 8
+    python batch_doc.py 发票目录 -o 发票.docx --columns 2 --rows 3 --margin 1
+"""
+import sys
+import time
+import argparse
+from dataclasses import dataclass, field
+from typing import Dict, List, Tuple
+
+from loguru import logger
+
+from doc_images import DEFAULT_DOC_DPI, fit_size_cm, iter_doc_images, format_size_saving
+from docx_writer import IMAGE_CONTENT_TYPES, DocxStreamWriter
+from folder_scanner import iter_image_files
+from image_probe import probe_file
+from merge_export import ExportCancelled, PdfDocWriter
+from merge_layout import DPI, LAYOUT_STRATEGIES, ORDERED_STRATEGIES, PRESET_SIZES_MM, mm_to_pixel
+
+# 图片高度比可用高度略小，避免 Word 因行高舍入把图片挤到下一页
+HEIGHT_MARGIN_CM = 0.2
+
+
+@dataclass
+class DocReport:
+    """一次无界面生成 Word 文档的结果"""
+    images: int                      # 输入图片数
+    pictures: int                    # 插入文档的图片数
+    original_bytes: int              # 插入图片的原图大小合计
+    output_bytes: int                # 插入文档的图片数据大小合计
+    pages: int = 0                   # 一页多张时的页数，每张单独一段时为 0（由 Word 自动分页）
+    failed: List[Tuple[str, str]] = field(default_factory=list)  # (图片路径, 失败原因)
+    timings: Dict[str, float] = field(default_factory=dict)      # 各阶段耗时（秒）
+
+
+def doc_cell_size(page_width_cm=21.0, page_height_cm=29.7, margin_cm=0, columns=1, rows=None, preset=None,
+                  gap_cm=0.5):
+    """
+    计算每张图片可占用的单元格尺寸，图片在单元格内等比缩放
+
+    参数:
+        page_width_cm (float): 页面宽度（厘米）
+        page_height_cm (float): 页面高度（厘米）
+        margin_cm (float): 页边距（厘米）
+        columns (int): 每行图片数
+        rows (int): 每页行数，为 None 时单元格高度不限（不超过版心高度）
+        preset (str): 证件预设（见 merge_layout.PRESET_SIZES_MM），指定时按证件实际尺寸，忽略 columns / rows
+        gap_cm (float): 图片间距（厘米）
+
+    返回:
+        tuple: 单元格 (宽, 高) 厘米
+
+    异常:
+        ValueError: 页边距或间距过大，页面上放不下单元格
+    """
+    content_width = page_width_cm - 2 * margin_cm
+    content_height = page_height_cm - 2 * margin_cm - HEIGHT_MARGIN_CM
+    if preset:
+        cell = tuple(size_mm / 10 for size_mm in PRESET_SIZES_MM[preset])
+    else:
+        cell = ((content_width - (columns - 1) * gap_cm) / columns,
+                (content_height - (rows - 1) * gap_cm) / rows if rows else content_height)
+    if min(cell) <= 0 or cell[0] > content_width or cell[1] > content_height:
+        raise ValueError("页边距或间距过大，页面上没有可放置图片的空间")
+    return cell
+
+
+def layout_doc_pages(sizes_cm, content_size_cm, gap_cm=0.5, strategy="rows"):
+    """
+    用合并器的排版引擎把图片排到页面上
+
+    参数:
+        sizes_cm (list[tuple]): 每张图片的显示 (宽, 高) 厘米
+        content_size_cm (tuple): 版心 (宽, 高) 厘米
+        gap_cm (float): 图片间距（厘米）
+        strategy (str): 排版策略，见 merge_layout.ORDERED_STRATEGIES
+
+    返回:
+        list[PageLayout]: 每页的排版结果（版心内的像素坐标，分辨率为 merge_layout.DPI）
+    """
+    if strategy not in ORDERED_STRATEGIES:
+        raise ValueError(f"Word 文档需要保持图片顺序的排版策略：{', '.join(ORDERED_STRATEGIES)}")
+    item_sizes = [(mm_to_pixel(width * 10), mm_to_pixel(height * 10)) for width, height in sizes_cm]
+    page_size = (mm_to_pixel(content_size_cm[0] * 10), mm_to_pixel(content_size_cm[1] * 10))
+    return LAYOUT_STRATEGIES[strategy](item_sizes, page_size, mm_to_pixel(gap_cm * 10))
+
+
+def build_word_document(inputs, output, page_width_cm=21.0, page_height_cm=29.7, margin_cm=0,
+                        dpi=DEFAULT_DOC_DPI, jpeg_quality=85, workers=None, progress=None, columns=1, rows=None,
+                        preset=None, gap_cm=0.5, strategy="rows", cancel_event=None):
+    """
+    把图片插入 Word 文档：默认每张图片占满版心宽度（过高时按版心高度等比缩小），单独占一个段落；
+    指定 columns / rows / preset 时按单元格等比缩放，用合并器的排版引擎一页排多张
+
+    参数:
+        inputs (list[str]): 图片文件或包含图片的目录（递归扫描，按文件头识别格式，按自然顺序排列）
+        output (str): 输出 .docx 路径；扩展名为 .pdf 时按相同的排版和图片分辨率写成 PDF
+        page_width_cm (float): 页面宽度（厘米）
+        page_height_cm (float): 页面高度（厘米）
+        margin_cm (float): 上下左右页边距（厘米）
+        dpi (int): 图片目标 DPI，为 None 时插入原图
+        jpeg_quality (int): 重新压缩的 JPEG 质量
+        workers (int): 准备图片的线程数，默认为 CPU 核心数
+        progress (callable): 进度回调 progress(已完成数量, 总数)
+        columns (int): 每行图片数
+        rows (int): 每页行数，为 None 时不限
+        preset (str): 按证件实际尺寸排版，见 merge_layout.PRESET_SIZES_MM
+        gap_cm (float): 一页多张时的图片间距（厘米）
+        strategy (str): 一页多张时的排版策略，见 merge_layout.ORDERED_STRATEGIES
+        cancel_event (threading.Event): 置位后在下一张图片写入前停止，并删除未完成的文档
+
+    返回:
+        DocReport: 生成结果
+
+    异常:
+        ValueError: 没有找到图片、页边距过大或排版策略不保持顺序
+        merge_export.ExportCancelled: 生成被取消
+    """
+    start_time = time.perf_counter()
+    # 格式不支持的图片和不是图片的文件记为失败，与读取失败的图片一起报告
+    rejected = []
+    paths = list(iter_image_files(inputs, formats=tuple(IMAGE_CONTENT_TYPES), rejected=rejected))
+    if not paths:
+        detail = f"：{rejected[0][0]}：{rejected[0][1]}" if rejected else ""
+        raise ValueError(f"没有找到可插入 Word 的图片{detail}")
+    multiple = columns > 1 or rows is not None or preset is not None
+    cell_width, cell_height = doc_cell_size(page_width_cm, page_height_cm, margin_cm, columns, rows, preset,
+                                            gap_cm)
+    timings = {"collect": time.perf_counter() - start_time}
+
+    report = DocReport(len(paths) + len(rejected), 0, 0, 0, failed=rejected, timings=timings)
+    placements = {}  # 序号 -> (是否为本页最后一张, Placement)
+    if multiple:
+        # 排版只需图片尺寸：只读取文件头，不解码
+        start_time = time.perf_counter()
+        sizes_cm = []
+        laid_out = []
+        for path in paths:
+            try:
+                sizes_cm.append(fit_size_cm(probe_file(path).display_size, cell_width, cell_height))
+                laid_out.append(path)
+            except (OSError, ValueError) as e:
+                report.failed.append((path, str(e)))
+        paths = laid_out
+        content_size = (page_width_cm - 2 * margin_cm, page_height_cm - 2 * margin_cm)
+        pages = layout_doc_pages(sizes_cm, content_size, gap_cm, strategy)
+        for page in pages:
+            for placement in page.placements:
+                placements[placement.index] = (placement is page.placements[-1], placement)
+        timings["layout"] = time.perf_counter() - start_time
+
+    # 准备与写出交替进行：prepare 为等待线程池产出的时间，write 为写入文档的时间
+    prepare_seconds = write_seconds = 0.0
+    writer = PdfDocWriter if output.lower().endswith(".pdf") else DocxStreamWriter
+    page_has_pictures = False  # 当前页是否已写入图片；整页图片都失败时不结束空白页
+    with writer(output, page_width_cm, page_height_cm, margin_cm) as doc:
+        images = iter_doc_images(paths, dpi, jpeg_quality, workers, width_cm=cell_width,
+                                 max_height_cm=cell_height)
+        while True:
+            start_time = time.perf_counter()
+            doc_image = next(images, None)
+            prepare_seconds += time.perf_counter() - start_time
+            if doc_image is None:
+                break
+            if cancel_event is not None and cancel_event.is_set():
+                raise ExportCancelled()
+            start_time = time.perf_counter()
+            if doc_image.ok:
+                try:
+                    if multiple:
+                        # 排版坐标在版心内，加上页边距得到相对页面的位置
+                        placement = placements[doc_image.index][1]
+                        x_cm = margin_cm + placement.x * 2.54 / DPI
+                        y_cm = margin_cm + placement.y * 2.54 / DPI
+                        doc.add_positioned_picture(doc_image.source, x_cm, y_cm, doc_image.width_cm,
+                                                   doc_image.height_cm, doc_image.orientation)
+                    else:
+                        doc.add_picture(doc_image.source, doc_image.width_cm, doc_image.height_cm,
+                                        doc_image.orientation)
+                    report.pictures += 1
+                    page_has_pictures = True
+                    report.original_bytes += doc_image.original_bytes
+                    report.output_bytes += doc_image.output_bytes
+                except ValueError as e:
+                    report.failed.append((doc_image.path, str(e)))
+            else:
+                report.failed.append((doc_image.path, doc_image.error))
+            if multiple and placements[doc_image.index][0] and page_has_pictures:
+                doc.end_page()
+                report.pages += 1
+                page_has_pictures = False
+            write_seconds += time.perf_counter() - start_time
+            if progress:
+                progress(doc_image.index + 1, len(paths))
+        start_time = time.perf_counter()
+    write_seconds += time.perf_counter() - start_time
+    timings["prepare"] = prepare_seconds
+    timings["write"] = write_seconds
+    return report
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="无界面把图片生成 Word 文档")
+    parser.add_argument("inputs", nargs="+", help="图片文件或包含图片的目录")
+    parser.add_argument("-o", "--output", required=True, help="输出 .docx 文件，扩展名为 .pdf 时写成 PDF")
+    parser.add_argument("--page-width", type=float, default=21.0, help="页面宽度（厘米），默认 A4")
+    parser.add_argument("--page-height", type=float, default=29.7, help="页面高度（厘米），默认 A4")
+    parser.add_argument("--margin", type=float, default=0, help="页边距（厘米）")
+    parser.add_argument("--dpi", type=int, default=DEFAULT_DOC_DPI, help="图片目标 DPI，0 表示插入原图")
+    parser.add_argument("--jpeg-quality", type=int, default=85, help="重新压缩的 JPEG 质量")
+    parser.add_argument("--workers", type=int, default=None, help="线程数，默认为 CPU 核心数")
+    parser.add_argument("--columns", type=int, default=1, help="每行图片数，大于 1 时一页排多张")
+    parser.add_argument("--rows", type=int, default=None, help="每页行数，默认不限")
+    parser.add_argument("--preset", choices=list(PRESET_SIZES_MM), default=None, help="按证件实际尺寸一页排多张")
+    parser.add_argument("--gap", type=float, default=0.5, help="一页多张时的图片间距（厘米）")
+    parser.add_argument("--layout", choices=list(ORDERED_STRATEGIES), default="rows", help="一页多张时的排版策略")
+    args = parser.parse_args(argv)
+
+    try:
+        report = build_word_document(args.inputs, args.output, args.page_width, args.page_height, args.margin,
+                                     args.dpi or None, args.jpeg_quality, args.workers, columns=args.columns,
+                                     rows=args.rows, preset=args.preset, gap_cm=args.gap, strategy=args.layout)
+    except ValueError as e:
+        logger.error(str(e))
+        return 1
+
+    for path, error in report.failed:
+        logger.error(f"插入图片失败：{path}：{error}")
+    pages = f"，{report.pages} 页" if report.pages else ""
+    print(f"共 {report.images} 张图片，插入 {report.pictures} 张{pages}，失败 {len(report.failed)} 张")
+    print(format_size_saving(report.original_bytes, report.output_bytes))
+    for stage, seconds in report.timings.items():
+        print(f"{stage:<8} {seconds:.3f} 秒")
+    print(f"{'total':<8} {sum(report.timings.values()):.3f} 秒")
+    return 1 if report.failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,221 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+批量图片漂白 / 增强工具
+
+通过进程池并行处理整个文件夹的图片，同时限制在途任务数量，
+结果按输入顺序逐个返回，单张图片失败不会中断整个批次。
+
+命令行示例:
+    python batch_enhance.py 扫描件目录 -o 输出目录 --stage bleach --workers 4
+"""
+import os
+import sys
+import time
+import argparse
+import tempfile
+import multiprocessing
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+from typing import Optional
+
+from PIL import Image
+from loguru import logger
+
+from utils import BLEACH_STAGES, apply_bleach_stage, check_bleach_params
+from autotune import AutoTuner
+from folder_scanner import iter_image_files
+from image_io import FORMAT_EXTENSIONS, sniff_image_format
+from image_probe import probe_file
+
+# 自动参数的默认缓存文件，重复处理同一批图片时不再统计
+AUTOTUNE_CACHE_PATH = os.path.join(tempfile.gettempdir(), "document_tools_autotune.json")
+
+
+@dataclass
+class EnhanceResult:
+    """单张图片的处理结果"""
+    index: int                       # 在输入列表中的序号
+    path: str                        # 输入图片路径
+    output_path: Optional[str]       # 输出文件路径（未指定输出目录时为 None）
+    image: Optional[Image.Image]     # 处理后的图像（指定输出目录时为 None，避免跨进程传输像素）
+    elapsed: float                   # 处理耗时（秒）
+    error: Optional[str] = None      # 失败原因，成功时为 None
+
+    @property
+    def ok(self):
+        return self.error is None
+
+
+def output_paths_for(paths, output_dir):
+    """
+    每张图片的输出路径：输出目录下的同名文件；不同目录中的同名图片依次加上 _2、_3 …… 后缀，
+    避免互相覆盖（按不区分大小写比较，与 Windows 文件系统一致）。
+    图片按文件头识别，没有图片扩展名的文件按识别出的格式补上扩展名，保存时据此选择格式
+
+    参数:
+        paths (list[str]): 图片路径列表
+        output_dir (str): 输出目录
+
+    返回:
+        list[str]: 与 paths 一一对应的输出路径
+    """
+    used = set()
+    result = []
+    for path in paths:
+        name = os.path.basename(path)
+        root, ext = os.path.splitext(name)
+        if not any(ext.lower() in extensions for extensions in FORMAT_EXTENSIONS.values()):
+            fmt = sniff_image_format(path)
+            if fmt is not None:
+                root, ext = name, FORMAT_EXTENSIONS[fmt][0]
+                name = root + ext
+        number = 1
+        while name.lower() in used:
+            number += 1
+            name = f"{root}_{number}{ext}"
+        used.add(name.lower())
+        result.append(os.path.join(output_dir, name))
+    return result
+
+
+def _enhance_one(index, path, stage, params, output_path):
+    """在工作进程中处理单张图片，所有异常都转换为结果中的错误信息"""
+    start_time = time.perf_counter()
+    try:
+        with Image.open(path) as img:
+            result = apply_bleach_stage(img, stage, params)
+        if output_path:
+            result.save(output_path)
+            result = None
+        return EnhanceResult(index, path, output_path, result, time.perf_counter() - start_time)
+    except Exception as e:
+        return EnhanceResult(index, path, None, None, time.perf_counter() - start_time, str(e))
+
+
+def _result(item):
+    """在途队列中的条目：进程池任务，或在主进程中已确定失败的结果"""
+    return item if isinstance(item, EnhanceResult) else item.result()
+
+
+def enhance_batch(paths, stage="bleach", params=None, workers=None, output_dir=None, max_in_flight=None,
+                  tuner=None):
+    """
+    使用进程池批量处理图片，按输入顺序逐个产出结果
+
+    参数:
+        paths (list[str]): 图片路径列表
+        stage (str|int): 漂白阶段，见 utils.BLEACH_STAGES
+        params (dict|str): 传给处理函数的参数；为 "auto" 时按每张图片的统计指标自动选择
+        workers (int): 工作进程数，默认为 CPU 核心数；为 1 时在当前进程内顺序处理
+        output_dir (str): 输出目录，指定后结果写入文件而不在进程间传输图像；同名图片见 output_paths_for
+        max_in_flight (int): 同时提交给进程池的最大任务数，默认为 workers 的 2 倍
+        tuner (autotune.AutoTuner): params 为 "auto" 时使用的参数调节器，默认只在内存中缓存；
+                                    自动参数在主进程中按缩小的代理图像推算，整批结束时由主进程保存一次缓存文件
+
+    返回:
+        generator[EnhanceResult]: 按输入顺序产出的处理结果
+    """
+    if isinstance(stage, str) and stage not in BLEACH_STAGES:
+        raise ValueError(f"未知的漂白阶段：{stage}")
+    if params != "auto":
+        check_bleach_params(params)
+    workers = workers or os.cpu_count() or 1
+    max_in_flight = max(max_in_flight or workers * 2, 1)
+    output_paths = [None] * len(paths)
+    if output_dir:
+        os.makedirs(output_dir, exist_ok=True)
+        output_paths = output_paths_for(paths, output_dir)
+    if params == "auto" and tuner is None:
+        tuner = AutoTuner()
+
+    def task_params(index, path):
+        """返回 (参数, None)；自动参数推算失败时返回 (None, 失败结果)"""
+        if params != "auto":
+            return params, None
+        try:
+            # 阈值邻域按全分辨率宽度确定（工作进程处理的是未按 EXIF 旋转的像素），宽度只读取文件头
+            return tuner.params_for(path, "custom", probe_file(path).width), None
+        except Exception as e:
+            return None, EnhanceResult(index, path, None, None, 0.0, f"自动参数失败：{e}")
+
+    try:
+        if workers == 1:
+            for index, path in enumerate(paths):
+                item_params, failed = task_params(index, path)
+                yield failed or _enhance_one(index, path, stage, item_params, output_paths[index])
+            return
+
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            pending = deque()
+            for index, path in enumerate(paths):
+                item_params, failed = task_params(index, path)
+                pending.append(failed or executor.submit(_enhance_one, index, path, stage, item_params,
+                                                         output_paths[index]))
+                # 在途任务达到上限时先取回最早的结果，既限制内存又保持输出顺序
+                if len(pending) >= max_in_flight:
+                    yield _result(pending.popleft())
+            while pending:
+                yield _result(pending.popleft())
+    finally:
+        # 整批结束（或提前停止）时保存一次新推算的自动参数
+        if tuner is not None:
+            tuner.save()
+
+
+def parse_param(text):
+    """解析 key=value 形式的参数，数值自动转换为 int / float"""
+    key, sep, value = text.partition("=")
+    if not sep:
+        raise argparse.ArgumentTypeError(f"参数格式应为 key=value：{text}")
+    for cast in (int, float):
+        try:
+            return key, cast(value)
+        except ValueError:
+            pass
+    return key, value
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="批量漂白 / 增强图片")
+    parser.add_argument("inputs", nargs="+", help="图片文件或包含图片的目录")
+    parser.add_argument("-o", "--output", required=True, help="输出目录")
+    parser.add_argument("--stage", choices=list(BLEACH_STAGES), default="bleach", help="处理阶段")
+    parser.add_argument("--param", action="append", type=parse_param, default=[],
+                        help="处理参数，如 blur_size=5，可重复指定")
+    parser.add_argument("--auto-tune", action="store_true", help="根据每张图片的统计指标自动选择参数")
+    parser.add_argument("--tune-cache", default=AUTOTUNE_CACHE_PATH,
+                        help="自动参数缓存文件，空字符串表示不保存")
+    parser.add_argument("--workers", type=int, default=None, help="工作进程数，默认为 CPU 核心数")
+    args = parser.parse_args(argv)
+
+    paths = list(iter_image_files(args.inputs))
+    if not paths:
+        logger.error("没有找到可处理的图片")
+        return 1
+
+    start_time = time.perf_counter()
+    failed = 0
+    params = "auto" if args.auto_tune else dict(args.param)
+    tuner = AutoTuner(args.tune_cache or None) if args.auto_tune else None
+    try:
+        check_bleach_params(dict(args.param))
+    except ValueError as e:
+        logger.error(str(e))
+        return 1
+    for result in enhance_batch(paths, args.stage, params, args.workers, args.output, tuner=tuner):
+        if result.ok:
+            print(f"[{result.index + 1}/{len(paths)}] {result.path} -> {result.output_path} ({result.elapsed:.3f} 秒)")
+        else:
+            failed += 1
+            print(f"[{result.index + 1}/{len(paths)}] {result.path} 处理失败：{result.error} ({result.elapsed:.3f} 秒)")
+    total = time.perf_counter() - start_time
+    print(f"共 {len(paths)} 张，失败 {failed} 张，总耗时 {total:.2f} 秒")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    # Windows 下打包为可执行文件后使用进程池需要调用 freeze_support
+    multiprocessing.freeze_support()
+    sys.exit(main())
@@ -0,0 +1,135 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+无界面的证件图片合并工具
+
+与合并器界面使用相同的排版、准备和导出流程，可在服务器上批量合并或在 CI 中测试性能，
+结束时输出各阶段耗时。
+
+命令行示例:
+    python batch_merge.py 扫描件目录 -o 合并结果.pdf --preset id_card --gap 15 --bleach bleach --workers 4
+"""
+import sys
+import time
+import argparse
+from dataclasses import dataclass, field
+from typing import Dict, List, Tuple
+
+from loguru import logger
+
+from autotune import AutoTuner
+from batch_enhance import parse_param
+from folder_scanner import iter_image_files
+from merge_layout import DPI, PRESET_NAMES, LAYOUT_STRATEGIES, mm_to_pixel
+from merge_pipeline import MERGE_IMAGE_FORMATS, RESIZE_QUALITIES, PAGE_MODES, PrepareOptions, merge_pages
+from merge_export import EXPORT_FORMATS, export_pages
+from utils import BLEACH_STAGES, check_bleach_params
+
+
+@dataclass
+class MergeReport:
+    """一次无界面合并的结果"""
+    images: int                      # 输入图片数
+    pages: int                       # 页数
+    written: List[str]               # 写出的文件
+    timings: Dict[str, float] = field(default_factory=dict)  # 各阶段耗时（秒）
+    failed: List[Tuple[str, str]] = field(default_factory=list)  # (图片路径, 失败原因)
+
+
+def merge_documents(inputs, output, preset="id_card", width_mm=None, gap_mm=15, dpi=DPI, bleach_stage=None,
+                    params=None, auto_tune=False, strategy="column", quality="balanced", page_mode="auto",
+                    workers=None, progress=None):
+    """
+    合并图片并写出分页结果；单张图片无法读取或处理时记入 failed 并从排版中去掉，其余图片照常合并
+
+    参数:
+        inputs (list[str]): 图片文件或包含图片的目录（递归扫描，按文件头识别格式，按自然顺序排列）
+        output (str): 输出路径，格式由扩展名决定（见 merge_export.EXPORT_FORMATS）
+        preset (str): 证件预设，见 merge_layout.PRESET_NAMES
+        width_mm (float): 自定义模式下的图片宽度（毫米）
+        gap_mm (float): 图片间距（毫米）
+        dpi (int): 每英寸点数
+        bleach_stage (str): 漂白阶段，见 utils.BLEACH_STAGES，None 表示不漂白
+        params (dict): 漂白参数
+        auto_tune (bool): 按每张图片的统计指标自动选择漂白参数
+        strategy (str): 排版策略，见 merge_layout.LAYOUT_STRATEGIES
+        quality (str): 缩放质量，见 merge_pipeline.RESIZE_QUALITIES
+        page_mode (str): 页面颜色模式，见 merge_pipeline.PAGE_MODES
+        workers (int): 准备阶段的线程数，默认为 CPU 核心数
+        progress (callable): 进度回调 progress(已完成数量, 总数)
+
+    返回:
+        MergeReport: 合并结果
+
+    异常:
+        ValueError: 没有找到图片、自定义模式未指定宽度或全部图片都无法合并
+    """
+    start_time = time.perf_counter()
+    paths = list(iter_image_files(inputs, formats=MERGE_IMAGE_FORMATS))
+    if not paths:
+        raise ValueError("没有找到可合并的图片")
+    if preset == "custom" and not width_mm:
+        raise ValueError("自定义模式需要指定图片宽度")
+    check_bleach_params(params)
+    timings = {"collect": time.perf_counter() - start_time}
+
+    options = PrepareOptions(preset=preset,
+                             target_width=mm_to_pixel(width_mm, dpi) if width_mm else 0,
+                             bleach_stage=bleach_stage,
+                             auto_tune=bleach_stage is not None and auto_tune,
+                             params=tuple(sorted((params or {}).items())),
+                             dpi=dpi,
+                             quality=quality,
+                             page_mode=page_mode)
+    tuner = AutoTuner() if options.auto_tune else None
+    result = merge_pages(paths, options, strategy, mm_to_pixel(gap_mm, dpi), workers=workers, tuner=tuner,
+                         progress=progress, skip_failed=True)
+    timings.update(result.timings)
+    if not result.pages:
+        raise ValueError(f"全部 {len(paths)} 张图片都无法合并：{result.failed[0][1]}")
+
+    start_time = time.perf_counter()
+    written = export_pages(result.pages, output, dpi=dpi)
+    timings["export"] = time.perf_counter() - start_time
+    return MergeReport(len(paths), len(result.pages), written, timings, result.failed)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="无界面合并证件图片")
+    parser.add_argument("inputs", nargs="+", help="图片文件或包含图片的目录")
+    parser.add_argument("-o", "--output", required=True,
+                        help=f"输出文件，格式由扩展名决定（{' / '.join(EXPORT_FORMATS)}）")
+    parser.add_argument("--preset", choices=PRESET_NAMES, default="id_card", help="证件预设")
+    parser.add_argument("--width", type=float, default=None, help="自定义模式下的图片宽度（毫米）")
+    parser.add_argument("--gap", type=float, default=15, help="图片间距（毫米）")
+    parser.add_argument("--dpi", type=int, default=DPI, help="每英寸点数")
+    parser.add_argument("--bleach", choices=list(BLEACH_STAGES), default=None, help="漂白阶段，默认不漂白")
+    parser.add_argument("--param", action="append", type=parse_param, default=[],
+                        help="漂白参数，如 blur_size=5，可重复指定")
+    parser.add_argument("--auto-tune", action="store_true", help="根据每张图片的统计指标自动选择漂白参数")
+    parser.add_argument("--layout", choices=list(LAYOUT_STRATEGIES), default="column", help="排版策略")
+    parser.add_argument("--quality", choices=list(RESIZE_QUALITIES), default="balanced", help="缩放质量")
+    parser.add_argument("--page-mode", choices=list(PAGE_MODES), default="auto", help="页面颜色模式")
+    parser.add_argument("--workers", type=int, default=None, help="线程数，默认为 CPU 核心数")
+    args = parser.parse_args(argv)
+
+    try:
+        report = merge_documents(args.inputs, args.output, args.preset, args.width, args.gap, args.dpi,
+                                 args.bleach, dict(args.param), args.auto_tune, args.layout, args.quality,
+                                 args.page_mode, args.workers)
+    except (OSError, ValueError) as e:
+        logger.error(str(e))
+        return 1
+
+    for path, error in report.failed:
+        logger.error(f"合并图片失败：{path}：{error}")
+    print(f"共 {report.images} 张图片，{report.pages} 页，写出 {len(report.written)} 个文件，"
+          f"失败 {len(report.failed)} 张")
+    for stage, seconds in report.timings.items():
+        print(f"{stage:<8} {seconds:.3f} 秒")
+    print(f"{'total':<8} {sum(report.timings.values()):.3f} 秒")
+    return 1 if report.failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
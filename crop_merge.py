@@ -0,0 +1,400 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+裁剪 -> 漂白 -> 合并的一体化流程，不产生中间文件
+
+原来的流程需要先在裁剪器中检测证件并覆盖原图，再在合并器中重新打开、解码这些文件。
+这里每张原图只解码一次：检测出的证件区域直接在内存中裁剪、缩放、漂白，排版后写出 PDF /
+Word / TIFF / 图片，中间不重新编码。各阶段在独立线程中运行，之间用有界队列连接：
+
+    解码线程 --(原图)--> 检测线程 --(裁剪任务)--> 漂白线程池 --> 排版与写出（调用线程）
+
+队列满时上游阶段等待，内存中同时存在的原图和证件图片数量有上限。原图经 image_io 读取，
+与同一进程中的其它工具共用已解码图像缓存（按内存占用上限淘汰）。使用逐列 / 逐行排版时，
+一页排满即写出并释放，内存占用不随图片数量增长。
+
+命令行示例:
+    python crop_merge.py 拍摄原图目录 -o 证件.pdf --preset id_card --bleach bleach --workers 4
+"""
+import os
+import sys
+import time
+import queue
+import argparse
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Dict, List, Tuple
+
+import cv2
+from PIL import Image
+from loguru import logger
+
+from autotune import AutoTuner
+from batch_enhance import parse_param
+from folder_scanner import iter_image_files
+from image_io import read_bgr
+from merge_export import EXPORT_FORMATS, export_pages
+from merge_layout import DPI, A4_SIZE_MM, PRESET_NAMES, LAYOUT_STRATEGIES, mm_to_pixel
+from merge_pipeline import RESIZE_QUALITIES, PAGE_MODES, PrepareOptions, MergedPage, MergeCancelled, prepare_image
+from utils import BLEACH_STAGES, SCRFD, check_bleach_params, get_model_path
+
+# 排版只取决于从本页开始的图片，前面的页面排满即可写出
+STREAMING_STRATEGIES = ("column", "rows")
+# 检测前把原图缩小到的最大边长：检测网络的输入只有 640 像素，缩小后检测结果基本不变，
+# 且检测器会在输入图像上绘制关键点，缩小的副本也避免了修改原图
+DETECT_MAX_SIDE = 1600
+# 同时在内存中的已解码原图数量
+DECODED_QUEUE_SIZE = 2
+# OpenCV 可解码的格式（按文件头识别）
+SOURCE_FORMATS = ("JPEG", "PNG", "BMP", "TIFF", "WEBP")
+
+
+@dataclass
+class CropMergeReport:
+    """一次裁剪合并的结果"""
+    sources: int = 0                 # 输入原图数
+    crops: int = 0                   # 排入页面的证件数
+    pages: int = 0                   # 页数
+    written: List[str] = field(default_factory=list)             # 写出的文件
+    failed: List[Tuple[str, str]] = field(default_factory=list)  # (原图路径, 失败原因)
+    timings: Dict[str, float] = field(default_factory=dict)      # 各阶段累计耗时（秒，各阶段并行执行）
+    elapsed: float = 0.0             # 总耗时（秒）
+
+
+def detect_card_boxes(detector, image, max_side=DETECT_MAX_SIDE):
+    """
+    检测图片中的证件区域
+
+    参数:
+        detector (utils.SCRFD): 证件检测器
+        image (numpy.ndarray): BGR 原图（不会被修改）
+        max_side (int): 检测前缩小到的最大边长
+
+    返回:
+        list[tuple]: 原图坐标中的 (x, y, 宽, 高)，已限制在图片范围内
+    """
+    height, width = image.shape[:2]
+    scale = min(1.0, max_side / max(height, width))
+    if scale < 1:
+        proxy = cv2.resize(image, (round(width * scale), round(height * scale)), interpolation=cv2.INTER_AREA)
+    else:
+        proxy = image.copy()
+    _, corner_points_list = detector.detect(proxy)
+    boxes = []
+    for corner_points in corner_points_list:
+        xs = [point[0] / scale for point in corner_points]
+        ys = [point[1] / scale for point in corner_points]
+        x0, y0 = max(0, int(min(xs))), max(0, int(min(ys)))
+        x1, y1 = min(width, int(round(max(xs)))), min(height, int(round(max(ys))))
+        if x1 - x0 > 1 and y1 - y0 > 1:
+            boxes.append((x0, y0, x1 - x0, y1 - y0))
+    return boxes
+
+
+def prepare_crop(crop, options):
+    """
+    把内存中的证件区域缩放到目标尺寸并按需漂白
+
+    参数:
+        crop (numpy.ndarray): BGR 证件区域（原图的视图）
+        options (PrepareOptions): 准备参数
+
+    返回:
+        PIL.Image: 处理后的图片
+    """
+    img = Image.fromarray(cv2.cvtColor(crop, cv2.COLOR_BGR2RGB))
+    return prepare_image(img, options, lambda size: AutoTuner.params_for_image(img, options.preset, size[0]))
+
+
+def iter_cropped_pages(paths, options, report, strategy="rows", gap=None, page_size_mm=A4_SIZE_MM,
+                       detector=None, workers=None, keep_undetected=False, cancel_event=None):
+    """
+    解码、检测、裁剪、漂白并排版，逐页产出延迟合成的页面
+
+    参数:
+        paths (list[str]): 原图路径
+        options (PrepareOptions): 准备参数
+        report (CropMergeReport): 记录证件数、失败原图和各阶段耗时
+        strategy (str): 排版策略，见 merge_layout.LAYOUT_STRATEGIES；
+                        STREAMING_STRATEGIES 中的策略排满一页即产出，其余策略在全部处理完后排版
+        gap (int): 图片间距（像素），为 None 时为 15 毫米
+        page_size_mm (tuple): 页面 (宽, 高) 毫米
+        detector (utils.SCRFD): 证件检测器，为 None 时加载默认模型
+        workers (int): 漂白线程数，默认为 CPU 核心数
+        keep_undetected (bool): 未检测到证件时使用整张原图，否则记为失败
+        cancel_event (threading.Event): 置位后停止
+
+    返回:
+        generator[MergedPage]: 按页码顺序的页面
+
+    异常:
+        MergeCancelled: 被取消
+    """
+    if detector is None:
+        detector = SCRFD(get_model_path())
+    workers = workers or os.cpu_count() or 1
+    if gap is None:
+        gap = mm_to_pixel(15, options.dpi)
+    page_size = (mm_to_pixel(page_size_mm[0], options.dpi), mm_to_pixel(page_size_mm[1], options.dpi))
+    layout = LAYOUT_STRATEGIES[strategy]
+    streaming = strategy in STREAMING_STRATEGIES
+
+    decoded = queue.Queue(maxsize=DECODED_QUEUE_SIZE)  # (原图路径, BGR 原图)
+    cropped = queue.Queue(maxsize=workers * 2)         # (原图路径, 漂白任务)
+    stop = threading.Event()
+    lock = threading.Lock()
+    for stage in ("decode", "detect", "enhance"):
+        report.timings.setdefault(stage, 0.0)
+
+    def add_time(stage, start_time):
+        with lock:
+            report.timings[stage] += time.perf_counter() - start_time
+
+    def put(target, item):
+        # 队列满时等待，下游停止后放弃
+        while not stop.is_set():
+            try:
+                target.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def get(source):
+        while not stop.is_set():
+            try:
+                return source.get(timeout=0.1)
+            except queue.Empty:
+                continue
+        return None
+
+    def timed_prepare(crop):
+        start_time = time.perf_counter()
+        try:
+            return prepare_crop(crop, options)
+        finally:
+            add_time("enhance", start_time)
+
+    def decode_stage():
+        try:
+            for path in paths:
+                if stop.is_set():
+                    return
+                start_time = time.perf_counter()
+                try:
+                    image = read_bgr(path)
+                except Exception as e:
+                    # 任何单张原图的解码错误（含 Pillow 的 DecompressionBombError）都只记为该图失败
+                    report.failed.append((path, str(e) or type(e).__name__))
+                    continue
+                finally:
+                    add_time("decode", start_time)
+                if not put(decoded, (path, image)):
+                    return
+        except BaseException as e:
+            # 其它错误交给下游，由调用线程抛出，不会被当作正常结束而写出不完整的文档
+            put(decoded, e)
+        finally:
+            put(decoded, None)
+
+    def detect_stage(executor):
+        try:
+            while True:
+                item = get(decoded)
+                if item is None:
+                    return
+                if isinstance(item, BaseException):
+                    raise item
+                path, image = item
+                start_time = time.perf_counter()
+                try:
+                    boxes = detect_card_boxes(detector, image)
+                except Exception as e:
+                    report.failed.append((path, f"检测失败：{e}"))
+                    continue
+                finally:
+                    add_time("detect", start_time)
+                if not boxes:
+                    if not keep_undetected:
+                        report.failed.append((path, "未检测到证件"))
+                        continue
+                    boxes = [(0, 0, image.shape[1], image.shape[0])]
+                for x, y, width, height in boxes:
+                    # 裁剪只是原图的视图，不复制像素
+                    if not put(cropped, (path, executor.submit(timed_prepare, image[y:y + height, x:x + width]))):
+                        return
+        except BaseException as e:
+            put(cropped, e)
+        finally:
+            put(cropped, None)
+
+    executor = ThreadPoolExecutor(max_workers=workers)
+    threads = [threading.Thread(target=decode_stage, daemon=True),
+               threading.Thread(target=detect_stage, args=(executor,), daemon=True)]
+    for thread in threads:
+        thread.start()
+
+    items = []  # 尚未写出的证件图片，序号从当前未完成的第一页开始
+    sizes = []
+
+    def pages_for(layouts):
+        # 排版序号相对于 items，每页直接引用当前的 items 列表
+        return [MergedPage(page_layout, items) for page_layout in layouts]
+
+    try:
+        while True:
+            entry = get(cropped)
+            if entry is None:
+                break
+            if isinstance(entry, BaseException):
+                raise entry
+            path, future = entry
+            if cancel_event is not None and cancel_event.is_set():
+                raise MergeCancelled()
+            try:
+                image = future.result()
+            except Exception as e:
+                report.failed.append((path, f"漂白失败：{e}"))
+                continue
+            items.append(image)
+            sizes.append(image.size)
+            report.crops += 1
+            if streaming:
+                layouts = layout(sizes, page_size, gap)
+                if len(layouts) > 1:
+                    # 除最后一页外都已排满，写出后释放这些图片
+                    finished = layouts[:-1]
+                    done = sum(len(page_layout.placements) for page_layout in finished)
+                    ready = pages_for(finished)
+                    items = items[done:]
+                    sizes = sizes[done:]
+                    for page in ready:
+                        report.pages += 1
+                        yield page
+        if cancel_event is not None and cancel_event.is_set():
+            raise MergeCancelled()
+        for page in pages_for(layout(sizes, page_size, gap)):
+            report.pages += 1
+            yield page
+    finally:
+        stop.set()
+        # 丢弃尚未开始的漂白任务
+        while True:
+            try:
+                entry = cropped.get_nowait()
+            except queue.Empty:
+                break
+            if entry is not None and not isinstance(entry, BaseException):
+                entry[1].cancel()
+        executor.shutdown(wait=True, cancel_futures=True)
+        for thread in threads:
+            thread.join()
+
+
+def crop_and_merge(inputs, output, preset="id_card", width_mm=None, gap_mm=15, dpi=DPI, bleach_stage=None,
+                   params=None, auto_tune=False, strategy="rows", quality="balanced", page_mode="auto",
+                   workers=None, keep_undetected=False, detector=None, progress=None, cancel_event=None):
+    """
+    从拍摄的原图中检测并裁剪证件，漂白后直接排版写出，不修改原图也不产生中间文件
+
+    参数:
+        inputs (list[str]): 原图文件或包含原图的目录
+        output (str): 输出路径，格式由扩展名决定（见 merge_export.EXPORT_FORMATS）
+        preset (str): 证件预设，见 merge_layout.PRESET_NAMES
+        width_mm (float): 自定义模式下的图片宽度（毫米）
+        gap_mm (float): 图片间距（毫米）
+        dpi (int): 每英寸点数
+        bleach_stage (str): 漂白阶段，见 utils.BLEACH_STAGES，None 表示不漂白
+        params (dict): 漂白参数
+        auto_tune (bool): 按每张证件的统计指标自动选择漂白参数
+        strategy (str): 排版策略，见 merge_layout.LAYOUT_STRATEGIES
+        quality (str): 缩放质量，见 merge_pipeline.RESIZE_QUALITIES
+        page_mode (str): 页面颜色模式，见 merge_pipeline.PAGE_MODES
+        workers (int): 漂白线程数
+        keep_undetected (bool): 未检测到证件时使用整张原图
+        detector (utils.SCRFD): 证件检测器，为 None 时加载默认模型
+        progress (callable): 进度回调 progress(已写出页数, None)
+        cancel_event (threading.Event): 置位后停止并删除未完成的文件
+
+    返回:
+        CropMergeReport: 处理结果
+
+    异常:
+        ValueError: 没有找到图片、没有检测到证件或自定义模式未指定宽度
+        MergeCancelled / merge_export.ExportCancelled: 被取消
+    """
+    start_time = time.perf_counter()
+    paths = list(iter_image_files(inputs, formats=SOURCE_FORMATS))
+    if not paths:
+        raise ValueError("没有找到可处理的图片")
+    if preset == "custom" and not width_mm:
+        raise ValueError("自定义模式需要指定图片宽度")
+    check_bleach_params(params)
+    options = PrepareOptions(preset=preset,
+                             target_width=mm_to_pixel(width_mm, dpi) if width_mm else 0,
+                             bleach_stage=bleach_stage,
+                             auto_tune=bleach_stage is not None and auto_tune,
+                             params=tuple(sorted((params or {}).items())),
+                             dpi=dpi,
+                             quality=quality,
+                             page_mode=page_mode)
+    report = CropMergeReport(sources=len(paths))
+    pages = iter_cropped_pages(paths, options, report, strategy, mm_to_pixel(gap_mm, dpi), detector=detector,
+                               workers=workers, keep_undetected=keep_undetected, cancel_event=cancel_event)
+    try:
+        report.written = export_pages(pages, output, dpi=dpi, progress=progress, cancel_event=cancel_event)
+    except MergeCancelled:
+        # 在处理阶段取消时导出尚未结束，删除写了一半的文件
+        if os.path.exists(output):
+            os.remove(output)
+        raise
+    finally:
+        pages.close()
+    report.elapsed = time.perf_counter() - start_time
+    if not report.crops:
+        for path in report.written:
+            os.remove(path)
+        raise ValueError("没有检测到证件")
+    return report
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="从原图中检测并裁剪证件，漂白后直接合并，不产生中间文件")
+    parser.add_argument("inputs", nargs="+", help="原图文件或包含原图的目录")
+    parser.add_argument("-o", "--output", required=True,
+                        help=f"输出文件，格式由扩展名决定（{' / '.join(EXPORT_FORMATS)}）")
+    parser.add_argument("--preset", choices=PRESET_NAMES, default="id_card", help="证件预设")
+    parser.add_argument("--width", type=float, default=None, help="自定义模式下的图片宽度（毫米）")
+    parser.add_argument("--gap", type=float, default=15, help="图片间距（毫米）")
+    parser.add_argument("--dpi", type=int, default=DPI, help="每英寸点数")
+    parser.add_argument("--bleach", choices=list(BLEACH_STAGES), default=None, help="漂白阶段，默认不漂白")
+    parser.add_argument("--param", action="append", type=parse_param, default=[],
+                        help="漂白参数，如 blur_size=5，可重复指定")
+    parser.add_argument("--auto-tune", action="store_true", help="根据每张证件的统计指标自动选择漂白参数")
+    parser.add_argument("--layout", choices=list(LAYOUT_STRATEGIES), default="rows", help="排版策略")
+    parser.add_argument("--quality", choices=list(RESIZE_QUALITIES), default="balanced", help="缩放质量")
+    parser.add_argument("--page-mode", choices=list(PAGE_MODES), default="auto", help="页面颜色模式")
+    parser.add_argument("--workers", type=int, default=None, help="漂白线程数")
+    parser.add_argument("--keep-undetected", action="store_true", help="未检测到证件时使用整张原图")
+    args = parser.parse_args(argv)
+
+    try:
+        report = crop_and_merge(args.inputs, args.output, args.preset, args.width, args.gap, args.dpi,
+                                args.bleach, dict(args.param), args.auto_tune, args.layout, args.quality,
+                                args.page_mode, args.workers, args.keep_undetected)
+    except ValueError as e:
+        logger.error(str(e))
+        return 1
+
+    for path, error in report.failed:
+        logger.warning(f"{path}：{error}")
+    print(f"共 {report.sources} 张原图，{report.crops} 张证件，{report.pages} 页，写出 {len(report.written)} 个文件")
+    for stage, seconds in report.timings.items():
+        print(f"{stage:<8} {seconds:.3f} 秒（累计）")
+    print(f"{'total':<8} {report.elapsed:.3f} 秒")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
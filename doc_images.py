@@ -0,0 +1,159 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Word 文档生成器的图片准备
+
+按打印尺寸和目标 DPI 缩小并重新压缩图片后再插入文档：A4 宽 21 厘米、300 DPI 时
+图片最多只需约 2480 像素宽，手机拍摄的 1200 万像素原图缩小后文档体积可减少一个数量级。
+图片在线程池中并行处理，按输入顺序返回。每张图片只读取一次：尺寸和 EXIF 方向从文件头解析，
+同一份数据直接插入文档或用于缩小，不再单独打开文件读取尺寸。
+"""
+import io
+import os
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Optional
+
+from PIL import Image
+
+from image_probe import read_image, reset_orientation
+from merge_pipeline import load_resized
+
+PAGE_WIDTH_CM = 21.0     # A4 宽度，页边距为 0
+MAX_HEIGHT_CM = 29.5     # 单张图片的最大高度，避免 Word 强制分页
+DEFAULT_DOC_DPI = 200    # 默认目标 DPI
+
+
+@dataclass
+class DocImage:
+    """一张准备好插入文档的图片"""
+    index: int                   # 在输入列表中的序号
+    path: str                    # 原图路径
+    data: Optional[bytes]        # 插入文档的图片数据（原图或重新编码后的数据），失败时为 None
+    width_cm: float              # 打印宽度（厘米，按显示方向）
+    height_cm: float             # 打印高度（厘米，按显示方向）
+    original_bytes: int          # 原图文件大小
+    output_bytes: int            # 插入文档的数据大小
+    orientation: int = 1         # EXIF 方向，由文档在显示时旋转，数据本身不再带方向
+    error: Optional[str] = None  # 失败原因，成功时为 None
+
+    @property
+    def ok(self):
+        return self.error is None
+
+    @property
+    def source(self):
+        """插入文档的内容：图片数据，没有数据时为原图路径"""
+        return self.data if self.data is not None else self.path
+
+
+def fit_size_cm(image_size, width_cm=PAGE_WIDTH_CM, max_height_cm=MAX_HEIGHT_CM):
+    """
+    计算图片在文档中的打印尺寸：宽度占满页面，太高时按最大高度等比缩小
+
+    参数:
+        image_size (tuple): 图片 (宽, 高) 像素
+        width_cm (float): 页面宽度（厘米）
+        max_height_cm (float): 最大高度（厘米）
+
+    返回:
+        tuple: (宽, 高) 厘米
+    """
+    aspect_ratio = image_size[1] / image_size[0]
+    target_width_cm = width_cm
+    target_height_cm = target_width_cm * aspect_ratio
+    if target_height_cm > max_height_cm:
+        target_height_cm = max_height_cm
+        target_width_cm = target_height_cm / aspect_ratio
+    return target_width_cm, target_height_cm
+
+
+def prepare_doc_image(index, path, dpi=DEFAULT_DOC_DPI, jpeg_quality=85, width_cm=PAGE_WIDTH_CM,
+                      max_height_cm=MAX_HEIGHT_CM):
+    """
+    按打印尺寸缩小并重新压缩一张图片；原图不大于打印尺寸或重新压缩后反而更大时直接使用原图
+
+    参数:
+        index (int): 在输入列表中的序号
+        path (str): 图片路径
+        dpi (int): 目标 DPI，为 None 时不缩小
+        jpeg_quality (int): 重新压缩的 JPEG 质量
+        width_cm (float): 页面宽度（厘米）
+        max_height_cm (float): 最大高度（厘米）
+
+    返回:
+        DocImage: 处理结果，失败时 error 为失败原因
+    """
+    try:
+        data, info = read_image(path)
+        original_bytes = len(data)
+        size_cm = fit_size_cm(info.display_size, width_cm, max_height_cm)
+        display_size = info.display_size
+        target_size = (round(size_cm[0] / 2.54 * dpi), round(size_cm[1] / 2.54 * dpi)) if dpi else display_size
+        if target_size[0] >= display_size[0] or target_size[1] >= display_size[1]:
+            # 直接插入原图数据；方向改由文档旋转，清除 EXIF 方向以免查看器重复旋转
+            return DocImage(index, path, reset_orientation(data, info), *size_cm, original_bytes, original_bytes,
+                            info.orientation)
+        if info.swaps_axes:
+            # 像素按存储方向缩小，目标尺寸随之互换
+            target_size = target_size[::-1]
+        with Image.open(io.BytesIO(data)) as img:
+            resized = load_resized(img, target_size)
+
+        buffer = io.BytesIO()
+        if info.format == "JPEG":
+            if resized.mode not in ("RGB", "L"):
+                resized = resized.convert("RGB")
+            # 不写入 EXIF：方向由文档旋转，与直接插入原图时的显示效果一致
+            resized.save(buffer, format="JPEG", quality=jpeg_quality, dpi=(dpi, dpi), optimize=True)
+        else:
+            # 其它格式（PNG 截图、带透明通道的图片等）保持无损
+            resized.save(buffer, format="PNG", dpi=(dpi, dpi), optimize=True)
+        output = buffer.getvalue()
+        if len(output) >= original_bytes:
+            output = reset_orientation(data, info)
+        return DocImage(index, path, output, *size_cm, original_bytes, len(output), info.orientation)
+    except Exception as e:
+        return DocImage(index, path, None, 0, 0, 0, 0, error=str(e))
+
+
+def iter_doc_images(paths, dpi=DEFAULT_DOC_DPI, jpeg_quality=85, workers=None, max_in_flight=None,
+                    width_cm=PAGE_WIDTH_CM, max_height_cm=MAX_HEIGHT_CM):
+    """
+    使用线程池并行准备图片，按输入顺序逐个产出，在途任务数有上限，内存占用不随图片数量增长
+
+    参数:
+        paths (list[str]): 图片路径
+        dpi (int): 目标 DPI，为 None 时不缩小
+        jpeg_quality (int): 重新压缩的 JPEG 质量
+        workers (int): 线程数，默认为 CPU 核心数
+        max_in_flight (int): 最大在途任务数，默认为 workers 的 2 倍
+        width_cm (float): 图片宽度（厘米）
+        max_height_cm (float): 最大高度（厘米）
+
+    返回:
+        generator[DocImage]: 处理结果
+    """
+    workers = workers or os.cpu_count() or 1
+    max_in_flight = max(max_in_flight or workers * 2, 1)
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        pending = deque()
+        try:
+            for index, path in enumerate(paths):
+                pending.append(executor.submit(prepare_doc_image, index, path, dpi, jpeg_quality,
+                                               width_cm, max_height_cm))
+                if len(pending) >= max_in_flight:
+                    yield pending.popleft().result()
+            while pending:
+                yield pending.popleft().result()
+        finally:
+            for future in pending:
+                future.cancel()
+
+
+def format_size_saving(original_bytes, output_bytes):
+    """生成“原图 x MB，插入 y MB，节省 z%”形式的说明"""
+    saved = 1 - output_bytes / original_bytes if original_bytes else 0
+    return (f"原图共 {original_bytes / 1024 / 1024:.1f} MB，插入 {output_bytes / 1024 / 1024:.1f} MB，"
+            f"节省 {saved:.0%}")
@@ -1,18 +1,14 @@
 import os
 import cv2
 import wx
-import numpy as np
 from loguru import logger
-from utils import SCRFD,preprocess_image
-import sys
- 
-def get_model_path():
-    if hasattr(sys, '_MEIPASS'):
-        # 如果程序是打包后的状态
-        return os.path.join(sys._MEIPASS, os.path.join('models', 'carddetection_scrf.onnx'))
-    else:
-        # 如果是开发状态
-        return os.path.join('models', 'carddetection_scrf.onnx')
+from utils import SCRFD,preprocess_image,get_model_path
+from folder_scanner import FolderScanner
+from image_io import file_wildcard, read_bgr, write_image
+
+# 裁剪器接受的图片格式（按文件头识别，见 image_io.sniff_image_format）
+CROP_IMAGE_FORMATS = ("JPEG", "PNG", "BMP", "TIFF", "WEBP")
+
 
 # 提取保存图像的逻辑为独立函数
 def save_image_with_chinese_path(image_path, cropped):
@@ -20,17 +16,12 @@ def save_image_with_chinese_path(image_path, cropped):
     try:
         # 获取文件扩展名
         file_extension = os.path.splitext(image_path)[1].lower()
-        if file_extension == '.jpg':
-            _, buffer = cv2.imencode('.jpg', cropped)
-        elif file_extension == '.png':
-            _, buffer = cv2.imencode('.png', cropped)
-        else:
+        if file_extension not in ('.jpg', '.png'):
             wx.MessageBox("不支持的文件格式，仅支持 .jpg 和 .png。", "错误", wx.OK | wx.ICON_ERROR)
             return success
 
-        # 将编码后的字节流写入文件
-        with open(image_path, 'wb') as f:
-            f.write(buffer)
+        # 编码后写入临时文件再改名，覆盖原图时写入失败也不会损坏原文件
+        write_image(image_path, cropped)
         success = True
     except Exception as e:
         logger.error(f"保存失败: {str(e)}")
@@ -64,6 +55,10 @@ class IDCardCropApp(wx.Frame):
         # 创建 SCRFD 类的实例，传入 ONNX 模型路径、置信度阈值和 NMS 阈值
         self.card_net = SCRFD(onnxmodel)
 
+        # 拖入文件夹时在后台扫描，找到第一张图片即停止（按文件头识别 OpenCV 可读取的格式）
+        self.scanner = FolderScanner(formats=CROP_IMAGE_FORMATS, batch_size=1)
+        self.drop_generation = 0  # 拖放编号，旧扫描已排队的加载据此丢弃
+
         self.orig_image = None
         self.image_path = None
         self.crops = []
@@ -103,35 +98,44 @@ class IDCardCropApp(wx.Frame):
         
 
     def on_drop_files(self, paths):
-        if isinstance(paths, list):
-            path = paths[0]
-        else:
-            path = paths
-        if os.path.isfile(path):
+        if not isinstance(paths, list):
+            paths = [paths]
+        self.scanner.cancel()  # 新的拖放取代尚未完成的扫描
+        self.drop_generation += 1
+        generation = self.drop_generation
+
+        def on_batch(batch):
+            # 只加载（自然顺序中的）第一张图片
+            self.scanner.cancel()
+            wx.CallAfter(self.load_dropped, generation, batch[0])
+
+        self.scanner.start(paths, on_batch)
+
+    def load_dropped(self, generation, path):
+        """加载拖放扫描找到的图片；期间又有新的拖放时丢弃"""
+        if generation == self.drop_generation:
             self.load_image(path)
 
     def on_select_file(self, event):
-        with wx.FileDialog(self, "选择图像文件", wildcard="Image files (*.jpg;*.png;*.jpeg)|*.jpg;*.png;*.jpeg",
+        with wx.FileDialog(self, "选择图像文件", wildcard=file_wildcard(CROP_IMAGE_FORMATS),
                            style=wx.FD_OPEN | wx.FD_FILE_MUST_EXIST) as fileDialog:
             if fileDialog.ShowModal() == wx.ID_CANCEL:
                 return
             path = fileDialog.GetPath()
+            # 选择的文件取代尚未完成的拖放扫描
+            self.scanner.cancel()
+            self.drop_generation += 1
             self.load_image(path)
 
     def load_image(self, path):
         """加载并显示图像文件"""
         self.image_path = path  # 保存图像路径
         try:
-            # 使用numpy的fromfile配合imdecode解决中文路径问题
-            img_array = np.fromfile(path, dtype=np.uint8)
-            self.orig_image = cv2.imdecode(img_array, cv2.IMREAD_COLOR)
+            # 支持中文路径，按 EXIF 方向旋转，与其它工具共用已解码图像缓存
+            self.orig_image = read_bgr(path)
         except Exception as e:
             wx.MessageBox(f"无法加载图像: {str(e)}", "错误", wx.OK | wx.ICON_ERROR)
             return
-        if self.orig_image is None:
-            # 图像加载失败时显示错误提示
-            wx.MessageBox("无法加载图像。请确认文件格式正确。", "错误", wx.OK | wx.ICON_ERROR)
-            return
         # 检测并显示图像中的裁剪区域
         self.detect_and_show_crops()
         # 启用裁剪和另存为按钮
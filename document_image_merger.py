@@ -1,38 +1,27 @@
 import wx
 import os
-from PIL import Image
+import time
+import bisect
+import threading
+from collections import OrderedDict
 from loguru import logger
-from utils import bleach_image2,bleach_image,image_removed_background,enhanced_image
+from autotune import AutoTuner
+from merge_layout import DPI, SCREEN_DPI, mm_to_pixel, PRESET_NAMES, LAYOUT_STRATEGIES
+from merge_pipeline import MERGE_IMAGE_FORMATS, PrepareOptions, PreparedItemCache, MergeCancelled, merge_pages
+from merge_export import ExportCancelled, export_format_for, export_pages, export_paths
+from image_list import ImageListModel, ImageListCtrl
+from folder_scanner import FolderScanner
+from image_io import file_wildcard
+
+# 缩放质量名称，顺序与界面上的缩放质量下拉框一致
+QUALITY_NAMES = ["balanced", "fast", "exact"]
+# 页面颜色模式名称，顺序与界面上的页面颜色下拉框一致（见 merge_pipeline.PAGE_MODES）
+PAGE_MODE_NAMES = ["auto", "color", "gray", "bw"]
+# 输出分辨率（DPI），顺序与界面上的分辨率下拉框一致
+DPI_CHOICES = [150, 200, 300, 600]
+# 保存对话框中各文件类型对应的扩展名
+SAVE_EXTENSIONS = [".pdf", ".tif", ".jpg", ".png", ".docx"]
 
-DPI = 300
-
-def mm_to_pixel(mm):
-    """将毫米单位转换为像素值
-
-    参数:
-        mm (float): 毫米单位的长度值
-
-    返回:
-        int: 转换后的像素值(四舍五入取整)
-
-    说明:
-        使用公式: 像素 = 毫米 * DPI / 25.4
-        其中25.4是1英寸对应的毫米数(1英寸=25.4毫米)
-        DPI(每英寸点数)默认为300
-    """
-    return int(round(mm * DPI / 25.4))
-
-A4_SIZE_MM = (210, 297)
-A4_SIZE_PX = (mm_to_pixel(A4_SIZE_MM[0]), mm_to_pixel(A4_SIZE_MM[1]))
-
-# 预设证件尺寸（单位：毫米）适当加大
-ID_CARD_SIZE_MM = (86, 54)     # 身份证（85.6毫米 ×54毫米）
-HUKOU_SIZE_MM = (145, 106)        # 户口本（143 毫米 ×105 毫米）
-STUDENT_CARD_SIZE_MM = (120, 90)  # 学生证
-# 预先转换成像素
-ID_CARD_SIZE_PX = (mm_to_pixel(ID_CARD_SIZE_MM[0]), mm_to_pixel(ID_CARD_SIZE_MM[1]))
-HUKOU_SIZE_PX = (mm_to_pixel(HUKOU_SIZE_MM[0]), mm_to_pixel(HUKOU_SIZE_MM[1]))
-STUDENT_CARD_SIZE_PX = (mm_to_pixel(STUDENT_CARD_SIZE_MM[0]), mm_to_pixel(STUDENT_CARD_SIZE_MM[1]))
 
 class ImageViewPanel(wx.Panel):
     """图片查看面板，用于显示和管理待合并的图片文件"""
@@ -44,11 +33,16 @@ class ImageViewPanel(wx.Panel):
             parent: 父级窗口对象
         """
         super().__init__(parent)
-        self.image_paths = []  # 存储图片路径的列表
+        # 图片列表模型：按路径哈希去重，列表控件为虚拟列表，导入数千张图片也不会卡顿；
+        # 格式已由文件选择对话框或文件夹扫描（按文件头）检查，这里不再按扩展名过滤
+        self.model = ImageListModel()
+        # 拖入的文件和文件夹在后台扫描，分批加入列表
+        self.scanner = FolderScanner(formats=MERGE_IMAGE_FORMATS)
+        self.scan_generation = 0  # 清空列表时递增，旧扫描已排队的批次据此丢弃
         main_sizer = wx.BoxSizer(wx.VERTICAL)  # 主垂直布局
 
         # 显示文件名列表
-        self.listbox = wx.ListBox(self, style=wx.LB_EXTENDED)  # 支持多选的文件列表
+        self.listbox = ImageListCtrl(self, self.model)  # 支持多选的文件列表
         main_sizer.Add(self.listbox, 1, wx.EXPAND | wx.ALL, 5)  # 添加到布局并设置边距
 
         # 按钮区：清除全部 & 删除选中
@@ -61,6 +55,11 @@ class ImageViewPanel(wx.Panel):
         delete_btn.Bind(wx.EVT_BUTTON, self.on_delete_selected)  # 绑定点击事件
         btn_sizer.Add(delete_btn, flag=wx.LEFT, border=5)  # 添加按钮并设置左边距
 
+        self.stop_scan_btn = wx.Button(self, label="停止导入")  # 停止扫描拖入的文件夹
+        self.stop_scan_btn.Bind(wx.EVT_BUTTON, self.on_stop_scan)
+        self.stop_scan_btn.Enable(False)
+        btn_sizer.Add(self.stop_scan_btn, flag=wx.LEFT, border=5)
+
         main_sizer.Add(btn_sizer, 0, wx.ALIGN_RIGHT | wx.ALL, 5)  # 将按钮区添加到主布局
 
         self.SetSizer(main_sizer)  # 设置主布局
@@ -69,22 +68,52 @@ class ImageViewPanel(wx.Panel):
         drop_target = DropTarget(self)  # 创建拖放目标对象
         self.SetDropTarget(drop_target)  # 设置拖放目标
 
+    @property
+    def image_paths(self):
+        """图片路径列表（只读，修改请使用 add_images / clear / on_delete_selected）"""
+        return self.model.paths
+
     def add_images(self, paths):
-        """添加图片到列表
+        """添加图片到列表，跳过不支持的格式和已存在的图片
 
         参数:
             paths: 图片路径列表
         """
-        for path in paths:
-            # 检查文件扩展名是否支持且路径不存在于列表中
-            if path.lower().endswith(('.png', '.jpg', '.jpeg', '.bmp', '.gif')) and path not in self.image_paths:
-                self.image_paths.append(path)  # 添加到路径列表
-                self.listbox.Append(os.path.basename(path))  # 在列表框中显示文件名
+        if self.model.add(paths):
+            self.listbox.refresh()  # 一次更新列表行数
+
+    def scan_and_add(self, paths):
+        """在后台扫描拖入的文件和文件夹（递归），识别出的图片分批加入列表
+
+        参数:
+            paths: 拖入的文件或文件夹路径列表
+        """
+        self.stop_scan_btn.Enable(True)
+        generation = self.scan_generation
+        self.scanner.start(paths,
+                           on_batch=lambda batch: wx.CallAfter(self.add_scanned, generation, batch),
+                           on_done=lambda count, cancelled: wx.CallAfter(self.on_scan_done, count, cancelled))
+
+    def add_scanned(self, generation, batch):
+        """在界面线程中加入一批扫描结果；列表在此之后被清空时丢弃"""
+        if generation == self.scan_generation:
+            self.add_images(batch)
+
+    def on_scan_done(self, count, cancelled):
+        """扫描结束（或被取消）"""
+        logger.info(f"扫描{'已取消' if cancelled else '完成'}：找到 {count} 张图片")
+        self.stop_scan_btn.Enable(self.scanner.running)
+
+    def on_stop_scan(self, event):
+        """停止正在进行的文件夹扫描，已找到的图片保留在列表中"""
+        self.scanner.cancel()
 
     def clear(self):
         """清空所有图片"""
-        self.image_paths.clear()  # 清空路径列表
-        self.listbox.Clear()  # 清空列表框
+        self.scanner.cancel()  # 清空时同时停止导入
+        self.scan_generation += 1  # 丢弃已排队但尚未加入列表的批次
+        self.model.clear()  # 清空路径列表
+        self.listbox.refresh(clear_selection=True)  # 清空列表框
 
     def on_clear(self, event):
         """处理清除按钮点击事件
@@ -101,13 +130,20 @@ class ImageViewPanel(wx.Panel):
             event: 按钮事件对象
         """
         selections = self.listbox.GetSelections()  # 获取选中项的索引
-        # 从后往前删除，避免索引错乱
-        for index in reversed(selections):
-            del self.image_paths[index]  # 从路径列表中删除
-            self.listbox.Delete(index)  # 从列表框中删除
+        self.model.remove(selections)  # 一次删除所有选中项
+        self.listbox.refresh(clear_selection=True)
 
 class PreviewPanel(wx.ScrolledWindow):
-    """预览面板类，用于显示合并后的图片预览"""
+    """
+    预览面板类，用于显示合并后的图片预览
+
+    虚拟化绘制：只记录每页在画布上的位置，重绘时只合成当前可见的页面，
+    按屏幕分辨率直接从排版结果生成（不合成整页原尺寸图像），最近显示过的页面位图缓存复用。
+    """
+
+    PAGE_GAP = 10         # 页面之间及四周的间距（像素）
+    MAX_PAGE_WIDTH = 600  # 预览页面的最大宽度（像素）
+    CACHE_PAGES = 16      # 缓存的预览位图数量
 
     def __init__(self, parent):
         """初始化预览面板
@@ -116,54 +152,97 @@ class PreviewPanel(wx.ScrolledWindow):
             parent: 父级窗口对象
         """
         super().__init__(parent)
-        self.bitmap_controls = []  # 存储位图控件的列表
-        self.sizer = wx.BoxSizer(wx.VERTICAL)  # 创建垂直布局管理器
-        self.SetSizer(self.sizer)  # 设置布局
+        self.pages = []  # 延迟合成的页面
+        self.page_rects = []  # 每页在虚拟画布上的 (x, y, 宽, 高)
+        self.bitmap_cache = OrderedDict()  # 页面序号 -> 预览位图（LRU）
+        self.SetBackgroundStyle(wx.BG_STYLE_PAINT)  # 背景由 on_paint 绘制，避免闪烁
         self.SetScrollRate(5, 5)  # 设置滚动速率
         self.EnableScrolling(True, True)  # 启用水平和垂直滚动
+        self.Bind(wx.EVT_PAINT, self.on_paint)
+        self.Bind(wx.EVT_SIZE, self.on_size)
 
     def show_preview(self, pages):
         """显示预览图片
 
         参数:
-            pages: 包含PIL图片对象的列表
+            pages: 延迟合成的页面列表（merge_pipeline.MergedPage）
         """
-        # 清除现有控件
-        for ctrl in self.bitmap_controls:
-            ctrl.Destroy()  # 销毁所有位图控件
-        self.bitmap_controls.clear()  # 清空控件列表
-        self.sizer.Clear()  # 清空布局
+        self.pages = list(pages)
+        self.bitmap_cache.clear()
+        self.update_layout()
+        self.Scroll(0, 0)
+        self.Refresh()
 
-        max_width = 0  # 记录最大宽度
-        total_height = 0  # 记录总高度
+    def add_page(self, page):
+        """追加一页（合并过程中逐页发布），不影响已缓存的页面
 
-        # 处理每页图片
-        for page in pages:
+        参数:
+            page: 延迟合成的页面（merge_pipeline.MergedPage）
+        """
+        self.pages.append(page)
+        self.update_layout()
+        self.Refresh()
+
+    def update_layout(self):
+        """计算每页的预览尺寸和位置，页面水平居中，并设置虚拟大小以启用滚动"""
+        client_width = self.GetClientSize().width
+        self.page_rects = []
+        max_width = 0
+        y = self.PAGE_GAP
+        for page in self.pages:
             width, height = page.size
-            # 计算缩放比例，确保宽度不超过600像素
-            scale = min(600 / width, 1)
-            new_size = (int(width * scale), int(height * scale))
-
-            # 缩放图片并使用LANCZOS算法保持质量
-            resized_page = page.resize(new_size, Image.LANCZOS)
-
-            # 创建wxPython图像对象
-            wx_img = wx.Image(resized_page.width, resized_page.height)
-            wx_img.SetData(resized_page.convert("RGB").tobytes())
-
-            # 创建静态位图控件并添加到布局
-            bmp = wx.StaticBitmap(self, -1, wx.Bitmap(wx_img))
-            self.sizer.Add(bmp, 0, wx.ALL | wx.ALIGN_CENTER, 5)
-            self.bitmap_controls.append(bmp)
-
-            # 更新最大宽度和总高度
-            if new_size[0] > max_width:
-                max_width = new_size[0]
-            total_height += new_size[1]
-
-        # 设置虚拟大小以启用滚动
-        self.SetVirtualSize((max_width, total_height))
-        self.Layout()  # 重新布局
+            # 计算缩放比例，确保宽度不超过 MAX_PAGE_WIDTH
+            scale = min(self.MAX_PAGE_WIDTH / width, 1)
+            page_width, page_height = max(1, round(width * scale)), max(1, round(height * scale))
+            x = max(self.PAGE_GAP, (client_width - page_width) // 2)
+            self.page_rects.append((x, y, page_width, page_height))
+            max_width = max(max_width, page_width)
+            y += page_height + self.PAGE_GAP
+        self.SetVirtualSize((max_width + 2 * self.PAGE_GAP, y))
+
+    def page_bitmap(self, index):
+        """获取一页的预览位图，未缓存时按预览尺寸合成"""
+        bitmap = self.bitmap_cache.get(index)
+        if bitmap is not None:
+            self.bitmap_cache.move_to_end(index)
+            return bitmap
+        page = self.pages[index]
+        page_width = self.page_rects[index][2]
+        # 直接按预览尺寸合成页面，不生成整页原尺寸图像
+        preview = page.render(page_width / page.size[0]).convert("RGB")
+        wx_img = wx.Image(preview.width, preview.height)
+        wx_img.SetData(preview.tobytes())
+        bitmap = wx.Bitmap(wx_img)
+        self.bitmap_cache[index] = bitmap
+        while len(self.bitmap_cache) > self.CACHE_PAGES:
+            self.bitmap_cache.popitem(last=False)
+        return bitmap
+
+    def visible_pages(self):
+        """当前滚动位置下可见页面的序号范围"""
+        _, view_top = self.CalcUnscrolledPosition(0, 0)
+        view_bottom = view_top + self.GetClientSize().height
+        tops = [rect[1] for rect in self.page_rects]
+        # 页面按纵坐标排列，二分查找可见区间
+        first = max(0, bisect.bisect_right(tops, view_top) - 1)
+        last = bisect.bisect_left(tops, view_bottom)
+        return range(first, min(last, len(self.pages)))
+
+    def on_size(self, event):
+        """窗口大小改变时重新居中页面（预览位图尺寸不变，缓存仍然有效）"""
+        self.update_layout()
+        self.Refresh()
+        event.Skip()
+
+    def on_paint(self, event):
+        """只绘制可见的页面"""
+        dc = wx.AutoBufferedPaintDC(self)
+        self.DoPrepareDC(dc)
+        dc.SetBackground(wx.Brush(self.GetBackgroundColour()))
+        dc.Clear()
+        for index in self.visible_pages():
+            x, y, _, _ = self.page_rects[index]
+            dc.DrawBitmap(self.page_bitmap(index), x, y)
 
 class DropTarget(wx.FileDropTarget):
     def __init__(self, panel):
@@ -171,7 +250,8 @@ class DropTarget(wx.FileDropTarget):
         self.panel = panel
 
     def OnDropFiles(self, x, y, filenames):
-        self.panel.add_images(filenames)
+        # 文件夹在后台递归扫描，不阻塞界面
+        self.panel.scan_and_add(filenames)
         return True
 
 class MainFrame(wx.Frame):
@@ -218,6 +298,10 @@ class MainFrame(wx.Frame):
         self.bleach_stage_choice = wx.Choice(left_panel, choices=["黑白", "背景去除", "优化"])
         self.bleach_stage_choice.SetSelection(0)
         self.bleach_stage_choice.Enabled  = False
+        # 自动参数：根据图像统计自动选择漂白参数
+        self.autotune_checkbox = wx.CheckBox(left_panel, label="自动参数")
+        self.autotune_checkbox.Enable(False)
+        self.auto_tuner = AutoTuner()
         # 绑定事件
         self.bleach_checkbox.Bind(wx.EVT_CHECKBOX, self.on_bleach_checkbox)
 
@@ -235,23 +319,58 @@ class MainFrame(wx.Frame):
         #  添加漂白控件
         bleach_sizer.Add(self.bleach_checkbox, flag=wx.ALL, border=5)
         bleach_sizer.Add(self.bleach_stage_choice, flag=wx.ALL, border=5)
+        bleach_sizer.Add(self.autotune_checkbox, flag=wx.ALL, border=5)
+
+        # 排版方式：单列 / 网格 / 紧凑装箱 / 逐行排列（顺序与 LAYOUT_STRATEGIES 一致）
+        layout_sizer = wx.BoxSizer(wx.HORIZONTAL)
+        self.layout_choice = wx.Choice(left_panel, choices=["单列", "网格", "紧凑装箱", "逐行排列"])
+        self.layout_choice.SetSelection(0)
+        layout_sizer.Add(wx.StaticText(left_panel, label="排版方式："), flag=wx.ALIGN_CENTER_VERTICAL)
+        layout_sizer.Add(self.layout_choice, flag=wx.ALIGN_CENTER_VERTICAL | wx.LEFT, border=5)
+        # 缩放质量：均衡 / 快速 / 精确（对应 RESIZE_QUALITIES 中的 balanced / fast / exact）
+        self.quality_choice = wx.Choice(left_panel, choices=["均衡", "快速", "精确"])
+        self.quality_choice.SetSelection(0)
+        layout_sizer.Add(wx.StaticText(left_panel, label="缩放质量："), flag=wx.ALIGN_CENTER_VERTICAL | wx.LEFT, border=10)
+        layout_sizer.Add(self.quality_choice, flag=wx.ALIGN_CENTER_VERTICAL | wx.LEFT, border=5)
+        # 页面颜色：自动时黑白漂白的页面保持 1 位，灰度图片保持灰度，不再统一转为 RGB
+        self.page_mode_choice = wx.Choice(left_panel, choices=["自动", "彩色", "灰度", "黑白"])
+        self.page_mode_choice.SetSelection(0)
+        layout_sizer.Add(wx.StaticText(left_panel, label="页面颜色："), flag=wx.ALIGN_CENTER_VERTICAL | wx.LEFT, border=10)
+        layout_sizer.Add(self.page_mode_choice, flag=wx.ALIGN_CENTER_VERTICAL | wx.LEFT, border=5)
+        # 输出分辨率：预览始终按屏幕分辨率处理，只有保存时才按输出分辨率处理图片
+        self.dpi_choice = wx.Choice(left_panel, choices=[f"{dpi} dpi" for dpi in DPI_CHOICES])
+        self.dpi_choice.SetSelection(DPI_CHOICES.index(DPI))
+        layout_sizer.Add(wx.StaticText(left_panel, label="输出分辨率："), flag=wx.ALIGN_CENTER_VERTICAL | wx.LEFT, border=10)
+        layout_sizer.Add(self.dpi_choice, flag=wx.ALIGN_CENTER_VERTICAL | wx.LEFT, border=5)
 
         merge_btn = wx.Button(left_panel, label="开始合并")
         merge_btn.Bind(wx.EVT_BUTTON, self.on_merge)
 
-        save_btn = wx.Button(left_panel, label="另存为图片")
+        self.cancel_merge_btn = wx.Button(left_panel, label="取消合并")
+        self.cancel_merge_btn.Bind(wx.EVT_BUTTON, self.on_cancel_merge)
+        self.cancel_merge_btn.Enable(False)
+
+        save_btn = wx.Button(left_panel, label="另存为")
         save_btn.Bind(wx.EVT_BUTTON, self.on_save)
 
         button_sizer = wx.BoxSizer(wx.HORIZONTAL)
         button_sizer.Add(merge_btn, flag=wx.ALL, border=5)
+        button_sizer.Add(self.cancel_merge_btn, flag=wx.ALL, border=5)
         button_sizer.Add(save_btn, flag=wx.ALL, border=5)
 
+        # 合并进度：后台处理时逐张更新
+        self.merge_gauge = wx.Gauge(left_panel, range=1)
+        self.merge_status = wx.StaticText(left_panel, label="")
+
         left_sizer.Add(file_btn, flag=wx.ALL, border=5)
         left_sizer.Add(self.image_panel, proportion=1, flag=wx.EXPAND | wx.ALL, border=10)
         # 加入左侧面板布局
         left_sizer.Add(preset_sizer, flag=wx.EXPAND | wx.LEFT | wx.RIGHT | wx.BOTTOM, border=10)
         left_sizer.Add(bleach_sizer, flag=wx.EXPAND | wx.LEFT | wx.RIGHT | wx.BOTTOM, border=10)
+        left_sizer.Add(layout_sizer, flag=wx.EXPAND | wx.LEFT | wx.RIGHT | wx.BOTTOM, border=10)
         left_sizer.Add(button_sizer, flag=wx.ALL, border=5)
+        left_sizer.Add(self.merge_gauge, flag=wx.EXPAND | wx.LEFT | wx.RIGHT, border=10)
+        left_sizer.Add(self.merge_status, flag=wx.ALL, border=10)
 
         left_panel.SetSizer(left_sizer)
 
@@ -264,11 +383,16 @@ class MainFrame(wx.Frame):
         main_sizer.Add(right_panel, 2, wx.EXPAND | wx.ALL, 10)
         panel.SetSizer(main_sizer)
 
-        self.merged_pages = []
+        self.merged_pages = []  # 合并结果（MergedPage，按需合成像素）
+        self.prepared_images = []  # 最近一次合并处理好的图片
+        self.merge_job = None  # 最近一次完成的合并参数 (图片路径, 准备参数, 排版策略, 间距)，保存时按输出分辨率重新处理
+        self.merge_cancel_event = None  # 正在进行的合并的取消标志
+        self.merge_generation = 0  # 合并任务编号，旧任务的回调据此丢弃
+        self.item_cache = PreparedItemCache()  # 已处理图片缓存，再次合并时只处理变化的图片
 
     def on_choose_files(self, event):
-        wildcard = "Image files (*.png;*.jpg;*.jpeg)|*.png;*.jpg;*.jpeg"
-        dialog = wx.FileDialog(self, "选择图片文件", wildcard=wildcard, style=wx.FD_OPEN | wx.FD_MULTIPLE)
+        dialog = wx.FileDialog(self, "选择图片文件", wildcard=file_wildcard(MERGE_IMAGE_FORMATS),
+                               style=wx.FD_OPEN | wx.FD_MULTIPLE)
         if dialog.ShowModal() == wx.ID_OK:
             paths = dialog.GetPaths()
             self.image_panel.add_images(paths)
@@ -281,6 +405,7 @@ class MainFrame(wx.Frame):
         """
         is_checked = self.bleach_checkbox.GetValue()
         self.bleach_stage_choice.Enable(is_checked)
+        self.autotune_checkbox.Enable(is_checked)
 
         # # 可选：如果想在未勾选时重置为默认选项
         # if not is_checked:
@@ -369,9 +494,12 @@ class MainFrame(wx.Frame):
             wx.MessageBox("请输入有效的宽度数值。", "错误", wx.OK | wx.ICON_ERROR)
             return
 
+        # 本次合并的输出分辨率，像素单位的宽度和间距均按该分辨率解释
+        dpi = DPI_CHOICES[self.dpi_choice.GetSelection()]
+
         # 根据用户选择的单位(mm或px)转换目标宽度为像素
         unit = 'mm' if self.unit_choice.GetSelection() == 0 else 'px'
-        target_width_px = mm_to_pixel(target_width) if unit == 'mm' else int(target_width)
+        target_width_px = mm_to_pixel(target_width, dpi) if unit == 'mm' else int(target_width)
 
         # 获取图片间距并进行有效性检查
         try:
@@ -382,77 +510,102 @@ class MainFrame(wx.Frame):
 
         # 根据用户选择的单位(mm或px)转换间距为像素
         gap_unit = 'mm' if self.gap_unit_choice.GetSelection() == 0 else 'px'
-        gap_height = mm_to_pixel(gap_value) if gap_unit == 'mm' else int(gap_value)
-
-        # 初始化页面和当前绘制位置
-        pages = []  # 存储所有合并后的页面
-        current_page = Image.new('RGB', A4_SIZE_PX, color='white')  # 创建新A4页面
-        draw_y = 0  # 当前绘制位置的Y坐标
-        items = []   # 存储当前页面的图片对象和高度
-
-        # 遍历所有图片路径
-        for path in self.image_panel.image_paths:
-            with Image.open(path) as img:  # 打开图片文件
-                # 根据预设模式计算目标尺寸
-                index = self.preset_choice.GetSelection()
-                if index == 0:  # 户口本模式
-                    target_size = HUKOU_SIZE_PX
-                elif index == 1:  # 身份证模式
-                    target_size = ID_CARD_SIZE_PX
-                elif index == 2:  # 学生证模式
-                    target_size = STUDENT_CARD_SIZE_PX
-                else:  # 自定义模式
-                    ratio = target_width_px / img.width
-                    target_size = (target_width_px, int(img.height * ratio))
-
-                # 缩放图片到目标尺寸，使用LANCZOS算法保持高质量
-                resized_img = img.resize(target_size, Image.LANCZOS)
-
-                # 如果勾选了漂白处理，根据选择的处理阶段进行处理
-                if self.bleach_checkbox.GetValue():
-                    stage_index = self.bleach_stage_choice.GetSelection()
-                    if stage_index == 0:  # 二值化处理
-                        resized_img = bleach_image(resized_img)
-                    elif stage_index == 1:  # 背景去除
-                        resized_img = image_removed_background(resized_img)
-                    elif stage_index == 2:  # 优化处理
-                        resized_img = enhanced_image(resized_img)
-
-                # 检查当前页面是否还能放下这张图片
-                if draw_y + resized_img.height > A4_SIZE_PX[1]:
-                    # 计算垂直居中位置
-                    y_offset = (A4_SIZE_PX[1] - draw_y + gap_height) // 2
-                    # 将当前页面所有图片居中放置
-                    for img_obj, h in items:
-                        x = (A4_SIZE_PX[0] - img_obj.width) // 2  # 水平居中
-                        current_page.paste(img_obj, (x, y_offset))
-                        y_offset += h + gap_height
-                    # 完成当前页，添加到pages列表
-                    pages.append(current_page)
-                    # 创建新页面
-                    current_page = Image.new('RGB', A4_SIZE_PX, color='white')
-                    draw_y = 0
-                    items.clear()
-
-                # 将处理后的图片添加到当前页面的绘制列表
-                items.append((resized_img, resized_img.height))
-                draw_y += resized_img.height + gap_height
-
-        # 处理最后一页的绘制
-        if items:
-            y_offset = (A4_SIZE_PX[1] - draw_y + gap_height) // 2
-            for img_obj, h in items:
-                x = (A4_SIZE_PX[0] - img_obj.width) // 2
-                current_page.paste(img_obj, (x, y_offset))
-                y_offset += h + gap_height
-            pages.append(current_page)
-
-        # 显示合并后的预览并保存结果
-        self.preview_panel.show_preview(pages)
-        self.merged_pages = pages  # 保存合并结果
+        gap_height = mm_to_pixel(gap_value, dpi) if gap_unit == 'mm' else int(gap_value)
+
+        # 本次合并的处理参数；已处理过且文件未变化的图片直接从缓存取出，只重新排版
+        bleach_stage = self.bleach_stage_choice.GetSelection() if self.bleach_checkbox.GetValue() else None
+        options = PrepareOptions(preset=PRESET_NAMES[self.preset_choice.GetSelection()],
+                                 target_width=target_width_px,
+                                 bleach_stage=bleach_stage,
+                                 auto_tune=bleach_stage is not None and self.autotune_checkbox.GetValue(),
+                                 quality=QUALITY_NAMES[self.quality_choice.GetSelection()],
+                                 dpi=dpi,
+                                 page_mode=PAGE_MODE_NAMES[self.page_mode_choice.GetSelection()])
+        strategy = list(LAYOUT_STRATEGIES)[self.layout_choice.GetSelection()]
+        self.start_merge(list(self.image_panel.image_paths), options, strategy, gap_height)
+
+    def start_merge(self, paths, options, strategy, gap):
+        """
+        在后台线程中合并：先按输出分辨率排版，再在线程池中按屏幕分辨率并行读取、缩放、漂白，
+        每完成一页就显示到预览中。开始新的合并时取消上一次尚未完成的合并。
+        保存时才按输出分辨率处理图片（见 start_export）。
+
+        参数:
+            paths (list[str]): 图片路径
+            options (PrepareOptions): 准备参数
+            strategy (str): 排版策略
+            gap (int): 图片间距（像素）
+        """
+        if self.merge_cancel_event is not None:
+            self.merge_cancel_event.set()
+        self.merge_generation += 1
+        generation = self.merge_generation
+        cancel_event = threading.Event()
+        self.merge_cancel_event = cancel_event
+
+        self.merged_pages = []
+        self.merge_job = None
+        self.preview_panel.show_preview([])
+        self.merge_gauge.SetRange(max(len(paths), 1))
+        self.merge_gauge.SetValue(0)
+        self.merge_status.SetLabel("正在合并…")
+        self.cancel_merge_btn.Enable(True)
+
+        def current():
+            # 只处理最新一次合并的回调
+            return generation == self.merge_generation
+
+        def update(done, total):
+            if current():
+                self.merge_gauge.SetValue(done)
+                self.merge_status.SetLabel(f"已处理 {done} / {total} 张")
+
+        def add_page(page):
+            if current():
+                self.preview_panel.add_page(page)
+
+        def finish(result, message, icon=None):
+            if not current():
+                return
+            self.merge_cancel_event = None
+            self.cancel_merge_btn.Enable(False)
+            self.merge_status.SetLabel(message)
+            if result is not None:
+                self.prepared_images = result.images
+                self.merged_pages = result.pages  # 保存合并结果（屏幕分辨率，仅用于预览）
+                self.merge_job = (paths, options, strategy, gap)
+            if icon is not None:
+                wx.MessageBox(message, "错误", wx.OK | icon)
+
+        def worker():
+            start_time = time.perf_counter()
+            try:
+                result = merge_pages(paths, options, strategy, gap, tuner=self.auto_tuner, cache=self.item_cache,
+                                     progress=lambda done, total: wx.CallAfter(update, done, total),
+                                     page_ready=lambda number, page: wx.CallAfter(add_page, page),
+                                     cancel_event=cancel_event, render_dpi=SCREEN_DPI)
+            except MergeCancelled:
+                wx.CallAfter(finish, None, "已取消合并。")
+                return
+            except Exception as e:
+                logger.error(f"处理图片失败：{e}")
+                wx.CallAfter(finish, None, f"处理图片失败：{e}", wx.ICON_ERROR)
+                return
+            logger.info(f"排版方式 {strategy}：{len(paths)} 张图片，{len(result.pages)} 页，"
+                        f"排版耗时 {result.timings['layout'] * 1000:.2f} 毫秒；"
+                        f"准备图片（新处理 {result.new_items} 张）耗时 {result.timings['prepare']:.2f} 秒")
+            wx.CallAfter(finish, result,
+                         f"合并完成：{len(result.pages)} 页，耗时 {time.perf_counter() - start_time:.2f} 秒")
+
+        threading.Thread(target=worker, daemon=True).start()
+
+    def on_cancel_merge(self, event):
+        """取消正在进行的合并"""
+        if self.merge_cancel_event is not None:
+            self.merge_cancel_event.set()
 
     def on_save(self, event):
-        if not self.merged_pages:
+        if not self.merged_pages or self.merge_job is None:
             wx.MessageBox("没有可保存的合并内容，请先进行合并。", "提示", wx.OK | wx.ICON_INFORMATION)
             return
 
@@ -465,23 +618,89 @@ class MainFrame(wx.Frame):
             self,
             "另存为",
             defaultDir=default_path,  # 设置默认目录
-            wildcard="JPG 文件 (*.jpg)|*.jpg|PNG 文件 (*.png)|*.png",
+            wildcard="PDF 文件 (*.pdf)|*.pdf|TIFF 文件 (*.tif)|*.tif|JPG 文件 (*.jpg)|*.jpg|PNG 文件 (*.png)|*.png|"
+                     "Word 文件 (*.docx)|*.docx",
             style=wx.FD_SAVE | wx.FD_OVERWRITE_PROMPT
         )
         if dialog.ShowModal() == wx.ID_OK:
-            path = dialog.GetPath()
-            ext = os.path.splitext(path)[1].lower()
-            if ext in ['.jpg', '.png', '.jpeg']:
-                save_path = path
-                format_type = "JPEG" if ext in ('.jpg', '.jpeg') else "PNG"
-            else:
-                save_path = path + ".jpg"  # 默认改为jpg扩展名
-                format_type = "JPEG"
-
-            self.merged_pages[0].save(save_path, format=format_type)
-            wx.MessageBox(f"保存成功：{save_path}", "提示", wx.OK | wx.ICON_INFORMATION)
+            save_path = dialog.GetPath()
+            if export_format_for(save_path) is None:
+                # 没有写扩展名时按所选的文件类型补上
+                save_path += SAVE_EXTENSIONS[dialog.GetFilterIndex()]
+            if self.confirm_overwrite(save_path):
+                self.start_export(save_path)
         dialog.Destroy()
 
+    def confirm_overwrite(self, save_path):
+        """
+        JPG / PNG 每页一个带页码的文件，保存对话框只检查了用户输入的文件名；
+        实际要写出的文件已存在时询问是否覆盖
+
+        返回:
+            bool: 是否继续保存
+        """
+        existing = [path for path in export_paths(save_path, len(self.merged_pages))
+                    if path != save_path and os.path.exists(path)]
+        if not existing:
+            return True
+        names = "\n".join(os.path.basename(path) for path in existing[:10])
+        if len(existing) > 10:
+            names += f"\n……共 {len(existing)} 个文件"
+        answer = wx.MessageBox(f"以下文件已存在，是否覆盖？\n{names}", "确认覆盖", wx.YES_NO | wx.ICON_WARNING)
+        return answer == wx.YES
+
+    def start_export(self, save_path):
+        """
+        在后台线程中按输出分辨率重新处理图片（缓存中已有的直接复用），再逐页合成并写出所有页面，
+        进度对话框显示进度并支持取消。PDF / TIFF / Word 写成一个多页文件，JPG / PNG 每页一个文件。
+
+        参数:
+            save_path (str): 保存路径
+        """
+        paths, options, strategy, gap = self.merge_job
+        page_count = len(self.merged_pages)
+        cancel_event = threading.Event()
+        finished = threading.Event()
+        progress_dialog = wx.ProgressDialog(
+            "正在保存", f"正在保存 {os.path.basename(save_path)}", maximum=len(paths) + page_count, parent=self,
+            style=wx.PD_CAN_ABORT | wx.PD_AUTO_HIDE | wx.PD_ELAPSED_TIME | wx.PD_REMAINING_TIME)
+
+        def update(value, message):
+            # 在界面线程中更新进度，用户点击取消时通知导出线程
+            if finished.is_set():
+                return
+            keep_going, _ = progress_dialog.Update(value, message)
+            if not keep_going:
+                cancel_event.set()
+
+        def finish(message, icon):
+            finished.set()
+            progress_dialog.Destroy()
+            wx.MessageBox(message, "提示", wx.OK | icon)
+
+        def worker():
+            try:
+                # 排版与预览相同，只是图片按输出分辨率处理
+                result = merge_pages(paths, options, strategy, gap, tuner=self.auto_tuner, cache=self.item_cache,
+                                     progress=lambda done, total: wx.CallAfter(
+                                         update, done, f"正在处理 {done} / {total} 张图片（{options.dpi} dpi）"),
+                                     cancel_event=cancel_event)
+                written = export_pages(result.pages, save_path, dpi=options.dpi,
+                                       progress=lambda done, total: wx.CallAfter(
+                                           update, len(paths) + done, f"已保存 {done} / {total} 页"),
+                                       cancel_event=cancel_event)
+                if len(written) == 1:
+                    message = f"保存成功：{written[0]}"
+                else:
+                    message = f"保存成功：共 {len(written)} 个文件，保存在 {os.path.dirname(save_path)}"
+                wx.CallAfter(finish, message, wx.ICON_INFORMATION)
+            except (MergeCancelled, ExportCancelled):
+                wx.CallAfter(finish, "已取消保存。", wx.ICON_INFORMATION)
+            except Exception as e:
+                logger.error(f"保存失败：{e}")
+                wx.CallAfter(finish, f"保存失败：{e}", wx.ICON_ERROR)
+
+        threading.Thread(target=worker, daemon=True).start()
 
 if __name__ == "__main__":
     app = wx.App()
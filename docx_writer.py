@@ -0,0 +1,259 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+流式 DOCX 写入器
+
+python-docx 会在内存中保存整个文档和所有图片数据，直到 save() 时才写文件。
+这里每插入一张图片就把图片数据直接写进 zip（原图文件按块复制，不整体读入内存），
+正文 XML 先写到临时文件，close() 时再写入 zip，上千张图片的文档内存占用也保持不变。
+生成的文档只包含图片段落和页面设置：图片可以单独占一个段落（与图片生成 Word 工具原来的输出一致），
+也可以按排版结果定位在页面上，一页排多张。
+"""
+import os
+import shutil
+import tempfile
+import zipfile
+from xml.sax.saxutils import escape
+
+from image_io import SNIFF_BYTES, sniff_image_format, sniff_image_header
+from image_probe import ORIENTATION_TRANSFORMS
+
+EMU_PER_CM = 360000   # DrawingML 长度单位
+ROTATION_UNITS = 60000  # DrawingML 角度单位（1/60000 度）
+TWIPS_PER_CM = 1440 / 2.54  # 页面设置长度单位（1/20 磅）
+
+# 图片格式 -> (扩展名, MIME 类型)
+IMAGE_CONTENT_TYPES = {
+    "JPEG": ("jpeg", "image/jpeg"),
+    "PNG": ("png", "image/png"),
+    "GIF": ("gif", "image/gif"),
+    "BMP": ("bmp", "image/bmp"),
+    "TIFF": ("tiff", "image/tiff"),
+}
+
+_NAMESPACES = (
+    'xmlns:w="http://schemas.openxmlformats.org/wordprocessingml/2006/main" '
+    'xmlns:r="http://schemas.openxmlformats.org/officeDocument/2006/relationships" '
+    'xmlns:wp="http://schemas.openxmlformats.org/drawingml/2006/wordprocessingDrawing" '
+    'xmlns:a="http://schemas.openxmlformats.org/drawingml/2006/main" '
+    'xmlns:pic="http://schemas.openxmlformats.org/drawingml/2006/picture"'
+)
+_IMAGE_RELATIONSHIP = "http://schemas.openxmlformats.org/officeDocument/2006/relationships/image"
+
+
+class DocxStreamWriter:
+    """
+    逐张追加图片的 DOCX 写入器
+
+    用法:
+        with DocxStreamWriter(path) as doc:
+            doc.add_picture("a.jpg", width_cm=21.0, height_cm=15.0)
+    """
+
+    def __init__(self, path, page_width_cm=21.0, page_height_cm=29.7, margin_cm=0):
+        """
+        参数:
+            path (str): 输出 .docx 路径
+            page_width_cm (float): 页面宽度（厘米）
+            page_height_cm (float): 页面高度（厘米）
+            margin_cm (float): 上下左右页边距（厘米）
+        """
+        self.path = path
+        self.page_size_cm = (page_width_cm, page_height_cm)
+        self.margin_cm = margin_cm
+        self._zip = zipfile.ZipFile(path, "w", compression=zipfile.ZIP_DEFLATED)
+        self._body = tempfile.TemporaryFile(mode="w+", encoding="utf-8")
+        self._relationships = []  # (关系编号, 图片在包内的路径)
+        self._extensions = {}  # 扩展名 -> MIME 类型
+        self._page_runs = []  # 当前页尚未写出的定位图片
+        self._pages = 0  # 已写出的定位图片页数
+        self._closed = False
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+        else:
+            # 出错时不留下损坏的文档
+            self.abort()
+
+    @property
+    def picture_count(self):
+        return len(self._relationships)
+
+    def add_picture(self, source, width_cm, height_cm, orientation=1):
+        """
+        插入一张图片，单独占一个段落
+
+        参数:
+            source (str|bytes): 图片文件路径或图片数据
+            width_cm (float): 显示宽度（厘米）
+            height_cm (float): 显示高度（厘米）
+            orientation (int): EXIF 方向，用图形的翻转和旋转显示，不解码像素
+
+        异常:
+            ValueError: 不支持的图片格式
+        """
+        self._end_page()
+        number, relationship_id, media_name = self._store_image(source)
+        extent, graphic = self._picture_graphic(number, relationship_id, media_name, width_cm, height_cm,
+                                                orientation)
+        self._body.write(f'<w:p><w:r><w:drawing><wp:inline distT="0" distB="0" distL="0" distR="0">{extent}'
+                         f'<wp:docPr id="{number}" name="Picture {number}"/>{graphic}</wp:inline>'
+                         f'</w:drawing></w:r></w:p>\n')
+
+    def add_positioned_picture(self, source, x_cm, y_cm, width_cm, height_cm, orientation=1):
+        """
+        在当前页的指定位置插入一张图片（相对页面左上角定位，不参与文字排版），
+        用于一页排多张图片；一页的图片插入完后调用 end_page()
+
+        参数:
+            source (str|bytes): 图片文件路径或图片数据
+            x_cm (float): 图片左边距页面左边的距离（厘米）
+            y_cm (float): 图片上边距页面上边的距离（厘米）
+            width_cm (float): 显示宽度（厘米）
+            height_cm (float): 显示高度（厘米）
+            orientation (int): EXIF 方向
+
+        异常:
+            ValueError: 不支持的图片格式
+        """
+        number, relationship_id, media_name = self._store_image(source)
+        extent, graphic = self._picture_graphic(number, relationship_id, media_name, width_cm, height_cm,
+                                                orientation)
+        # 旋转 90/270 度时定位的是未旋转的图形，按显示框居中换算
+        cx, cy = round(width_cm * EMU_PER_CM), round(height_cm * EMU_PER_CM)
+        flip_h, rotation = ORIENTATION_TRANSFORMS.get(orientation, (False, 0))
+        shift_x, shift_y = ((cx - cy) // 2, (cy - cx) // 2) if rotation in (90, 270) else (0, 0)
+        x, y = round(x_cm * EMU_PER_CM) + shift_x, round(y_cm * EMU_PER_CM) + shift_y
+        self._page_runs.append(
+            f'<w:r><w:drawing><wp:anchor distT="0" distB="0" distL="0" distR="0" simplePos="0" '
+            f'relativeHeight="{number}" behindDoc="0" locked="0" layoutInCell="1" allowOverlap="1">'
+            f'<wp:simplePos x="0" y="0"/>'
+            f'<wp:positionH relativeFrom="page"><wp:posOffset>{x}</wp:posOffset></wp:positionH>'
+            f'<wp:positionV relativeFrom="page"><wp:posOffset>{y}</wp:posOffset></wp:positionV>'
+            f'{extent}<wp:wrapNone/><wp:docPr id="{number}" name="Picture {number}"/>{graphic}'
+            f'</wp:anchor></w:drawing></w:r>')
+
+    def end_page(self):
+        """结束当前页：写出定位图片所在的段落，之后插入的图片从新的一页开始"""
+        self._end_page()
+
+    def _end_page(self):
+        if not self._page_runs:
+            return
+        # 除第一页外，每页的段落都从新页开始
+        page_break = "<w:pPr><w:pageBreakBefore/></w:pPr>" if self._pages else ""
+        self._body.write(f"<w:p>{page_break}{''.join(self._page_runs)}</w:p>\n")
+        self._page_runs = []
+        self._pages += 1
+
+    def _store_image(self, source):
+        """把图片数据写入包内，返回 (编号, 关系编号, 包内路径)"""
+        is_path = isinstance(source, (str, os.PathLike))
+        fmt = sniff_image_format(source) if is_path else sniff_image_header(source[:SNIFF_BYTES])
+        if fmt not in IMAGE_CONTENT_TYPES:
+            raise ValueError(f"不支持插入 Word 的图片格式：{fmt}")
+        extension, content_type = IMAGE_CONTENT_TYPES[fmt]
+        self._extensions[extension] = content_type
+
+        number = len(self._relationships) + 1
+        media_name = f"media/image{number}.{extension}"
+        # 图片本身已压缩，直接存储不再压缩
+        info = zipfile.ZipInfo(f"word/{media_name}", date_time=(1980, 1, 1, 0, 0, 0))
+        info.compress_type = zipfile.ZIP_STORED
+        with self._zip.open(info, "w", force_zip64=True) as target:
+            if is_path:
+                with open(source, "rb") as f:
+                    shutil.copyfileobj(f, target, 1024 * 1024)
+            else:
+                target.write(source)
+        relationship_id = f"rId{number}"
+        self._relationships.append((relationship_id, media_name))
+        return number, relationship_id, media_name
+
+    @staticmethod
+    def _picture_graphic(number, relationship_id, media_name, width_cm, height_cm, orientation=1):
+        """生成图片的占位尺寸和图形 XML，返回 (extent, graphic)"""
+        cx, cy = round(width_cm * EMU_PER_CM), round(height_cm * EMU_PER_CM)
+        name = escape(os.path.basename(media_name), {'"': "&quot;"})
+        flip_h, rotation = ORIENTATION_TRANSFORMS.get(orientation, (False, 0))
+        # 图形按存储方向的尺寸绘制再旋转；与 Word 相同，旋转 90/270 度时用 effectExtent 把占位修正为显示尺寸
+        shape_cx, shape_cy = (cy, cx) if rotation in (90, 270) else (cx, cy)
+        edge_x, edge_y = (cx - shape_cx) // 2, (cy - shape_cy) // 2
+        transform = (f' rot="{rotation * ROTATION_UNITS}"' if rotation else "") + (' flipH="1"' if flip_h else "")
+        extent = (f'<wp:extent cx="{shape_cx}" cy="{shape_cy}"/>'
+                  f'<wp:effectExtent l="{edge_x}" t="{edge_y}" r="{edge_x}" b="{edge_y}"/>')
+        graphic = (
+            f'<wp:cNvGraphicFramePr><a:graphicFrameLocks noChangeAspect="1"/></wp:cNvGraphicFramePr>'
+            f'<a:graphic><a:graphicData uri="http://schemas.openxmlformats.org/drawingml/2006/picture">'
+            f'<pic:pic><pic:nvPicPr><pic:cNvPr id="{number}" name="{name}"/><pic:cNvPicPr/></pic:nvPicPr>'
+            f'<pic:blipFill><a:blip r:embed="{relationship_id}"/><a:stretch><a:fillRect/></a:stretch></pic:blipFill>'
+            f'<pic:spPr><a:xfrm{transform}><a:off x="0" y="0"/>'
+            f'<a:ext cx="{shape_cx}" cy="{shape_cy}"/></a:xfrm>'
+            f'<a:prstGeom prst="rect"><a:avLst/></a:prstGeom></pic:spPr></pic:pic>'
+            f'</a:graphicData></a:graphic>'
+        )
+        return extent, graphic
+
+    def _section_properties(self):
+        width, height = (round(size * TWIPS_PER_CM) for size in self.page_size_cm)
+        margin = round(self.margin_cm * TWIPS_PER_CM)
+        return (f'<w:sectPr><w:pgSz w:w="{width}" w:h="{height}"/>'
+                f'<w:pgMar w:top="{margin}" w:right="{margin}" w:bottom="{margin}" w:left="{margin}" '
+                f'w:header="0" w:footer="0" w:gutter="0"/></w:sectPr>')
+
+    def close(self):
+        """写出正文、关系和内容类型，完成文档"""
+        if self._closed:
+            return
+        self._end_page()
+        self._closed = True
+        with self._zip.open("word/document.xml", "w", force_zip64=True) as target:
+            target.write(f'<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+                         f'<w:document {_NAMESPACES}><w:body>\n'.encode("utf-8"))
+            self._body.seek(0)
+            for chunk in iter(lambda: self._body.read(1024 * 1024), ""):
+                target.write(chunk.encode("utf-8"))
+            # Word 要求正文至少有一个段落
+            if not self._relationships:
+                target.write(b"<w:p/>")
+            target.write(f"{self._section_properties()}</w:body></w:document>".encode("utf-8"))
+        self._body.close()
+
+        relationships = "".join(f'<Relationship Id="{relationship_id}" Type="{_IMAGE_RELATIONSHIP}" '
+                                f'Target="{media_name}"/>' for relationship_id, media_name in self._relationships)
+        self._zip.writestr("word/_rels/document.xml.rels",
+                           '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+                           '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+                           f"{relationships}</Relationships>")
+        self._zip.writestr("_rels/.rels",
+                           '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+                           '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+                           '<Relationship Id="rId1" '
+                           'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument" '
+                           'Target="word/document.xml"/></Relationships>')
+        defaults = "".join(f'<Default Extension="{extension}" ContentType="{content_type}"/>'
+                           for extension, content_type in sorted(self._extensions.items()))
+        self._zip.writestr("[Content_Types].xml",
+                           '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+                           '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+                           '<Default Extension="rels" '
+                           'ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+                           '<Default Extension="xml" ContentType="application/xml"/>'
+                           f"{defaults}"
+                           '<Override PartName="/word/document.xml" ContentType="application/'
+                           'vnd.openxmlformats-officedocument.wordprocessingml.document.main+xml"/></Types>')
+        self._zip.close()
+
+    def abort(self):
+        """放弃写入并删除未完成的文件"""
+        if self._closed:
+            return
+        self._closed = True
+        self._body.close()
+        self._zip.close()
+        if os.path.exists(self.path):
+            os.remove(self.path)
@@ -0,0 +1,141 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+拖入文件夹时的后台图片扫描
+
+用 os.scandir 递归遍历文件夹，按文件头的魔数识别图片格式（不看扩展名），
+每个目录内按自然顺序排序（img2 排在 img10 之前），结果分批交给界面，扫描可随时取消。
+"""
+import os
+import re
+import threading
+
+from loguru import logger
+
+from image_io import sniff_image_format
+
+
+def natural_sort_key(path):
+    """自然排序键：文件名中的数字按数值比较，不区分大小写"""
+    return [int(part) if part.isdigit() else part.lower() for part in re.split(r"(\d+)", os.path.basename(path))]
+
+
+def iter_image_files(paths, formats=None, cancel_event=None, rejected=None):
+    """
+    展开拖入的文件和文件夹，逐个产出识别为图片的文件
+
+    文件按拖入顺序处理，文件夹递归遍历：每个目录先按自然顺序处理其中的文件，再依次进入子目录。
+
+    参数:
+        paths (list[str]): 拖入的文件或文件夹
+        formats (tuple[str]): 接受的格式名称，为 None 时接受所有可识别的图片
+        cancel_event (threading.Event): 置位后停止扫描
+        rejected (list): 不为 None 时记入未被接受的 (文件路径, 原因)：格式不在 formats 中的图片，
+                         以及直接指定的不是图片的文件；文件夹中的非图片文件不记录
+
+    返回:
+        generator[str]: 图片文件路径
+    """
+    def accepted(path, explicit=False):
+        fmt = sniff_image_format(path)
+        if fmt is not None and (formats is None or fmt in formats):
+            return True
+        if rejected is not None and (fmt is not None or explicit):
+            rejected.append((path, f"不支持的图片格式：{fmt}" if fmt else "不是可识别的图片文件"))
+        return False
+
+    for path in paths:
+        if cancel_event is not None and cancel_event.is_set():
+            return
+        if not os.path.isdir(path):
+            if accepted(path, explicit=True):
+                yield path
+            continue
+        pending_dirs = [path]
+        while pending_dirs:
+            directory = pending_dirs.pop()
+            files = []
+            subdirs = []
+            try:
+                with os.scandir(directory) as entries:
+                    for entry in entries:
+                        try:
+                            if entry.is_dir(follow_symlinks=False):
+                                subdirs.append(entry.path)
+                            elif entry.is_file():
+                                files.append(entry.path)
+                        except OSError:
+                            continue
+            except OSError as e:
+                logger.warning(f"无法读取目录 {directory}：{e}")
+                continue
+            for file_path in sorted(files, key=natural_sort_key):
+                if cancel_event is not None and cancel_event.is_set():
+                    return
+                if accepted(file_path):
+                    yield file_path
+            # 栈顶为自然顺序中的第一个子目录
+            pending_dirs.extend(sorted(subdirs, key=natural_sort_key, reverse=True))
+
+
+class FolderScanner:
+    """
+    在后台线程中扫描拖入的文件和文件夹，分批回调
+
+    回调在扫描线程中执行，界面程序应在回调中用 wx.CallAfter 转回界面线程。
+    """
+
+    def __init__(self, formats=None, batch_size=200):
+        """
+        参数:
+            formats (tuple[str]): 接受的格式名称，见 sniff_image_format
+            batch_size (int): 每批回调的文件数
+        """
+        self.formats = formats
+        self.batch_size = batch_size
+        self._active = set()  # 正在进行的扫描的取消标志
+        self._lock = threading.Lock()
+
+    @property
+    def running(self):
+        return bool(self._active)
+
+    def start(self, paths, on_batch, on_done=None):
+        """
+        开始扫描；上一次扫描尚未结束时两次扫描同时进行，结果都会交给各自的回调
+
+        参数:
+            paths (list[str]): 拖入的文件或文件夹
+            on_batch (callable): on_batch(路径列表)，每扫描到 batch_size 个图片回调一次
+            on_done (callable): on_done(图片总数, 是否被取消)
+        """
+        cancel_event = threading.Event()
+        with self._lock:
+            self._active.add(cancel_event)
+
+        def worker():
+            batch = []
+            count = 0
+            for path in iter_image_files(paths, self.formats, cancel_event):
+                if cancel_event.is_set():
+                    break
+                batch.append(path)
+                count += 1
+                if len(batch) >= self.batch_size:
+                    on_batch(batch)
+                    batch = []
+            if batch and not cancel_event.is_set():
+                on_batch(batch)
+            cancelled = cancel_event.is_set()
+            with self._lock:
+                self._active.discard(cancel_event)
+            if on_done:
+                on_done(count, cancelled)
+
+        threading.Thread(target=worker, daemon=True).start()
+
+    def cancel(self):
+        """取消所有正在进行的扫描"""
+        with self._lock:
+            for cancel_event in self._active:
+                cancel_event.set()
@@ -2,13 +2,28 @@
 # -*- coding: utf-8 -*-
 import wx
 import os
-from docx import Document
-from docx.shared import Cm
-from PIL import Image
+import threading
 from loguru import logger
 
 from imageMergerDoc_UI import Main_Ui_Frame  # 导入生成的界面类
-from FileDropTarget import FileDropTarget  # 导入文件拖放类
+from FileDropTarget import DOC_IMAGE_FORMATS, FileDropTarget  # 导入文件拖放类
+from image_io import file_wildcard  # 与拖放一致的扩展名过滤器
+from merge_export import ExportCancelled  # 生成被取消
+from image_list import ImageListModel, ImageListCtrl  # 图片列表模型与虚拟列表控件
+from doc_images import DEFAULT_DOC_DPI, format_size_saving  # 按打印尺寸缩小图片
+from batch_doc import build_word_document  # 并行准备图片并流式写出 Word 文档
+from thumbnail_cache import ThumbnailCache, neighbour_paths  # 预览缩略图缓存与预取
+
+# 插入 Word 的图片分辨率，顺序与界面上的下拉框一致；None 表示插入原图
+DOC_DPI_CHOICES = [None, 150, 200, 300]
+# 每页排版：(名称, build_word_document 的排版参数)，顺序与界面上的下拉框一致
+DOC_LAYOUT_CHOICES = [
+    ("整页宽度", {}),
+    ("每行 2 张", {"columns": 2}),
+    ("每行 3 张", {"columns": 3}),
+    ("每页 2 × 3 张", {"columns": 2, "rows": 3}),
+    ("身份证实际尺寸", {"preset": "id_card"}),
+]
 class MainFrame(Main_Ui_Frame):
     """
         主应用程序类：将图片插入到 Word 文档中。
@@ -20,7 +35,7 @@ class MainFrame(Main_Ui_Frame):
 
         依赖库：
         - wxPython: GUI 界面框架。
-        - python-docx: 用于创建和编辑 Word 文档。
+        - docx_writer: 流式写出 Word 文档。
         - Pillow (PIL): 图片处理。
     """
     def __init__(self, parent):
@@ -34,13 +49,46 @@ class MainFrame(Main_Ui_Frame):
         except Exception as e:
             logger.error(f"Failed to load icon: {e}")
             
-        self.image_paths = []  # 存储已选图片路径
-        
+        # 图片列表：按路径哈希去重；用虚拟列表替换界面文件中的 ListBox，导入数千张图片也不会卡顿
+        # 格式已由文件选择对话框或拖放扫描（按文件头）检查，这里不再按扩展名过滤
+        self.image_list = ImageListModel()
+        self.image_paths = self.image_list.paths  # 存储已选图片路径（与列表模型共用同一列表）
+        list_ctrl = ImageListCtrl(self.LeftPanel, self.image_list, show_full_path=True)
+        self.LeftPanel.GetSizer().Replace(self.m_ImageListBox, list_ctrl)
+        # 拖放目标归原 ListBox 所有，随其一起销毁，为新列表创建新的拖放目标
+        self.m_ImageListBox.Destroy()
+        self.m_ImageListBox = list_ctrl
+        self.drop_target = FileDropTarget(self)
+        self.m_ImageListBox.SetDropTarget(self.drop_target)
+        self.m_ImageListBox.Bind(wx.EVT_LIST_ITEM_SELECTED, self.on_preview_image)
+
+        # 图片分辨率：按打印尺寸缩小并重新压缩，避免把 1200 万像素原图整张放进文档
+        dpi_sizer = wx.BoxSizer(wx.HORIZONTAL)
+        dpi_sizer.Add(wx.StaticText(self.LeftPanel, label="图片分辨率："), 0, wx.ALIGN_CENTER_VERTICAL)
+        self.dpi_choice = wx.Choice(self.LeftPanel, choices=["原图", "150 dpi", "200 dpi", "300 dpi"])
+        self.dpi_choice.SetSelection(DOC_DPI_CHOICES.index(DEFAULT_DOC_DPI))
+        dpi_sizer.Add(self.dpi_choice, 0, wx.LEFT, 5)
+        left_sizer = self.LeftPanel.GetSizer()
+        left_sizer.Insert(left_sizer.GetItemCount() - 1, dpi_sizer, 0, wx.LEFT | wx.RIGHT, 5)
+
+        # 每页排版：卡片、票据等小图可按单元格缩放，一页排多张
+        layout_sizer = wx.BoxSizer(wx.HORIZONTAL)
+        layout_sizer.Add(wx.StaticText(self.LeftPanel, label="每页排版："), 0, wx.ALIGN_CENTER_VERTICAL)
+        self.layout_choice = wx.Choice(self.LeftPanel, choices=[name for name, _ in DOC_LAYOUT_CHOICES])
+        self.layout_choice.SetSelection(0)
+        layout_sizer.Add(self.layout_choice, 0, wx.LEFT, 5)
+        left_sizer.Insert(left_sizer.GetItemCount() - 1, layout_sizer, 0, wx.LEFT | wx.RIGHT, 5)
+        self.LeftPanel.Layout()
+
+        # 预览缩略图：内存 + 磁盘缓存，选中图片时在后台预取相邻图片
+        self.thumbnails = ThumbnailCache(size=tuple(self.PreviewBitmap.GetSize()))
+        self.preview_path = None  # 当前应显示的图片，用于丢弃过期的后台结果
+        self.Bind(wx.EVT_CLOSE, self.on_close)
+
 
-        
     def on_select_files(self, event):
         """打开文件对话框，让用户选择多个图片文件"""
-        with wx.FileDialog(self, "选择图片", wildcard="Image files (*.png;*.jpg;*.jpeg)|*.png;*.jpg;*.jpeg",
+        with wx.FileDialog(self, "选择图片", wildcard=file_wildcard(DOC_IMAGE_FORMATS),
                            style=wx.FD_OPEN | wx.FD_MULTIPLE) as fileDialog:
             if fileDialog.ShowModal() == wx.ID_CANCEL:
                 return
@@ -48,88 +96,142 @@ class MainFrame(Main_Ui_Frame):
             self.add_images(paths)
 
     def add_images(self, paths):
-        """将有效图片路径添加到列表中，并更新 ListBox 显示"""
-        for path in paths:
-            if path.lower().endswith(('.png', '.jpg', '.jpeg')) and path not in self.image_paths:
-                self.image_paths.append(path)
-                self.m_ImageListBox.Append(path)
+        """将有效图片路径添加到列表中，并更新列表显示"""
+        if self.image_list.add(paths):
+            self.m_ImageListBox.refresh()
 
     def on_delete_selected(self, event):
         """从列表中删除选中的图片项"""
         selections = self.m_ImageListBox.GetSelections()
         if not selections:
             return
-        for index in reversed(selections):
-            del self.image_paths[index]
-            self.m_ImageListBox.Delete(index)
-        self.preview.SetBitmap(wx.NullBitmap)
+        self.image_list.remove(selections)
+        self.m_ImageListBox.refresh(clear_selection=True)
+        self.clear_preview()
 
     def on_delete_all(self, event):
-        """清空所有图片列表"""
-        self.image_paths.clear()
-        self.m_ImageListBox.Clear()
-        self.preview.SetBitmap(wx.NullBitmap)
+        """清空所有图片列表，同时停止正在进行的文件夹扫描"""
+        self.drop_target.cancel()
+        self.image_list.clear()
+        self.m_ImageListBox.refresh(clear_selection=True)
+        self.clear_preview()
+
+    def clear_preview(self):
+        self.preview_path = None
+        self.PreviewBitmap.SetBitmap(wx.NullBitmap)
 
     def on_preview_image(self, event):
-        """在右侧显示所选图片的预览"""
-        index = event.GetSelection()
-        if 0 <= index < len(self.image_paths):
-            path = self.image_paths[index]
-            try:
-                image = wx.Image(path, wx.BITMAP_TYPE_ANY)
-                image = image.Scale(400, 400, wx.IMAGE_QUALITY_HIGH)
-                self.preview.SetBitmap(wx.Bitmap(image))
-            except Exception as e:
-                wx.MessageBox(f"预览失败：{e}", "错误", wx.ICON_ERROR)
+        """在右侧显示所选图片的预览（保持宽高比），并在后台预取相邻图片的缩略图"""
+        index = event.GetIndex()
+        if not 0 <= index < len(self.image_paths):
+            return
+        path = self.image_paths[index]
+        self.preview_path = path
+        thumbnail = self.thumbnails.peek(path)
+        if thumbnail is not None:
+            self.show_thumbnail(path, thumbnail)
+        else:
+            # 未缓存时在后台解码，不阻塞列表滚动
+            self.thumbnails.request(path, lambda p, thumb: wx.CallAfter(self.show_thumbnail, p, thumb))
+        self.thumbnails.prefetch(neighbour_paths(self.image_paths, index))
+
+    def show_thumbnail(self, path, thumbnail):
+        """显示缩略图；期间已选中其它图片时丢弃"""
+        if path != self.preview_path:
+            return
+        if thumbnail is None:
+            self.PreviewBitmap.SetBitmap(wx.NullBitmap)
+            wx.MessageBox(f"预览失败：{path}", "错误", wx.ICON_ERROR)
+            return
+        image = wx.Image(thumbnail.width, thumbnail.height)
+        image.SetData(thumbnail.tobytes())
+        self.PreviewBitmap.SetBitmap(wx.Bitmap(image))
+        self.RightPanel.Layout()
+
+    def on_close(self, event):
+        self.thumbnails.shutdown()
+        event.Skip()
 
     def on_generate_doc(self, event):
-        """将所有图片插入 Word 文档，并提示用户保存"""
+        """将所有图片插入 Word 文档（或直接写成 PDF），并提示用户保存"""
         if not self.image_paths:
             wx.MessageBox("请先添加图片！", "提示", wx.ICON_INFORMATION)
             return
 
-        doc = Document()
-        section = doc.sections[0]
-        section.page_height = Cm(29.7)
-        section.page_width = Cm(21.0)
-        section.top_margin = Cm(0)
-        section.left_margin = Cm(0)
-        section.right_margin = Cm(0)
-        section.bottom_margin = Cm(0)
-
-        # 替换这段内容，原本插入图片的部分：
-        for img_path in self.image_paths:
-            try:
-                with Image.open(img_path) as img:
-                    img_width, img_height = img.size
-                    aspect_ratio = img_height / img_width
-
-                    target_width_cm = 21.0  # A4宽度
-                    max_height_cm = 29.5  # A4高度
-
-                    target_height_cm = target_width_cm * aspect_ratio
-
-                    # 如果太高，就按高度限制缩小（避免 Word 强制分页）
-                    if target_height_cm > max_height_cm:
-                        target_height_cm = max_height_cm
-                        target_width_cm = target_height_cm / aspect_ratio
-
-                    doc.add_picture(img_path, width=Cm(target_width_cm), height=Cm(target_height_cm))
-                    # doc.add_paragraph("")
-            except Exception as e:
-                wx.MessageBox(f"插入图片失败：{img_path}\n{e}", "错误", wx.ICON_ERROR)
-
         default_dir = os.path.dirname(self.image_paths[0])
         with wx.FileDialog(self, "保存 Word 文档", defaultDir=default_dir,
-                           wildcard="Word 文件 (*.docx)|*.docx",
+                           wildcard="Word 文件 (*.docx)|*.docx|PDF 文件 (*.pdf)|*.pdf",
                            style=wx.FD_SAVE | wx.FD_OVERWRITE_PROMPT) as fileDialog:
             fileDialog.SetFilename("output.docx")
             if fileDialog.ShowModal() == wx.ID_CANCEL:
                 return
             output_path = fileDialog.GetPath()
-            doc.save(output_path)
-            wx.MessageBox(f"文档已保存到：\n{output_path}", "成功", wx.ICON_INFORMATION)
-            
+            if fileDialog.GetFilterIndex() == 1 and not output_path.lower().endswith(".pdf"):
+                output_path = os.path.splitext(output_path)[0] + ".pdf"
+
+        # 图片在线程池中按打印尺寸缩小并重新压缩，按列表顺序逐张直接写入文档，
+        # 不在内存中保留整个文档（A4，页边距为 0），与命令行 batch_doc.py 相同；
+        # 一页多张时留 1 厘米页边距，用合并器的排版引擎逐行排列。
+        # 保存为 PDF 时使用相同的排版和图片分辨率，JPEG 图片直接嵌入
+        dpi = DOC_DPI_CHOICES[self.dpi_choice.GetSelection()]
+        layout = DOC_LAYOUT_CHOICES[self.layout_choice.GetSelection()][1]
+        self.start_generate(output_path, dpi, layout)
+
+    def start_generate(self, output_path, dpi, layout):
+        """
+        在后台线程中生成 Word 文档或 PDF，进度对话框显示进度并支持取消，取消或出错时删除未完成的文档
+
+        参数:
+            output_path (str): 保存路径，扩展名为 .pdf 时写成 PDF
+            dpi (int): 图片分辨率，为 None 时插入原图
+            layout (dict): build_word_document 的排版参数，见 DOC_LAYOUT_CHOICES
+        """
+        paths = list(self.image_paths)
+        cancel_event = threading.Event()
+        finished = threading.Event()
+        progress_dialog = wx.ProgressDialog(
+            "正在生成", f"正在生成 {os.path.basename(output_path)}", maximum=len(paths), parent=self,
+            style=wx.PD_CAN_ABORT | wx.PD_AUTO_HIDE | wx.PD_ELAPSED_TIME | wx.PD_REMAINING_TIME)
+
+        def update(value, message):
+            # 在界面线程中更新进度，用户点击取消时通知生成线程
+            if finished.is_set():
+                return
+            keep_going, _ = progress_dialog.Update(value, message)
+            if not keep_going:
+                cancel_event.set()
+
+        def finish(report=None, error=None):
+            finished.set()
+            progress_dialog.Destroy()
+            if error is not None:
+                wx.MessageBox(error, "错误", wx.ICON_ERROR)
+                return
+            if report is None:
+                wx.MessageBox("已取消生成。", "提示", wx.ICON_INFORMATION)
+                return
+            if report.failed:
+                failed = "\n".join(f"{path}\n{reason}" for path, reason in report.failed[:10])
+                wx.MessageBox(f"{len(report.failed)} 张图片插入失败：\n{failed}", "错误", wx.ICON_ERROR)
+            saving = format_size_saving(report.original_bytes, report.output_bytes)
+            logger.info(saving)
+            wx.MessageBox(f"文档已保存到：\n{output_path}\n{saving}", "成功", wx.ICON_INFORMATION)
+
+        def worker():
+            try:
+                report = build_word_document(paths, output_path, 21.0, 29.7, margin_cm=1 if layout else 0, dpi=dpi,
+                                             progress=lambda done, total: wx.CallAfter(
+                                                 update, done, f"已插入 {done} / {total} 张图片"),
+                                             cancel_event=cancel_event, **layout)
+                wx.CallAfter(finish, report)
+            except ExportCancelled:
+                wx.CallAfter(finish)
+            except Exception as e:
+                logger.error(f"生成文档失败：{e}")
+                wx.CallAfter(finish, error=f"生成文档失败：{e}")
+
+        threading.Thread(target=worker, daemon=True).start()
+
 if __name__ == "__main__":
     # 创建应用实例
     app = wx.App(False)
@@ -0,0 +1,379 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+三个工具共用的图片读写
+
+- 按文件头的魔数识别格式（不看扩展名），对话框的扩展名过滤器由格式名称生成；
+- 解码时按 EXIF 方向旋转，JPEG 用 draft() 按 1/2、1/4、1/8 缩小解码，其余格式用 reduce() 整数倍缩小；
+- 读写都经过 Python 的文件对象，中文路径可用（cv2.imread / cv2.imwrite 不支持非 ASCII 路径），
+  写入先写临时文件再改名，覆盖原图时失败也不会留下半个文件；
+- 进程内共享的已解码图像缓存：按 (绝对路径, 修改时间, 文件大小) 每个文件只保留解码分辨率最高的一份，
+  请求的尺寸不超过已缓存的图像时直接复用。裁剪、合并、缩略图和自动参数统计在同一进程中读取
+  同一文件时只解码一次；文件被修改后键随之变化，自动重新解码。
+"""
+import io
+import os
+import threading
+from collections import OrderedDict
+
+import cv2
+import numpy as np
+from PIL import Image
+
+# 文件头魔数 -> 格式名称
+IMAGE_SIGNATURES = (
+    (b"\xff\xd8\xff", "JPEG"),
+    (b"\x89PNG\r\n\x1a\n", "PNG"),
+    (b"GIF87a", "GIF"),
+    (b"GIF89a", "GIF"),
+    (b"BM", "BMP"),
+    (b"II*\x00", "TIFF"),
+    (b"MM\x00*", "TIFF"),
+)
+# 识别格式需要读取的字节数
+SNIFF_BYTES = 16
+
+# 格式名称 -> 扩展名，第一个为保存时的默认扩展名
+FORMAT_EXTENSIONS = {
+    "JPEG": (".jpg", ".jpeg"),
+    "PNG": (".png",),
+    "BMP": (".bmp",),
+    "GIF": (".gif",),
+    "TIFF": (".tif", ".tiff"),
+    "WEBP": (".webp",),
+}
+
+# 缓存中保留的图像模式，其它模式（调色板、CMYK、16 位等）解码时统一转换
+_CACHED_MODES = ("1", "L", "LA", "RGB", "RGBA")
+# EXIF 方向 -> 转正所需的变换（与 ImageOps.exif_transpose 相同）；5-8 时像素按转置方向存储
+_ORIENTATION_METHODS = {
+    2: Image.Transpose.FLIP_LEFT_RIGHT,
+    3: Image.Transpose.ROTATE_180,
+    4: Image.Transpose.FLIP_TOP_BOTTOM,
+    5: Image.Transpose.TRANSPOSE,
+    6: Image.Transpose.ROTATE_270,
+    7: Image.Transpose.TRANSVERSE,
+    8: Image.Transpose.ROTATE_90,
+}
+_TRANSPOSED_ORIENTATIONS = (5, 6, 7, 8)
+_EXIF_ORIENTATION_TAG = 0x0112
+
+
+def sniff_image_header(header):
+    """
+    按数据开头的魔数识别图片格式
+
+    参数:
+        header (bytes): 图片数据的开头（至少 SNIFF_BYTES 字节）
+
+    返回:
+        str|None: 格式名称（JPEG / PNG / GIF / BMP / TIFF / WEBP），不是图片时返回 None
+    """
+    for signature, fmt in IMAGE_SIGNATURES:
+        if header.startswith(signature):
+            return fmt
+    if header[:4] == b"RIFF" and header[8:12] == b"WEBP":
+        return "WEBP"
+    return None
+
+
+def sniff_image_format(path):
+    """
+    读取文件头识别图片格式
+
+    参数:
+        path (str): 文件路径
+
+    返回:
+        str|None: 格式名称，见 sniff_image_header；不是图片或无法读取时返回 None
+    """
+    try:
+        with open(path, "rb") as f:
+            return sniff_image_header(f.read(SNIFF_BYTES))
+    except OSError:
+        return None
+
+
+def file_wildcard(formats, description="图片文件"):
+    """
+    生成 wx.FileDialog 的扩展名过滤器，与拖放时按文件头接受的格式保持一致
+
+    参数:
+        formats (tuple[str]): 格式名称，见 FORMAT_EXTENSIONS
+        description (str): 过滤器名称
+
+    返回:
+        str: 如 "图片文件 (*.jpg;*.jpeg;*.png)|*.jpg;*.jpeg;*.png"
+    """
+    patterns = ";".join(f"*{ext}" for fmt in formats for ext in FORMAT_EXTENSIONS[fmt])
+    return f"{description} ({patterns})|{patterns}"
+
+
+def image_nbytes(img):
+    """估算 PIL 图像占用的内存字节数"""
+    if img.mode == "1":
+        return (img.width + 7) // 8 * img.height
+    return img.width * img.height * len(img.getbands())
+
+
+def read_bytes(path):
+    """读取整个文件，支持中文路径"""
+    with open(path, "rb") as f:
+        return f.read()
+
+
+def write_bytes(path, data):
+    """
+    写入文件，支持中文路径；先写同目录下的临时文件再改名，写入失败时原文件保持不变
+
+    参数:
+        path (str): 目标路径
+        data (bytes): 文件内容
+    """
+    temp_path = f"{path}.{threading.get_ident()}.tmp"
+    try:
+        with open(temp_path, "wb") as f:
+            f.write(data)
+        os.replace(temp_path, path)
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+
+
+def _covers(image, full, min_size):
+    if full:
+        return True
+    return min_size is not None and image.width >= min_size[0] and image.height >= min_size[1]
+
+
+class DecodedImageCache:
+    """
+    已解码原图的 LRU 缓存，按内存占用上限淘汰最久未使用的条目，线程安全
+
+    缓存键为 (绝对路径, 修改时间, 文件大小)，每个文件只保留一份图像：全分辨率解码，
+    或不小于某一请求尺寸的缩小解码。更大的解码结果替换较小的，反之不替换。
+    缓存中的图像由多个调用方共享，只能读取，不可原地修改（thumbnail、paste 等前先 copy）。
+    """
+
+    def __init__(self, max_bytes=256 * 1024 * 1024):
+        """
+        参数:
+            max_bytes (int): 缓存图像占用内存的上限（字节）
+        """
+        self.max_bytes = max_bytes
+        self.current_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self._items = OrderedDict()  # 键 -> (图像, 是否为全分辨率)
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def make_key(path):
+        stat = os.stat(path)
+        return os.path.abspath(path), stat.st_mtime_ns, stat.st_size
+
+    def get(self, key, min_size=None):
+        """
+        查找能满足请求尺寸的图像
+
+        参数:
+            key (tuple): make_key 的结果
+            min_size (tuple): 需要的最小 (宽, 高)（按 EXIF 方向旋转后），为 None 时需要全分辨率
+
+        返回:
+            PIL.Image|None: 缓存的图像，未缓存或缓存的分辨率不够时返回 None
+        """
+        with self._lock:
+            entry = self._items.get(key)
+            if entry is None or not _covers(entry[0], entry[1], min_size):
+                self.misses += 1
+                return None
+            self._items.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def put(self, key, image, full):
+        size = image_nbytes(image)
+        # 单张图像超过上限时不缓存，避免把其它条目全部挤出
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            if key in self._items:
+                cached, cached_full = self._items[key]
+                if cached_full or (cached.width >= image.width and cached.height >= image.height and not full):
+                    return
+                self.current_bytes -= image_nbytes(self._items.pop(key)[0])
+            self._items[key] = (image, full)
+            self.current_bytes += size
+            while self.current_bytes > self.max_bytes:
+                _, (evicted, _) = self._items.popitem(last=False)
+                self.current_bytes -= image_nbytes(evicted)
+
+    def clear(self):
+        with self._lock:
+            self._items.clear()
+            self.current_bytes = 0
+
+    def __len__(self):
+        return len(self._items)
+
+
+# 进程内所有工具共用的已解码图像缓存
+decoded_cache = DecodedImageCache()
+
+
+def _to_8bit(img):
+    """把 16 位 / 32 位整数、浮点灰度图按比例缩放为 8 位 L（直接 convert 会把 255 以上的值全部截断为白色）"""
+    array = np.asarray(img)
+    if img.mode.startswith("I;16") or (img.mode in ("I", "F") and array.size and array.max() > 255):
+        # 16 位数据取高 8 位（与 cv2.imdecode 一致）；I / F 模式中超过 255 的数值按 16 位范围处理
+        array = array.astype(np.float32) / 256
+    return Image.fromarray(np.clip(array, 0, 255).astype(np.uint8), "L")
+
+
+def apply_orientation(img, orientation):
+    """
+    把按存储方向的像素转为 EXIF 方向对应的显示方向
+
+    参数:
+        img (PIL.Image): 图像
+        orientation (int): EXIF 方向（1-8），其它值不变换
+
+    返回:
+        PIL.Image: 转正后的图像，方向为 1 时返回原图像
+    """
+    method = _ORIENTATION_METHODS.get(orientation)
+    return img.transpose(method) if method is not None else img
+
+
+def decode_image(img, min_size=None):
+    """
+    解码刚打开的图片：按需缩小解码，按 EXIF 方向旋转，并转换为缓存使用的模式
+
+    参数:
+        img (PIL.Image): 已打开（尚未加载像素）的图片
+        min_size (tuple): 需要的最小 (宽, 高)（旋转后），为 None 时全分辨率解码
+
+    返回:
+        tuple: (PIL.Image, 是否为全分辨率)
+    """
+    full_size = img.size
+    # 缩小后的图像不再带有 TIFF 标签，方向在解码前读取
+    orientation = img.getexif().get(_EXIF_ORIENTATION_TAG, 1)
+    if img.mode.startswith("I") or img.mode == "F":
+        # 扫描仪常见的 16 位灰度 PNG / TIFF：先按比例转为 8 位
+        img = _to_8bit(img)
+    if min_size is not None:
+        if orientation in _TRANSPOSED_ORIENTATIONS:
+            # draft / reduce 作用于存储方向的像素，请求尺寸随之互换
+            min_size = min_size[::-1]
+        min_size = (max(1, int(min_size[0])), max(1, int(min_size[1])))
+        # draft 只对 JPEG 生效，保证解码结果不小于请求的尺寸
+        img.draft(None, min_size)
+        reduce_by = min(img.width // min_size[0], img.height // min_size[1])
+        if reduce_by >= 2:
+            # 调色板 / 二值等模式不支持 reduce，先转换为可平均的模式
+            if img.mode not in ("L", "LA", "RGB", "RGBA"):
+                img = img.convert("RGBA" if "transparency" in img.info else "RGB")
+            img = img.reduce(reduce_by)
+    full = img.size == full_size
+    img = apply_orientation(img, orientation)
+    if img.mode not in _CACHED_MODES:
+        img = img.convert("RGBA" if "A" in img.getbands() or "transparency" in img.info else "RGB")
+    return img, full
+
+
+def load_image(path, min_size=None, use_cache=True):
+    """
+    读取图片为按 EXIF 方向旋转后的 PIL 图像，优先使用进程内的已解码图像缓存
+
+    返回的图像可能大于 min_size（例如缓存中已有全分辨率图像），调用方按需再缩放；
+    图像可能被其它调用方共享，不可原地修改。
+
+    参数:
+        path (str): 图片路径，支持中文
+        min_size (tuple): 需要的最小 (宽, 高)，为 None 时全分辨率
+        use_cache (bool): 是否查找并写入缓存
+
+    返回:
+        PIL.Image: 模式为 1 / L / LA / RGB / RGBA 的图像
+
+    异常:
+        OSError: 文件无法读取或不是可识别的图片
+    """
+    key = decoded_cache.make_key(path) if use_cache else None
+    if key is not None:
+        cached = decoded_cache.get(key, min_size)
+        if cached is not None:
+            return cached
+    with Image.open(path) as img:
+        image, full = decode_image(img, min_size)
+        image.load()
+    if key is not None:
+        decoded_cache.put(key, image, full)
+    return image
+
+
+def read_bgr(path, use_cache=True):
+    """
+    读取图片为 OpenCV 使用的 BGR 数组（按 EXIF 方向旋转），支持中文路径
+
+    解码结果与 load_image 共用缓存；Pillow 无法识别的格式交给 cv2.imdecode，不缓存。
+    返回的数组是新的副本，调用方可以修改。
+
+    参数:
+        path (str): 图片路径
+        use_cache (bool): 是否使用已解码图像缓存
+
+    返回:
+        numpy.ndarray: BGR 图像
+
+    异常:
+        ValueError: 无法解码
+    """
+    try:
+        image = load_image(path, use_cache=use_cache)
+    except OSError:
+        image = None
+    if image is None:
+        array = cv2.imdecode(np.frombuffer(read_bytes(path), dtype=np.uint8), cv2.IMREAD_COLOR)
+        if array is None:
+            raise ValueError("无法解码图像")
+        return array
+    if image.mode in ("1", "L", "LA"):
+        return cv2.cvtColor(np.asarray(image.convert("L")), cv2.COLOR_GRAY2BGR)
+    # 与 cv2.IMREAD_COLOR 一致：丢弃透明通道
+    return cv2.cvtColor(np.asarray(image.convert("RGB") if image.mode != "RGB" else image), cv2.COLOR_RGB2BGR)
+
+
+def write_image(path, image, jpeg_quality=95):
+    """
+    按扩展名编码并保存图片，支持中文路径，写入过程中失败不会损坏已有文件
+
+    参数:
+        path (str): 保存路径，扩展名决定格式（见 FORMAT_EXTENSIONS）
+        image (PIL.Image|numpy.ndarray): PIL 图像或 BGR 数组
+        jpeg_quality (int): JPEG 质量
+
+    异常:
+        ValueError: 不支持的扩展名或编码失败
+        OSError: 写入失败
+    """
+    extension = os.path.splitext(path)[1].lower()
+    fmt = next((name for name, extensions in FORMAT_EXTENSIONS.items() if extension in extensions), None)
+    if fmt is None:
+        raise ValueError(f"不支持的图片格式：{extension or '无扩展名'}")
+    if isinstance(image, np.ndarray):
+        params = [cv2.IMWRITE_JPEG_QUALITY, jpeg_quality] if fmt == "JPEG" else []
+        ok, buffer = cv2.imencode(extension, image, params)
+        if not ok:
+            raise ValueError(f"无法编码为 {fmt}")
+        data = buffer.tobytes()
+    else:
+        if fmt == "JPEG" and image.mode not in ("L", "RGB", "CMYK"):
+            image = image.convert("RGB")
+        buffer = io.BytesIO()
+        image.save(buffer, format=fmt, **({"quality": jpeg_quality} if fmt == "JPEG" else {}))
+        data = buffer.getvalue()
+    write_bytes(path, data)
@@ -0,0 +1,172 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+待处理图片列表
+
+- ImageListModel：图片路径列表，用集合按规范化路径（可选按文件内容）去重，批量添加数千个文件也只需几毫秒
+- ImageListCtrl：虚拟列表控件，只在绘制时向模型查询可见行的文字，不逐条插入列表项
+合并器和 Word 文档生成器共用。
+"""
+import os
+import hashlib
+
+import wx
+
+
+def normalize_path(path):
+    """规范化路径用于去重：绝对路径、统一分隔符，Windows 下不区分大小写"""
+    return os.path.normcase(os.path.abspath(path))
+
+
+def file_content_hash(path, chunk_size=1024 * 1024):
+    """
+    计算文件内容的哈希，用于识别不同路径下的相同文件
+
+    参数:
+        path (str): 文件路径
+        chunk_size (int): 每次读取的字节数
+
+    返回:
+        str: 十六进制哈希值
+    """
+    digest = hashlib.blake2b(digest_size=16)
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class ImageListModel:
+    """
+    图片路径列表
+
+    按规范化路径去重；dedup_content 为 True 时还按文件内容去重（需要读取整个文件，
+    只建议在图片数量不多或确实存在重复拷贝时开启）。
+    """
+
+    def __init__(self, extensions=None, dedup_content=False):
+        """
+        参数:
+            extensions (tuple[str]): 接受的扩展名（小写，含点），为 None 时不按扩展名过滤
+            dedup_content (bool): 是否按文件内容去重
+        """
+        self.extensions = extensions
+        self.dedup_content = dedup_content
+        self.paths = []  # 图片路径，按添加顺序
+        self._keys = set()  # 已添加路径的规范化形式
+        self._hashes = {}  # 内容哈希 -> 规范化路径（dedup_content 为 True 时使用）
+
+    def __len__(self):
+        return len(self.paths)
+
+    def __getitem__(self, index):
+        return self.paths[index]
+
+    def __iter__(self):
+        return iter(self.paths)
+
+    def accepts(self, path):
+        """是否为可接受的扩展名"""
+        return self.extensions is None or path.lower().endswith(self.extensions)
+
+    def add(self, paths):
+        """
+        批量添加图片，跳过扩展名不符和重复的文件
+
+        参数:
+            paths (iterable[str]): 图片路径
+
+        返回:
+            list[str]: 实际添加的路径
+        """
+        added = []
+        for path in paths:
+            if not self.accepts(path):
+                continue
+            key = normalize_path(path)
+            if key in self._keys:
+                continue
+            if self.dedup_content:
+                try:
+                    content_hash = file_content_hash(path)
+                except OSError:
+                    continue
+                if content_hash in self._hashes:
+                    continue
+                self._hashes[content_hash] = key
+            self._keys.add(key)
+            self.paths.append(path)
+            added.append(path)
+        return added
+
+    def remove(self, indices):
+        """
+        删除指定序号的图片
+
+        参数:
+            indices (iterable[int]): 要删除的序号
+        """
+        removed = set(indices)
+        if not removed:
+            return
+        # 原地修改，外部持有的 paths 引用保持有效
+        self.paths[:] = [path for index, path in enumerate(self.paths) if index not in removed]
+        self._rebuild_index()
+
+    def clear(self):
+        """清空列表"""
+        self.paths.clear()
+        self._keys.clear()
+        self._hashes.clear()
+
+    def _rebuild_index(self):
+        self._keys = {normalize_path(path) for path in self.paths}
+        if self.dedup_content:
+            self._hashes = {content_hash: key for content_hash, key in self._hashes.items() if key in self._keys}
+
+
+class ImageListCtrl(wx.ListCtrl):
+    """显示 ImageListModel 的虚拟列表控件（LC_VIRTUAL），列表项数量不影响刷新速度"""
+
+    def __init__(self, parent, model, show_full_path=False):
+        """
+        参数:
+            parent: 父级窗口对象
+            model (ImageListModel): 图片列表
+            show_full_path (bool): 显示完整路径，否则只显示文件名
+        """
+        super().__init__(parent, style=wx.LC_REPORT | wx.LC_VIRTUAL | wx.LC_NO_HEADER)
+        self.model = model
+        self.show_full_path = show_full_path
+        self.InsertColumn(0, "文件")
+        self.Bind(wx.EVT_SIZE, self.on_size)
+
+    def OnGetItemText(self, item, column):
+        path = self.model[item]
+        return path if self.show_full_path else os.path.basename(path)
+
+    def refresh(self, clear_selection=False):
+        """模型变化后更新行数并重绘
+
+        参数:
+            clear_selection (bool): 是否取消所有选中（删除图片后序号已变化）
+        """
+        if clear_selection:
+            for index in self.GetSelections():
+                self.Select(index, False)
+        self.SetItemCount(len(self.model))
+        self.Refresh()
+
+    def GetSelections(self):
+        """所有选中行的序号（与 wx.ListBox.GetSelections 一致）"""
+        selections = []
+        index = self.GetFirstSelected()
+        while index != -1:
+            selections.append(index)
+            index = self.GetNextSelected(index)
+        return selections
+
+    def on_size(self, event):
+        # 唯一的一列占满控件宽度
+        self.SetColumnWidth(0, self.GetClientSize().width)
+        event.Skip()
@@ -0,0 +1,188 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+只解析文件头的图片信息探测
+
+JPEG 读取 SOF 段得到尺寸、APP1 中的 EXIF 得到方向，PNG 读取 IHDR，都不解码像素。
+文件只读取一次，同一份数据既用于计算尺寸，也直接写入文档。
+"""
+import io
+from dataclasses import dataclass
+from typing import Optional
+
+from PIL import Image
+
+# EXIF 方向 -> (先水平翻转, 再顺时针旋转的角度)，使存储的像素按正确方向显示
+ORIENTATION_TRANSFORMS = {
+    1: (False, 0),
+    2: (True, 0),
+    3: (False, 180),
+    4: (True, 180),
+    5: (True, 270),
+    6: (False, 90),
+    7: (True, 90),
+    8: (False, 270),
+}
+
+# 所有 SOF 标记（含无损、算术编码），用于读取尺寸
+_SOF_MARKERS = (0xC0, 0xC1, 0xC2, 0xC3, 0xC5, 0xC6, 0xC7, 0xC9, 0xCA, 0xCB, 0xCD, 0xCE, 0xCF)
+_EXIF_ORIENTATION_TAG = 0x0112
+
+
+@dataclass
+class ImageInfo:
+    """图片头信息"""
+    format: str                               # JPEG / PNG / Pillow 识别的格式名称
+    width: int                                # 存储的像素宽度（未按方向旋转）
+    height: int                               # 存储的像素高度
+    orientation: int = 1                      # EXIF 方向（1-8）
+    orientation_offset: Optional[int] = None  # EXIF 方向值在数据中的偏移，用于原地改写
+
+    @property
+    def swaps_axes(self):
+        """按方向显示时宽高是否互换（旋转 90 / 270 度）"""
+        return self.orientation in (5, 6, 7, 8)
+
+    @property
+    def display_size(self):
+        """按 EXIF 方向显示时的 (宽, 高)"""
+        return (self.height, self.width) if self.swaps_axes else (self.width, self.height)
+
+
+def _exif_orientation(data, start, end):
+    """
+    从 APP1 段中的 EXIF（TIFF 结构）读取方向
+
+    返回:
+        tuple: (方向, 方向值在 data 中的偏移)；没有方向标签时为 (1, None)
+    """
+    tiff = start + 6  # 跳过 "Exif\0\0"
+    byte_order = data[tiff:tiff + 2]
+    if byte_order not in (b"II", b"MM"):
+        return 1, None
+    order = "little" if byte_order == b"II" else "big"
+    ifd = tiff + int.from_bytes(data[tiff + 4:tiff + 8], order)
+    if ifd + 2 > end:
+        return 1, None
+    for number in range(int.from_bytes(data[ifd:ifd + 2], order)):
+        entry = ifd + 2 + number * 12
+        if entry + 12 > end:
+            break
+        if int.from_bytes(data[entry:entry + 2], order) == _EXIF_ORIENTATION_TAG:
+            value = int.from_bytes(data[entry + 8:entry + 10], order)
+            return (value if value in ORIENTATION_TRANSFORMS else 1), entry + 8
+    return 1, None
+
+
+def _probe_jpeg(data):
+    orientation, orientation_offset = 1, None
+    pos = 2
+    while pos + 4 <= len(data):
+        if data[pos] != 0xFF:
+            return None
+        marker = data[pos + 1]
+        if marker == 0xFF:
+            pos += 1
+            continue
+        if marker == 0x01 or 0xD0 <= marker <= 0xD7:
+            pos += 2
+            continue
+        length = int.from_bytes(data[pos + 2:pos + 4], "big")
+        segment = pos + 4
+        if marker == 0xE1 and data[segment:segment + 6] == b"Exif\x00\x00":
+            orientation, orientation_offset = _exif_orientation(data, segment, pos + 2 + length)
+        elif marker in _SOF_MARKERS:
+            height = int.from_bytes(data[segment + 1:segment + 3], "big")
+            width = int.from_bytes(data[segment + 3:segment + 5], "big")
+            return ImageInfo("JPEG", width, height, orientation, orientation_offset)
+        elif marker == 0xDA:
+            return None
+        pos += 2 + length
+    return None
+
+
+def probe_image(data):
+    """
+    从图片数据的文件头读取格式、尺寸和 EXIF 方向，不解码像素
+
+    参数:
+        data (bytes): 图片文件内容
+
+    返回:
+        ImageInfo: 图片信息
+
+    异常:
+        ValueError: 无法识别的图片数据
+    """
+    info = None
+    if data[:2] == b"\xff\xd8":
+        info = _probe_jpeg(data)
+    elif data[:8] == b"\x89PNG\r\n\x1a\n" and data[12:16] == b"IHDR":
+        info = ImageInfo("PNG", int.from_bytes(data[16:20], "big"), int.from_bytes(data[20:24], "big"))
+    if info is not None:
+        return info
+    # 其它格式交给 Pillow，Image.open 也只读取文件头
+    try:
+        with Image.open(io.BytesIO(data)) as img:
+            orientation = img.getexif().get(_EXIF_ORIENTATION_TAG, 1)
+            return ImageInfo(img.format, img.width, img.height,
+                             orientation if orientation in ORIENTATION_TRANSFORMS else 1)
+    except Exception as e:
+        raise ValueError(f"无法识别的图片数据：{e}")
+
+
+def read_image(path):
+    """
+    读取整个图片文件（唯一的一次 I/O）并探测头信息
+
+    参数:
+        path (str): 图片路径
+
+    返回:
+        tuple: (文件内容 bytes, ImageInfo)
+    """
+    with open(path, "rb") as f:
+        data = f.read()
+    return data, probe_image(data)
+
+
+def probe_file(path, head_bytes=64 * 1024):
+    """
+    只读取文件开头探测图片信息，用于插入前的排版；文件头中找不到尺寸时再读取整个文件
+
+    参数:
+        path (str): 图片路径
+        head_bytes (int): 读取的字节数，默认覆盖 EXIF 段的最大长度
+
+    返回:
+        ImageInfo: 图片信息
+
+    异常:
+        ValueError: 无法识别的图片数据
+    """
+    with open(path, "rb") as f:
+        head = f.read(head_bytes)
+        try:
+            return probe_image(head)
+        except ValueError:
+            return probe_image(head + f.read())
+
+
+def reset_orientation(data, info):
+    """
+    把 JPEG 数据中的 EXIF 方向原地改写为 1（正常），由调用方自行完成旋转，避免查看器重复旋转
+
+    参数:
+        data (bytes): 图片文件内容
+        info (ImageInfo): probe_image 的结果
+
+    返回:
+        bytes: 改写后的数据；没有方向标签或方向已为 1 时原样返回
+    """
+    if info.orientation == 1 or info.orientation_offset is None:
+        return data
+    offset = info.orientation_offset
+    patched = bytearray(data)
+    # 方向值为 2-8 的 SHORT：小端时低字节在前（非零），大端时高字节在前（为零）
+    patched[offset:offset + 2] = b"\x00\x01" if data[offset] == 0 else b"\x01\x00"
+    return bytes(patched)
@@ -0,0 +1,408 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+合并结果的流式导出
+
+逐页写出：PDF 使用 pdf_writer.PdfStreamWriter，每张图片按排版位置单独放置，
+未漂白的 JPEG 原图直接嵌入原始字节流；Word 文档同样逐张图片按排版位置放置；
+多页 TIFF 使用 Pillow 的 AppendingTiffWriter，JPG / PNG 每页一个文件。
+任一时刻只有一页的数据在内存中，内存占用不随页数增长。
+黑白漂白的页面保持 1 位：PDF / TIFF 中用 CCITT G4 压缩，PNG 写成 1 位图像。
+
+命令行可测试大文档的导出吞吐量:
+    python merge_export.py --pages 120 --format pdf
+"""
+import io
+import os
+import sys
+import time
+import tempfile
+import argparse
+
+from PIL import Image, TiffImagePlugin
+from loguru import logger
+
+from docx_writer import DocxStreamWriter
+from image_io import apply_orientation, load_image, read_bytes, sniff_image_format
+from image_probe import probe_image
+from merge_layout import DPI
+from pdf_writer import PdfStreamWriter, jpeg_info
+
+# 支持的导出格式与扩展名
+EXPORT_FORMATS = {
+    ".pdf": "PDF",
+    ".tif": "TIFF",
+    ".tiff": "TIFF",
+    ".jpg": "JPEG",
+    ".jpeg": "JPEG",
+    ".png": "PNG",
+    ".docx": "DOCX",
+}
+
+# PDF 长度单位：1 点为 1/72 英寸
+POINTS_PER_CM = 72 / 2.54
+
+# TIFF 各图像模式使用的压缩方式
+TIFF_COMPRESSION = {
+    "1": "group4",
+    "L": "tiff_lzw",
+    "RGB": "jpeg",
+}
+
+
+class ExportCancelled(Exception):
+    """导出被用户取消"""
+
+
+def export_format_for(path):
+    """根据扩展名确定导出格式，未知扩展名返回 None"""
+    return EXPORT_FORMATS.get(os.path.splitext(path)[1].lower())
+
+
+def numbered_path(path, number, total):
+    """多页导出为单页格式时生成带页码的文件名，只有一页时保持原文件名"""
+    if total <= 1:
+        return path
+    root, ext = os.path.splitext(path)
+    return f"{root}_{number + 1:0{len(str(total))}d}{ext}"
+
+
+def export_paths(path, page_count):
+    """
+    导出 page_count 页时会写出的全部文件：PDF / TIFF / Word 为一个文件，JPG / PNG 每页一个带页码的文件。
+    保存前用于检查哪些文件会被覆盖（保存对话框只检查用户输入的文件名）
+
+    参数:
+        path (str): 输出路径
+        page_count (int): 页数
+
+    返回:
+        list[str]: 文件路径
+    """
+    if export_format_for(path) in ("JPEG", "PNG"):
+        return [numbered_path(path, number, page_count) for number in range(page_count)]
+    return [path]
+
+
+def _check_cancel(cancel_event):
+    if cancel_event is not None and cancel_event.is_set():
+        raise ExportCancelled()
+
+
+def embed_image_file(pdf, path, image=None, jpeg_quality=90):
+    """
+    把图片文件写入 PDF：没有 EXIF 旋转的灰度 / RGB JPEG 直接嵌入原始字节流，不解码也不重新编码；
+    其它格式和带 EXIF 旋转的 JPEG（PDF 不识别 EXIF 方向）按显示方向解码后重新编码
+
+    参数:
+        pdf (PdfStreamWriter): PDF 写入器
+        path (str): 图片路径
+        image (PIL.Image): 已解码的图像，不能直接嵌入时使用，为 None 时从 path 读取
+        jpeg_quality (int): 重新编码时的 JPEG 质量
+
+    返回:
+        tuple: (图片对象编号, (宽, 高))，尺寸为嵌入图片的像素尺寸（即显示方向的尺寸）
+    """
+    with open(path, "rb") as f:
+        data = f.read()
+    info = jpeg_info(data)
+    if info is not None and info[2] in (1, 3) and probe_image(data).orientation == 1:
+        return pdf.add_jpeg(data), info[:2]
+    if image is None:
+        image = load_image(path)
+    return pdf.add_image(image, jpeg_quality), image.size
+
+
+def _embed_item(pdf, page, index, jpeg_quality, passthrough):
+    """写入页面上的一张图片，像素未被修改时优先直接嵌入原图"""
+    if passthrough and page.source_paths and page.source_paths[index]:
+        return embed_image_file(pdf, page.source_paths[index], page.sources[index], jpeg_quality)[0]
+    return pdf.add_image(page.sources[index], jpeg_quality)
+
+
+class PdfDocWriter:
+    """
+    与 docx_writer.DocxStreamWriter 接口相同的 PDF 写入器，图片生成 Word 工具保存为 PDF 时使用，
+    排版、图片分辨率与 Word 文档一致
+
+    add_picture 的图片自上而下排列在版心内（与 Word 中单独占一段的图片相同），放不下时换页；
+    add_positioned_picture 的图片按页面坐标放置，调用 end_page() 结束一页。
+    没有 EXIF 旋转的灰度 / RGB JPEG 直接嵌入，不重新编码。出错时删除未完成的文件。
+    """
+
+    def __init__(self, path, page_width_cm=21.0, page_height_cm=29.7, margin_cm=0, jpeg_quality=90):
+        """
+        参数:
+            path (str): 输出 .pdf 路径
+            page_width_cm (float): 页面宽度（厘米）
+            page_height_cm (float): 页面高度（厘米）
+            margin_cm (float): 上下左右页边距（厘米）
+            jpeg_quality (int): 需要重新编码时的 JPEG 质量
+        """
+        self.path = path
+        self.page_size_cm = (page_width_cm, page_height_cm)
+        self.margin_cm = margin_cm
+        self.jpeg_quality = jpeg_quality
+        self._pdf = PdfStreamWriter(path)
+        self._images = []  # 当前页的 (图片对象编号, x, y, 宽, 高)，单位为点
+        self._flow_y = margin_cm  # 当前页自上而下排列的下一张图片的位置（厘米）
+        self._pictures = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+        else:
+            # 出错时不留下损坏的文档
+            self.abort()
+
+    @property
+    def picture_count(self):
+        return self._pictures
+
+    def _store_image(self, source, orientation):
+        data = source if isinstance(source, bytes) else read_bytes(source)
+        info = jpeg_info(data)
+        if orientation == 1 and info is not None and info[2] in (1, 3):
+            image_id = self._pdf.add_jpeg(data)
+        else:
+            try:
+                with Image.open(io.BytesIO(data)) as img:
+                    image = apply_orientation(img, orientation)
+                    image_id = self._pdf.add_image(image, self.jpeg_quality)
+            except OSError as e:
+                raise ValueError(f"无法识别的图片数据：{e}")
+        self._pictures += 1
+        return image_id
+
+    def _place(self, image_id, x_cm, y_cm, width_cm, height_cm):
+        self._images.append((image_id, x_cm * POINTS_PER_CM, y_cm * POINTS_PER_CM, width_cm * POINTS_PER_CM,
+                             height_cm * POINTS_PER_CM))
+
+    def add_picture(self, source, width_cm, height_cm, orientation=1):
+        """
+        在版心内自上而下插入一张图片，当前页放不下时换页
+
+        参数:
+            source (str|bytes): 图片文件路径或图片数据
+            width_cm (float): 显示宽度（厘米）
+            height_cm (float): 显示高度（厘米）
+            orientation (int): EXIF 方向，数据按存储方向保存时据此转正
+
+        异常:
+            ValueError: 无法识别的图片数据
+        """
+        image_id = self._store_image(source, orientation)
+        if self._images and self._flow_y + height_cm > self.page_size_cm[1] - self.margin_cm:
+            self.end_page()
+        self._place(image_id, self.margin_cm, self._flow_y, width_cm, height_cm)
+        self._flow_y += height_cm
+
+    def add_positioned_picture(self, source, x_cm, y_cm, width_cm, height_cm, orientation=1):
+        """
+        在当前页的指定位置插入一张图片（相对页面左上角），一页的图片插入完后调用 end_page()
+
+        参数:
+            source (str|bytes): 图片文件路径或图片数据
+            x_cm (float): 图片左边距页面左边的距离（厘米）
+            y_cm (float): 图片上边距页面上边的距离（厘米）
+            width_cm (float): 显示宽度（厘米）
+            height_cm (float): 显示高度（厘米）
+            orientation (int): EXIF 方向
+
+        异常:
+            ValueError: 无法识别的图片数据
+        """
+        self._place(self._store_image(source, orientation), x_cm, y_cm, width_cm, height_cm)
+
+    def end_page(self):
+        """写出当前页，没有图片时不产生空白页"""
+        if self._images:
+            self._pdf.add_page(self.page_size_cm[0] * POINTS_PER_CM, self.page_size_cm[1] * POINTS_PER_CM,
+                               self._images)
+        self._images = []
+        self._flow_y = self.margin_cm
+
+    def close(self):
+        self.end_page()
+        self._pdf.close()
+
+    def abort(self):
+        """放弃写入并删除未完成的文件"""
+        self._pdf.close()
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+
+def _encode_docx_item(page, index, jpeg_quality, passthrough):
+    """
+    Word 文档中一张图片的内容：像素未被修改的 JPEG / PNG 原图直接使用原图文件，
+    否则黑白图片编码为 1 位 PNG，其余编码为 JPEG
+    """
+    source_path = page.source_paths[index] if passthrough and page.source_paths else None
+    if source_path and sniff_image_format(source_path) in ("JPEG", "PNG"):
+        return source_path
+    image = page.sources[index]
+    buffer = io.BytesIO()
+    if image.mode in ("L", "RGB"):
+        image.save(buffer, format="JPEG", quality=jpeg_quality)
+    else:
+        image.save(buffer, format="PNG", optimize=image.mode == "1")
+    return buffer.getvalue()
+
+
+def export_pages(pages, path, dpi=DPI, progress=None, cancel_event=None, jpeg_quality=90, passthrough=True):
+    """
+    逐页合成并写出合并结果
+
+    参数:
+        pages (iterable[merge_pipeline.MergedPage]): 延迟合成的页面；可以是边处理边产出页面的生成器，
+                                                     此时进度回调的总页数为 None
+        path (str): 输出路径，格式由扩展名决定（见 EXPORT_FORMATS）
+        dpi (int): 页面像素对应的分辨率，决定 PDF 页面的物理尺寸和图片的 DPI 信息
+        progress (callable): 进度回调 progress(已完成页数, 总页数)
+        cancel_event (threading.Event): 置位后在下一页开始前停止导出；取消或出错时删除已写出的文件
+        jpeg_quality (int): JPEG / PDF 中彩色页面的压缩质量
+        passthrough (bool): 导出 PDF / Word 时，未修改像素的原图直接嵌入而不重新编码
+
+    返回:
+        list[str]: 写出的文件路径
+
+    异常:
+        ValueError: 不支持的格式
+        ExportCancelled: 导出被取消
+    """
+    fmt = export_format_for(path)
+    if fmt is None:
+        raise ValueError(f"不支持的导出格式：{path}")
+    if fmt in ("JPEG", "PNG") and not hasattr(pages, "__len__"):
+        # 每页一个文件时文件名中的页码位数取决于总页数
+        pages = list(pages)
+    total = len(pages) if hasattr(pages, "__len__") else None
+    written = []
+
+    def report(done):
+        if progress:
+            progress(done, total)
+
+    try:
+        if fmt == "PDF":
+            # PDF 不合成整页：每张图片作为独立对象按排版位置放置，像素 -> 点（1/72 英寸）
+            scale = 72 / dpi
+            with PdfStreamWriter(path) as pdf:
+                written.append(path)
+                for number, page in enumerate(pages):
+                    _check_cancel(cancel_event)
+                    images = []
+                    for placement in page.layout.placements:
+                        image_id = _embed_item(pdf, page, placement.index, jpeg_quality, passthrough)
+                        images.append((image_id, placement.x * scale, placement.y * scale,
+                                       placement.width * scale, placement.height * scale))
+                    pdf.add_page(page.layout.width * scale, page.layout.height * scale, images)
+                    report(number + 1)
+        elif fmt == "DOCX":
+            # 页面尺寸取自排版结果（所有页面相同），图片按排版位置放置，像素 -> 厘米
+            cm_per_pixel = 2.54 / dpi
+            doc = None
+            try:
+                for number, page in enumerate(pages):
+                    _check_cancel(cancel_event)
+                    if doc is None:
+                        doc = DocxStreamWriter(path, page.layout.width * cm_per_pixel,
+                                               page.layout.height * cm_per_pixel)
+                        written.append(path)
+                    for placement in page.layout.placements:
+                        data = _encode_docx_item(page, placement.index, jpeg_quality, passthrough)
+                        doc.add_positioned_picture(data, placement.x * cm_per_pixel, placement.y * cm_per_pixel,
+                                                   placement.width * cm_per_pixel, placement.height * cm_per_pixel)
+                    doc.end_page()
+                    report(number + 1)
+            except BaseException:
+                if doc is not None:
+                    doc.abort()
+                raise
+            if doc is not None:
+                doc.close()
+        elif fmt == "TIFF":
+            with open(path, "w+b") as fp:
+                written.append(path)
+                with TiffImagePlugin.AppendingTiffWriter(fp, new=True) as tiff:
+                    for number, page in enumerate(pages):
+                        _check_cancel(cancel_event)
+                        image = page.render()
+                        if image.mode not in TIFF_COMPRESSION:
+                            image = image.convert("RGB")
+                        image.save(tiff, format="TIFF", dpi=(dpi, dpi), compression=TIFF_COMPRESSION[image.mode])
+                        tiff.newFrame()
+                        report(number + 1)
+        else:
+            # 单页格式：每页写一个文件
+            for number, page in enumerate(pages):
+                _check_cancel(cancel_event)
+                page_path = numbered_path(path, number, total)
+                written.append(page_path)
+                image = page.render()
+                if fmt == "JPEG":
+                    if image.mode == "1":
+                        # JPEG 不支持 1 位图像，黑白页面建议保存为 PNG / TIFF / PDF
+                        image = image.convert("L")
+                    image.save(page_path, format=fmt, dpi=(dpi, dpi), quality=jpeg_quality)
+                else:
+                    image.save(page_path, format=fmt, dpi=(dpi, dpi))
+                report(number + 1)
+    except BaseException:
+        # 取消或出错时删除已写出（包括写了一半）的文件
+        for file_path in written:
+            if os.path.exists(file_path):
+                os.remove(file_path)
+        raise
+    return written
+
+
+def _benchmark_pages(count, mode="RGB"):
+    """构造用于测试的页面：每页排满身份证大小的合成图片"""
+    from merge_layout import A4_SIZE_PX, ID_CARD_SIZE_PX, layout_column
+    from merge_pipeline import MergedPage
+
+    card = Image.effect_noise(ID_CARD_SIZE_PX, 40).convert(mode)
+    sources = [card] * (count * 8)
+    layouts = layout_column([card.size] * len(sources), A4_SIZE_PX, 100)
+    return [MergedPage(layout, sources, mode=mode) for layout in layouts[:count]]
+
+
+def _peak_memory_mb():
+    """当前进程的峰值内存（MB），Windows 下不可用时返回 None"""
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # macOS 单位为字节，Linux 为 KB
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="测试合并结果的导出吞吐量")
+    parser.add_argument("--pages", type=int, default=120, help="页数")
+    parser.add_argument("--format", choices=["pdf", "tiff", "png", "jpg"], default="pdf", help="导出格式")
+    parser.add_argument("--mode", choices=["RGB", "L", "1"], default="RGB", help="页面图像模式")
+    parser.add_argument("--output", help="输出文件，默认写到临时目录并在结束后删除")
+    args = parser.parse_args(argv)
+
+    pages = _benchmark_pages(args.pages, args.mode)
+    with tempfile.TemporaryDirectory() as temp_dir:
+        path = args.output or os.path.join(temp_dir, f"benchmark.{args.format}")
+        start_time = time.perf_counter()
+        written = export_pages(pages, path)
+        elapsed = time.perf_counter() - start_time
+        size_mb = sum(os.path.getsize(p) for p in written) / (1024 * 1024)
+    peak = _peak_memory_mb()
+    logger.info(f"{len(pages)} 页 {args.format.upper()}：耗时 {elapsed:.2f} 秒，"
+                f"{len(pages) / elapsed:.1f} 页/秒，输出 {size_mb:.1f} MB"
+                + (f"，峰值内存 {peak:.0f} MB" if peak is not None else ""))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,355 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+证件图片合并的排版引擎
+
+只根据每张图片的尺寸、页面尺寸和间距计算摆放位置，不依赖 wx，也不读取像素，
+结果是纯数据（PageLayout / Placement），由合成阶段再把图片贴到页面上。
+间距或预设改变时只需重新排版，无需重新解码图片。
+
+命令行可对比各排版策略的页数和耗时:
+    python merge_layout.py --preset id_card --count 100 --gap 15
+"""
+import time
+import argparse
+from dataclasses import dataclass, field
+from typing import List
+
+DPI = 300         # 默认打印 / 导出分辨率
+SCREEN_DPI = 96   # 屏幕预览分辨率
+
+
+def mm_to_pixel(mm, dpi=DPI):
+    """将毫米单位转换为像素值
+
+    参数:
+        mm (float): 毫米单位的长度值
+        dpi (int): 每英寸点数，默认为300
+
+    返回:
+        int: 转换后的像素值(四舍五入取整)
+
+    说明:
+        使用公式: 像素 = 毫米 * DPI / 25.4
+        其中25.4是1英寸对应的毫米数(1英寸=25.4毫米)
+    """
+    return int(round(mm * dpi / 25.4))
+
+
+A4_SIZE_MM = (210, 297)
+A4_SIZE_PX = (mm_to_pixel(A4_SIZE_MM[0]), mm_to_pixel(A4_SIZE_MM[1]))
+
+# 预设证件尺寸（单位：毫米）适当加大
+ID_CARD_SIZE_MM = (86, 54)     # 身份证（85.6毫米 ×54毫米）
+HUKOU_SIZE_MM = (145, 106)        # 户口本（143 毫米 ×105 毫米）
+STUDENT_CARD_SIZE_MM = (120, 90)  # 学生证
+# 预先转换成像素
+ID_CARD_SIZE_PX = (mm_to_pixel(ID_CARD_SIZE_MM[0]), mm_to_pixel(ID_CARD_SIZE_MM[1]))
+HUKOU_SIZE_PX = (mm_to_pixel(HUKOU_SIZE_MM[0]), mm_to_pixel(HUKOU_SIZE_MM[1]))
+STUDENT_CARD_SIZE_PX = (mm_to_pixel(STUDENT_CARD_SIZE_MM[0]), mm_to_pixel(STUDENT_CARD_SIZE_MM[1]))
+
+# 预设名称，顺序与合并器界面上的预设下拉框一致；自定义模式没有固定尺寸
+PRESET_NAMES = ["hukou", "id_card", "student_card", "custom"]
+PRESET_SIZES_MM = {
+    "hukou": HUKOU_SIZE_MM,
+    "id_card": ID_CARD_SIZE_MM,
+    "student_card": STUDENT_CARD_SIZE_MM,
+}
+
+
+def preset_size_px(preset, dpi=DPI):
+    """
+    获取预设证件在指定 DPI 下的像素尺寸
+
+    参数:
+        preset (str): 预设名称，见 PRESET_SIZES_MM
+        dpi (int): 每英寸点数
+
+    返回:
+        tuple: (宽, 高) 像素
+    """
+    width_mm, height_mm = PRESET_SIZES_MM[preset]
+    return mm_to_pixel(width_mm, dpi), mm_to_pixel(height_mm, dpi)
+
+
+@dataclass
+class Placement:
+    """一张图片在页面上的位置"""
+    index: int      # 图片在输入列表中的序号
+    x: int          # 左上角横坐标（像素）
+    y: int          # 左上角纵坐标（像素）
+    width: int
+    height: int
+
+
+@dataclass
+class PageLayout:
+    """一页的排版结果"""
+    width: int
+    height: int
+    placements: List[Placement] = field(default_factory=list)
+
+
+def layout_column(item_sizes, page_size, gap):
+    """
+    单列排版：图片自上而下排列，每页内容整体垂直居中，每张图片水平居中
+
+    参数:
+        item_sizes (list[tuple]): 每张图片的 (宽, 高) 像素尺寸
+        page_size (tuple): 页面 (宽, 高) 像素尺寸
+        gap (int): 图片之间的垂直间距（像素）
+
+    返回:
+        list[PageLayout]: 每页的排版结果
+    """
+    page_width, page_height = page_size
+    pages = []
+    column = []  # 当前页的 (序号, 宽, 高)
+    draw_y = 0   # 当前页已占用的高度（含每张图片之后的间距）
+
+    def flush():
+        # 内容总高度为 draw_y - gap，据此计算垂直居中的起点
+        y_offset = (page_height - draw_y + gap) // 2
+        page = PageLayout(page_width, page_height)
+        for index, width, height in column:
+            x = (page_width - width) // 2
+            page.placements.append(Placement(index, x, y_offset, width, height))
+            y_offset += height + gap
+        pages.append(page)
+
+    for index, (width, height) in enumerate(item_sizes):
+        # 当前页放不下这张图片时换页（空页直接放入，超高图片单独占一页）
+        if column and draw_y + height > page_height:
+            flush()
+            column = []
+            draw_y = 0
+        column.append((index, width, height))
+        draw_y += height + gap
+
+    if column:
+        flush()
+    return pages
+
+
+def _centered_rows(rows, page_size, gap):
+    """
+    将若干行图片在页面上整体垂直居中、每行水平居中
+
+    参数:
+        rows (list[list[tuple]]): 每行的 (序号, 宽, 高)
+        page_size (tuple): 页面 (宽, 高) 像素尺寸
+        gap (int): 行间距与同一行内图片的间距（像素）
+
+    返回:
+        PageLayout: 页面排版
+    """
+    page_width, page_height = page_size
+    row_heights = [max(height for _, _, height in row) for row in rows]
+    content_height = sum(row_heights) + gap * (len(rows) - 1)
+    y = (page_height - content_height) // 2
+    page = PageLayout(page_width, page_height)
+    for row, row_height in zip(rows, row_heights):
+        row_width = sum(width for _, width, _ in row) + gap * (len(row) - 1)
+        x = (page_width - row_width) // 2
+        for index, width, height in row:
+            # 行内图片垂直居中
+            page.placements.append(Placement(index, x, y + (row_height - height) // 2, width, height))
+            x += width + gap
+        y += row_height + gap
+    return page
+
+
+def layout_grid(item_sizes, page_size, gap):
+    """
+    网格排版：按最大图片尺寸划分等大单元格，按输入顺序逐行填充，
+    适合同一预设下尺寸一致的证件（如一页排两列身份证）
+
+    参数:
+        item_sizes (list[tuple]): 每张图片的 (宽, 高) 像素尺寸
+        page_size (tuple): 页面 (宽, 高) 像素尺寸
+        gap (int): 单元格之间的水平和垂直间距（像素）
+
+    返回:
+        list[PageLayout]: 每页的排版结果
+    """
+    if not item_sizes:
+        return []
+    page_width, page_height = page_size
+    cell_width = max(width for width, _ in item_sizes)
+    cell_height = max(height for _, height in item_sizes)
+    columns = max(1, (page_width + gap) // (cell_width + gap))
+    rows = max(1, (page_height + gap) // (cell_height + gap))
+    per_page = columns * rows
+
+    pages = []
+    for start in range(0, len(item_sizes), per_page):
+        count = min(per_page, len(item_sizes) - start)
+        used_columns = min(columns, count)
+        used_rows = (count + columns - 1) // columns
+        # 整个网格在页面上居中，图片在各自单元格内居中
+        left = (page_width - (used_columns * cell_width + (used_columns - 1) * gap)) // 2
+        top = (page_height - (used_rows * cell_height + (used_rows - 1) * gap)) // 2
+        page = PageLayout(page_width, page_height)
+        for offset in range(count):
+            index = start + offset
+            width, height = item_sizes[index]
+            row, column = divmod(offset, columns)
+            x = left + column * (cell_width + gap) + (cell_width - width) // 2
+            y = top + row * (cell_height + gap) + (cell_height - height) // 2
+            page.placements.append(Placement(index, x, y, width, height))
+        pages.append(page)
+    return pages
+
+
+def layout_shelf(item_sizes, page_size, gap):
+    """
+    货架式装箱（First-Fit Decreasing）：按高度从大到小依次放入第一个能容纳的行，
+    放不下时在第一个有剩余高度的页面新开一行，尺寸不一的图片也能尽量减少页数。
+    图片在页面内的顺序可能与输入顺序不同。
+
+    参数:
+        item_sizes (list[tuple]): 每张图片的 (宽, 高) 像素尺寸
+        page_size (tuple): 页面 (宽, 高) 像素尺寸
+        gap (int): 图片之间的水平和垂直间距（像素）
+
+    返回:
+        list[PageLayout]: 每页的排版结果
+    """
+    page_width, page_height = page_size
+    order = sorted(range(len(item_sizes)), key=lambda i: (-item_sizes[i][1], i))
+    # 每页记录 [已用高度, 行列表]，每行记录 [行高, 已用宽度, 图片列表]
+    bins = []
+    for index in order:
+        width, height = item_sizes[index]
+        placed = False
+        for page in bins:
+            for shelf in page[1]:
+                if height <= shelf[0] and shelf[1] + gap + width <= page_width:
+                    shelf[1] += gap + width
+                    shelf[2].append((index, width, height))
+                    placed = True
+                    break
+            if placed:
+                break
+            # 新开一行：行高取本图高度（后续图片不会更高）
+            if page[0] + gap + height <= page_height:
+                page[0] += gap + height
+                page[1].append([height, width, [(index, width, height)]])
+                placed = True
+                break
+        if not placed:
+            bins.append([height, [[height, width, [(index, width, height)]]]])
+
+    return [_centered_rows([shelf[2] for shelf in shelves], page_size, gap) for _, shelves in bins]
+
+
+def layout_rows(item_sizes, page_size, gap):
+    """
+    逐行排版：按输入顺序从左到右填充一行，放不下时换行，行高取行内最高的图片，
+    页面放不下这一行时换页。宽高比不一的图片按单元格缩放后也不会按最大尺寸浪费空间。
+
+    参数:
+        item_sizes (list[tuple]): 每张图片的 (宽, 高) 像素尺寸
+        page_size (tuple): 页面 (宽, 高) 像素尺寸
+        gap (int): 图片之间的水平和垂直间距（像素）
+
+    返回:
+        list[PageLayout]: 每页的排版结果
+    """
+    page_width, page_height = page_size
+    pages = []
+    rows = []     # 当前页的行，每行为 (序号, 宽, 高) 列表
+    row = []
+    row_width = 0
+    used_height = 0  # 当前页已完成各行的高度（含每行之后的间距）
+
+    def close_row():
+        nonlocal used_height
+        row_height = max(height for _, _, height in row)
+        # 当前页放不下这一行时换页（空页直接放入，超高的行单独占一页）
+        if rows and used_height + row_height > page_height:
+            pages.append(_centered_rows(rows, page_size, gap))
+            rows.clear()
+            used_height = 0
+        rows.append(list(row))
+        used_height += row_height + gap
+
+    for index, (width, height) in enumerate(item_sizes):
+        if row and row_width + gap + width > page_width:
+            close_row()
+            row = []
+        row_width = width if not row else row_width + gap + width
+        row.append((index, width, height))
+
+    if row:
+        close_row()
+    if rows:
+        pages.append(_centered_rows(rows, page_size, gap))
+    return pages
+
+
+# 排版策略名称，顺序与合并器界面上的排版下拉框一致
+LAYOUT_STRATEGIES = {
+    "column": layout_column,
+    "grid": layout_grid,
+    "shelf": layout_shelf,
+    "rows": layout_rows,
+}
+# 保持输入顺序的排版策略：每页的图片序号连续，可以边准备图片边逐页写出
+ORDERED_STRATEGIES = ("column", "grid", "rows")
+
+
+def layout_pages(item_sizes, page_size_mm=A4_SIZE_MM, gap_mm=15, dpi=DPI, strategy="column"):
+    """
+    按毫米单位的页面尺寸和间距排版
+
+    参数:
+        item_sizes (list[tuple]): 每张图片在 dpi 下的 (宽, 高) 像素尺寸
+        page_size_mm (tuple): 页面 (宽, 高) 毫米
+        gap_mm (float): 图片间距（毫米）
+        dpi (int): 每英寸点数
+        strategy (str): 排版策略，见 LAYOUT_STRATEGIES
+
+    返回:
+        list[PageLayout]: 每页的排版结果
+    """
+    page_size = (mm_to_pixel(page_size_mm[0], dpi), mm_to_pixel(page_size_mm[1], dpi))
+    return LAYOUT_STRATEGIES[strategy](item_sizes, page_size, mm_to_pixel(gap_mm, dpi))
+
+
+def compare_strategies(item_sizes, page_size, gap):
+    """
+    用所有排版策略排版同一组图片，报告页数和排版耗时
+
+    参数:
+        item_sizes (list[tuple]): 每张图片的 (宽, 高) 像素尺寸
+        page_size (tuple): 页面 (宽, 高) 像素尺寸
+        gap (int): 图片间距（像素）
+
+    返回:
+        list[dict]: 每种策略的 strategy / pages / seconds
+    """
+    report = []
+    for name, func in LAYOUT_STRATEGIES.items():
+        start_time = time.perf_counter()
+        pages = func(item_sizes, page_size, gap)
+        report.append({"strategy": name, "pages": len(pages), "seconds": time.perf_counter() - start_time})
+    return report
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="对比各排版策略的页数和耗时")
+    parser.add_argument("--preset", choices=list(PRESET_SIZES_MM), default="id_card", help="证件预设")
+    parser.add_argument("--count", type=int, default=100, help="图片数量")
+    parser.add_argument("--gap", type=float, default=15, help="图片间距（毫米）")
+    parser.add_argument("--dpi", type=int, default=DPI, help="每英寸点数")
+    args = parser.parse_args(argv)
+
+    item_sizes = [preset_size_px(args.preset, args.dpi)] * args.count
+    page_size = (mm_to_pixel(A4_SIZE_MM[0], args.dpi), mm_to_pixel(A4_SIZE_MM[1], args.dpi))
+    for row in compare_strategies(item_sizes, page_size, mm_to_pixel(args.gap, args.dpi)):
+        print(f"{row['strategy']:<8} 页数: {row['pages']:<5} 排版耗时: {row['seconds'] * 1000:.3f} 毫秒")
+
+
+if __name__ == "__main__":
+    main()
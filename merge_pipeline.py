@@ -0,0 +1,613 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+证件图片合并的像素处理阶段
+
+- 准备阶段：通过 image_io 读取图片（按 EXIF 方向旋转，与其它工具共用已解码图像缓存）、缩放到目标尺寸、
+  按需漂白，使用线程池并行且按输入顺序返回
+- 缓存：已处理的图片按文件和参数缓存，再次合并时只处理新增或变化的图片
+- 合成阶段：把处理好的图片按 merge_layout 给出的排版结果贴到页面上
+- 页面模式：黑白漂白后的图片以 1 位 ('1') 保存，灰度图片以 'L' 保存，页面使用能容纳所有图片的最窄模式
+"""
+import os
+import time
+import threading
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field, replace
+from typing import Dict, List, Optional, Tuple, Union
+
+from PIL import Image
+
+from image_io import image_nbytes, load_image
+from image_probe import probe_file
+from merge_layout import DPI, A4_SIZE_MM, PRESET_SIZES_MM, LAYOUT_STRATEGIES, mm_to_pixel, preset_size_px
+from utils import apply_bleach_stage, scale_bleach_params
+
+
+# 合并器接受的图片格式（按文件头识别，见 image_io.sniff_image_format），界面和无界面合并共用
+MERGE_IMAGE_FORMATS = ("JPEG", "PNG", "BMP", "GIF")
+
+# 缩放质量与解码时保留的目标尺寸倍数：
+# exact    - 完整解码后直接 LANCZOS 缩放（原有行为）
+# balanced - 解码 / 整数缩小到不小于目标尺寸 2 倍，再 LANCZOS 缩放，画质与 exact 基本一致
+# fast     - 解码 / 整数缩小到刚好不小于目标尺寸，再 LANCZOS 缩放
+RESIZE_QUALITIES = {"exact": None, "balanced": 2, "fast": 1}
+
+# 页面颜色模式：auto 按图片内容选择，其余强制转换为对应的 PIL 模式
+PAGE_MODES = {"auto": None, "color": "RGB", "gray": "L", "bw": "1"}
+# 输出二值图像的漂白阶段（结果只有 0 / 255 两种灰度，转为 1 位不损失信息）
+BINARY_BLEACH_STAGES = ("bleach", 0)
+
+
+@dataclass(frozen=True)
+class PrepareOptions:
+    """单张图片准备阶段的参数（不可变，可作为缓存键）"""
+    preset: str = "id_card"                      # 预设名称，见 merge_layout.PRESET_NAMES
+    target_width: int = 0                        # 自定义模式下的目标宽度（像素）
+    bleach_stage: Optional[Union[str, int]] = None  # 漂白阶段，None 表示不漂白
+    auto_tune: bool = False                      # 是否自动选择漂白参数
+    params: Tuple = ()                           # 手动指定的漂白参数 ((key, value), ...)
+    dpi: int = DPI
+    quality: str = "balanced"                    # 缩放质量，见 RESIZE_QUALITIES
+    page_mode: str = "auto"                      # 页面颜色模式，见 PAGE_MODES
+    bleach_scale: float = 1.0                    # 当前分辨率 / 漂白参数对应的（打印）分辨率
+
+    def at_dpi(self, dpi):
+        """
+        换算到另一分辨率的参数，用于生成屏幕预览用的低分辨率图片：自定义目标宽度按比例换算，
+        以像素为单位的漂白参数在漂白时按 bleach_scale 换算，预览的漂白效果与导出一致
+        """
+        if dpi == self.dpi:
+            return self
+        return replace(self, dpi=dpi, target_width=round(self.target_width * dpi / self.dpi),
+                       bleach_scale=self.bleach_scale * dpi / self.dpi)
+
+
+def target_size_for(source_size, options):
+    """
+    计算图片缩放后的目标尺寸
+
+    参数:
+        source_size (tuple): 原图 (宽, 高)
+        options (PrepareOptions): 准备参数
+
+    返回:
+        tuple: 目标 (宽, 高) 像素
+    """
+    if options.preset in PRESET_SIZES_MM:
+        return preset_size_px(options.preset, options.dpi)
+    # 自定义模式：按目标宽度等比缩放
+    ratio = options.target_width / source_size[0]
+    return options.target_width, int(source_size[1] * ratio)
+
+
+def load_resized(img, target_size, quality="balanced"):
+    """
+    将刚打开的图片缩放到目标尺寸
+
+    对 JPEG 先用 draft() 在解码时按 1/2、1/4、1/8 缩小，其余格式用 reduce() 做整数倍缩小，
+    最后再用 LANCZOS 精确缩放到目标尺寸。手机拍摄的 1200 万像素以上原图
+    只需解码一小部分像素，耗时和内存占用都大幅下降。
+
+    参数:
+        img (PIL.Image): 已打开（尚未加载像素）的图片
+        target_size (tuple): 目标 (宽, 高)
+        quality (str): 缩放质量，见 RESIZE_QUALITIES
+
+    返回:
+        PIL.Image: 缩放后的图片
+    """
+    if quality not in RESIZE_QUALITIES:
+        raise ValueError(f"未知的缩放质量：{quality}")
+    factor = RESIZE_QUALITIES[quality]
+    if factor is not None:
+        min_size = (target_size[0] * factor, target_size[1] * factor)
+        # draft 只对 JPEG 生效，保证解码结果不小于请求的尺寸
+        img.draft(None, min_size)
+        reduce_by = min(img.width // min_size[0], img.height // min_size[1])
+        if reduce_by >= 2:
+            # 调色板 / 二值等模式不支持 reduce，先转换为可平均的模式
+            if img.mode not in ("L", "LA", "RGB", "RGBA", "CMYK", "I", "F"):
+                img = img.convert("RGBA" if "transparency" in img.info else "RGB")
+            img = img.reduce(reduce_by)
+    return img.resize(target_size, Image.LANCZOS)
+
+
+def prepare_item(path, options, tuner=None):
+    """
+    读取单张图片，缩放到目标尺寸并按需漂白
+
+    参数:
+        path (str): 图片路径
+        options (PrepareOptions): 准备参数
+        tuner (autotune.AutoTuner): 自动参数调节器，options.auto_tune 为 True 时使用
+
+    返回:
+        PIL.Image: 处理后的图片
+    """
+    # 自动参数按预设和文件缓存
+    params_for = (lambda size: tuner.params_for(path, options.preset, size[0])) if tuner is not None else None
+    # 按文件头算出目标尺寸（与 item_sizes_for 的排版一致，不受缩小解码的舍入影响），
+    # 只解码到缩放质量所需的分辨率（缓存中已有更大的图像时直接复用）
+    target_size = target_size_for(probe_file(path).display_size, options)
+    factor = RESIZE_QUALITIES.get(options.quality)
+    min_size = (target_size[0] * factor, target_size[1] * factor) if factor is not None else None
+    return prepare_image(load_image(path, min_size), options, params_for, target_size)
+
+
+def prepare_image(img, options, params_for=None, target_size=None):
+    """
+    把已打开或已解码的图片缩放到目标尺寸并按需漂白，文件和内存中的图片（如裁剪结果）共用
+
+    参数:
+        img (PIL.Image): 图片
+        options (PrepareOptions): 准备参数
+        params_for (callable): params_for(目标尺寸) 返回自动漂白参数，options.auto_tune 为 True 时使用
+        target_size (tuple): 目标 (宽, 高)，为 None 时按 img 的尺寸计算；
+                             img 为缩小解码的结果时应传入按原图尺寸计算的值
+
+    返回:
+        PIL.Image: 处理后的图片
+    """
+    if target_size is None:
+        target_size = target_size_for(img.size, options)
+    resized_img = load_resized(img, target_size, options.quality)
+
+    if options.bleach_stage is not None:
+        # 勾选自动参数时使用自动参数，否则使用手动指定的参数
+        params = dict(options.params)
+        scale = options.bleach_scale
+        if options.auto_tune and params_for is not None:
+            # 自动参数按打印分辨率的尺寸推算，与导出时命中同一缓存条目
+            params = params_for((round(target_size[0] / scale), round(target_size[1] / scale)))
+        if scale != 1:
+            params = scale_bleach_params(options.bleach_stage, params, scale)
+        resized_img = apply_bleach_stage(resized_img, options.bleach_stage, params)
+    return convert_item_mode(resized_img, options)
+
+
+def convert_item_mode(img, options):
+    """
+    按页面颜色模式转换处理好的图片，黑白 / 灰度图片不再以 RGB 保存
+
+    参数:
+        img (PIL.Image): 处理好的图片
+        options (PrepareOptions): 准备参数
+
+    返回:
+        PIL.Image: 转换后的图片
+    """
+    if options.page_mode not in PAGE_MODES:
+        raise ValueError(f"未知的页面颜色模式：{options.page_mode}")
+    mode = PAGE_MODES[options.page_mode]
+    if mode is None:
+        # 自动：二值漂白结果转为 1 位，其它图片保持原模式
+        if options.bleach_stage in BINARY_BLEACH_STAGES and img.mode == "L":
+            return img.convert("1", dither=Image.Dither.NONE)
+        if img.mode not in ("1", "L", "RGB"):
+            return img.convert("RGB")
+        return img
+    if mode == "1" and img.mode != "1":
+        # 按固定阈值（128）二值化，不做抖动
+        return img.convert("L").convert("1", dither=Image.Dither.NONE)
+    if img.mode != mode:
+        return img.convert(mode)
+    return img
+
+
+def page_mode_for(images):
+    """
+    能容纳所有图片的最窄页面模式：全部为 1 位时为 '1'，全部为黑白 / 灰度时为 'L'，否则为 'RGB'
+
+    参数:
+        images (list[PIL.Image]): 页面上的图片
+
+    返回:
+        str: PIL 图像模式
+    """
+    modes = {img.mode for img in images}
+    if modes <= {"1"}:
+        return "1"
+    if modes <= {"1", "L"}:
+        return "L"
+    return "RGB"
+
+
+class PreparedItemCache:
+    """
+    已处理图片的 LRU 缓存，按内存占用上限淘汰最久未使用的条目
+
+    缓存键为 (绝对路径, 修改时间, 文件大小, PrepareOptions)。目标尺寸由预设 / 目标宽度 / DPI
+    和原图尺寸唯一决定，漂白阶段和参数也都包含在 PrepareOptions 中，
+    因此文件被修改或任一参数改变时都会重新处理。
+    """
+
+    def __init__(self, max_bytes=512 * 1024 * 1024):
+        """
+        参数:
+            max_bytes (int): 缓存图片占用内存的上限（字节）
+        """
+        self.max_bytes = max_bytes
+        self.current_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self._items = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def make_key(path, options):
+        stat = os.stat(path)
+        return os.path.abspath(path), stat.st_mtime_ns, stat.st_size, options
+
+    def get(self, key):
+        with self._lock:
+            image = self._items.get(key)
+            if image is None:
+                self.misses += 1
+                return None
+            self._items.move_to_end(key)
+            self.hits += 1
+            return image
+
+    def put(self, key, image):
+        size = image_nbytes(image)
+        # 单张图片超过上限时不缓存，避免把其它条目全部挤出
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            if key in self._items:
+                self.current_bytes -= image_nbytes(self._items.pop(key))
+            self._items[key] = image
+            self.current_bytes += size
+            while self.current_bytes > self.max_bytes:
+                _, evicted = self._items.popitem(last=False)
+                self.current_bytes -= image_nbytes(evicted)
+
+    def clear(self):
+        with self._lock:
+            self._items.clear()
+            self.current_bytes = 0
+
+    def __len__(self):
+        return len(self._items)
+
+
+def _prepare_cached(index, path, options, tuner, cache, misses):
+    """先查缓存，未命中时处理并写入缓存；未命中的序号记入 misses"""
+    if cache is None:
+        image = None
+    else:
+        key = cache.make_key(path, options)
+        image = cache.get(key)
+    if image is None:
+        image = prepare_item(path, options, tuner)
+        if cache is not None:
+            cache.put(key, image)
+        if misses is not None:
+            misses.append(index)
+    return image
+
+
+def _item_result(future, skip_failed):
+    if not skip_failed:
+        return future.result()
+    try:
+        return future.result()
+    except Exception as e:
+        return e
+
+
+def iter_prepared(paths, options, workers=None, tuner=None, max_in_flight=None, cache=None, skip_failed=False,
+                  misses=None):
+    """
+    使用线程池并行准备图片，按输入顺序逐个产出
+
+    Pillow 的解码、缩放和 OpenCV 的处理都会释放 GIL，线程池即可利用多核，
+    同时省去进程间传输像素的开销。在途任务数有上限，内存占用不随图片数量增长。
+
+    参数:
+        paths (list[str]): 图片路径列表
+        options (PrepareOptions): 准备参数
+        workers (int): 线程数，默认为 CPU 核心数
+        tuner (autotune.AutoTuner): 自动参数调节器
+        max_in_flight (int): 最大在途任务数，默认为 workers 的 2 倍
+        cache (PreparedItemCache): 已处理图片缓存，命中时不再读取和处理图片
+        skip_failed (bool): 单张图片读取或处理失败时产出异常对象而不是抛出，其余图片继续处理
+        misses (list): 不为 None 时记入本次未命中缓存、重新处理的图片序号（只统计本次调用，
+                       不受共用同一缓存的其它合并影响）
+
+    返回:
+        generator[tuple]: (序号, PIL.Image)，skip_failed 时失败的图片为 (序号, Exception)
+    """
+    workers = workers or os.cpu_count() or 1
+    max_in_flight = max(max_in_flight or workers * 2, 1)
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        pending = deque()
+        try:
+            for index, path in enumerate(paths):
+                pending.append((index, executor.submit(_prepare_cached, index, path, options, tuner, cache, misses)))
+                if len(pending) >= max_in_flight:
+                    index, future = pending.popleft()
+                    yield index, _item_result(future, skip_failed)
+            while pending:
+                index, future = pending.popleft()
+                yield index, _item_result(future, skip_failed)
+        finally:
+            # 提前停止迭代（取消或出错）时丢弃尚未开始的任务，只等待正在执行的任务
+            for _, future in pending:
+                future.cancel()
+
+
+def prepare_items(paths, options, workers=None, tuner=None, progress=None, cache=None):
+    """
+    并行准备所有图片并按输入顺序返回
+
+    参数:
+        paths (list[str]): 图片路径列表
+        options (PrepareOptions): 准备参数
+        workers (int): 线程数
+        tuner (autotune.AutoTuner): 自动参数调节器
+        progress (callable): 进度回调 progress(已完成数量, 总数)
+        cache (PreparedItemCache): 已处理图片缓存
+
+    返回:
+        list[PIL.Image]: 处理后的图片
+    """
+    images = []
+    for index, image in iter_prepared(paths, options, workers, tuner, cache=cache):
+        images.append(image)
+        if progress:
+            progress(index + 1, len(paths))
+    return images
+
+
+def composite_page(page, images, mode="RGB", background="white"):
+    """
+    按排版结果合成一页
+
+    参数:
+        page (merge_layout.PageLayout): 页面排版
+        images (list[PIL.Image]): 处理好的图片，按 Placement.index 索引
+        mode (str): 页面图像模式
+        background: 页面背景色
+
+    返回:
+        PIL.Image: 合成后的页面
+    """
+    canvas = Image.new(mode, (page.width, page.height), color=background)
+    for placement in page.placements:
+        image = images[placement.index]
+        if image.size != (placement.width, placement.height):
+            # 图片按其它分辨率准备（如屏幕预览用的低分辨率图片）时缩放到排版尺寸
+            image = image.resize((placement.width, placement.height), Image.LANCZOS)
+        # 模式不同时 paste 会自动转换，黑白页面只占 1 / 24 的 RGB 内存
+        canvas.paste(image, (placement.x, placement.y))
+    return canvas
+
+
+class MergedPage:
+    """
+    延迟合成的页面
+
+    只保存排版结果和已处理图片的引用，不持有整页像素；预览或导出时才调用 render() 合成，
+    用完即可释放。两百页的合并结果也只占用各张证件图片本身的内存。
+    """
+
+    def __init__(self, layout, sources, mode=None, background="white", source_paths=None):
+        """
+        参数:
+            layout (merge_layout.PageLayout): 页面排版
+            sources (list[PIL.Image]): 已处理的图片，按 Placement.index 索引（多页共享同一列表）
+            mode (str): 页面图像模式，为 None 时按本页图片选择最窄的模式（见 page_mode_for）
+            background: 页面背景色
+            source_paths (list[str]): 像素未被修改（只缩放、未漂白）的图片的原图路径，按 Placement.index 索引，
+                                      导出 PDF 时可直接嵌入原始 JPEG；为 None 表示全部需要重新编码
+        """
+        self.layout = layout
+        self.sources = sources
+        if mode is None:
+            mode = page_mode_for([sources[placement.index] for placement in layout.placements])
+        self.mode = mode
+        self.background = background
+        self.source_paths = source_paths
+
+    @property
+    def size(self):
+        return self.layout.width, self.layout.height
+
+    def render(self, scale=1.0):
+        """
+        合成页面像素
+
+        参数:
+            scale (float): 缩放比例，小于 1 时直接按比例缩小各图片再合成（用于预览），
+                           不需要先合成整页再缩小；1 位页面缩小时以灰度合成，避免笔画断裂
+
+        返回:
+            PIL.Image: 页面图像
+        """
+        if scale == 1:
+            return composite_page(self.layout, self.sources, self.mode, self.background)
+        size = (max(1, round(self.layout.width * scale)), max(1, round(self.layout.height * scale)))
+        mode = "L" if self.mode == "1" else self.mode
+        canvas = Image.new(mode, size, color=self.background)
+        for placement in self.layout.placements:
+            item_size = (max(1, round(placement.width * scale)), max(1, round(placement.height * scale)))
+            item = self.sources[placement.index]
+            if item.mode == "1":
+                # 1 位图像只能最近邻缩放，先转灰度
+                item = item.convert("L")
+            item = item.resize(item_size, Image.LANCZOS, reducing_gap=2.0)
+            canvas.paste(item, (round(placement.x * scale), round(placement.y * scale)))
+        return canvas
+
+
+def iter_rendered(pages, scale=1.0):
+    """
+    逐页合成，任一时刻只有一页的像素在内存中
+
+    参数:
+        pages (list[MergedPage]): 延迟合成的页面
+        scale (float): 缩放比例
+
+    返回:
+        generator[PIL.Image]: 页面图像
+    """
+    for page in pages:
+        yield page.render(scale)
+
+
+class MergeCancelled(Exception):
+    """合并被取消"""
+
+
+@dataclass
+class MergeResult:
+    """一次合并的结果"""
+    pages: List[MergedPage]
+    images: List[Optional[Image.Image]]           # 处理好的图片，按输入顺序，失败的图片为 None
+    new_items: int = 0                            # 本次新处理（未命中缓存）的图片数
+    timings: Dict[str, float] = field(default_factory=dict)  # 各阶段耗时（秒）
+    failed: List[Tuple[str, str]] = field(default_factory=list)  # (图片路径, 失败原因)，见 merge_pages 的 skip_failed
+
+
+def item_sizes_for(paths, options):
+    """
+    只读取文件头计算每张图片处理后的尺寸，不解码像素，可在准备阶段之前先完成排版
+
+    参数:
+        paths (list[str]): 图片路径列表
+        options (PrepareOptions): 准备参数
+
+    返回:
+        list[tuple]: 每张图片的 (宽, 高) 像素
+    """
+    sizes = []
+    for path in paths:
+        if options.preset in PRESET_SIZES_MM:
+            sizes.append(preset_size_px(options.preset, options.dpi))
+            continue
+        # 按 EXIF 方向旋转后的尺寸，与 image_io.load_image 的解码结果一致
+        sizes.append(target_size_for(probe_file(path).display_size, options))
+    return sizes
+
+
+def merge_pages(paths, options, strategy="column", gap=None, page_size_mm=A4_SIZE_MM, workers=None,
+                tuner=None, cache=None, progress=None, page_ready=None, cancel_event=None, render_dpi=None,
+                skip_failed=False):
+    """
+    完整的合并流程：排版 -> 并行准备图片 -> 生成延迟合成的页面
+
+    排版只依赖图片尺寸，先根据文件头排好全部页面，准备阶段每完成一页所需的图片就通过
+    page_ready 发布该页（按页码顺序），界面可以边处理边预览。
+
+    排版始终按 options.dpi（打印分辨率）计算；指定 render_dpi 时图片按该分辨率准备，
+    用于交互预览：调整排版时只需处理屏幕分辨率的小图，分页结果与导出时完全一致。
+
+    参数:
+        paths (list[str]): 图片路径列表
+        options (PrepareOptions): 准备参数
+        strategy (str): 排版策略，见 merge_layout.LAYOUT_STRATEGIES
+        gap (int): 图片间距（像素），为 None 时为 15 毫米
+        page_size_mm (tuple): 页面 (宽, 高) 毫米
+        workers (int): 线程数
+        tuner (autotune.AutoTuner): 自动参数调节器
+        cache (PreparedItemCache): 已处理图片缓存
+        progress (callable): 进度回调 progress(已完成数量, 总数)
+        page_ready (callable): 页面完成回调 page_ready(页码, MergedPage)
+        cancel_event (threading.Event): 置位后在下一张图片完成时停止
+        render_dpi (int): 图片的准备分辨率，为 None 时与 options.dpi 相同
+        skip_failed (bool): 单张图片无法读取或处理时记入 MergeResult.failed 并从排版中去掉，
+                            尚未发布的页面重新排版；为 False 时抛出该图片的异常
+
+    返回:
+        MergeResult: 合并结果
+
+    异常:
+        MergeCancelled: 合并被取消
+    """
+    timings = {}
+    if gap is None:
+        gap = mm_to_pixel(15, options.dpi)
+    page_size = (mm_to_pixel(page_size_mm[0], options.dpi), mm_to_pixel(page_size_mm[1], options.dpi))
+    failed = []
+    failed_indices = set()
+
+    # 未漂白且未转为灰度 / 黑白时像素没有被修改，导出 PDF 可直接嵌入原图
+    unmodified = options.bleach_stage is None and options.page_mode in ("auto", "color")
+    source_paths = [None] * len(paths) if unmodified else None
+
+    start_time = time.perf_counter()
+    sizes = [None] * len(paths)
+    laid_out = []  # 参与排版的图片序号
+    for index, path in enumerate(paths):
+        try:
+            sizes[index] = item_sizes_for([path], options)[0]
+            if unmodified and probe_file(path).orientation == 1:
+                # 带 EXIF 旋转的原图像素方向与页面不同，不能直接嵌入
+                source_paths[index] = path
+        except (OSError, ValueError) as e:
+            if not skip_failed:
+                raise
+            failed.append((path, str(e)))
+            continue
+        laid_out.append(index)
+
+    def lay_out(indices):
+        # 排版结果的序号对应 indices 中的位置，换回输入列表中的序号
+        page_layouts = LAYOUT_STRATEGIES[strategy]([sizes[index] for index in indices], page_size, gap)
+        for page_layout in page_layouts:
+            for placement in page_layout.placements:
+                placement.index = indices[placement.index]
+        return page_layouts
+
+    layouts = lay_out(laid_out)
+    timings["layout"] = time.perf_counter() - start_time
+
+    images = [None] * len(paths)
+    pages = []
+    # 每页还差几张图片；页面按页码顺序发布
+    page_of_item = {}
+    remaining = []
+
+    def count_remaining():
+        page_of_item.clear()
+        remaining[:] = [0] * len(layouts)
+        for number in range(len(pages), len(layouts)):
+            for placement in layouts[number].placements:
+                page_of_item[placement.index] = number
+                if images[placement.index] is None:
+                    remaining[number] += 1
+
+    count_remaining()
+    start_time = time.perf_counter()
+    misses = []
+    prepare_options = options.at_dpi(render_dpi) if render_dpi else options
+    prepared = iter_prepared([paths[index] for index in laid_out], prepare_options, workers, tuner, cache=cache,
+                             skip_failed=skip_failed, misses=misses)
+    for position, image in prepared:
+        if cancel_event is not None and cancel_event.is_set():
+            raise MergeCancelled()
+        index = laid_out[position]
+        if isinstance(image, Exception):
+            failed.append((paths[index], str(image) or type(image).__name__))
+            failed_indices.add(index)
+            # 已发布的页面保持不变，其余图片去掉失败的图片后重新排版
+            published = {placement.index for layout in layouts[:len(pages)] for placement in layout.placements}
+            layouts = layouts[:len(pages)] + lay_out([i for i in laid_out
+                                                      if i not in published and i not in failed_indices])
+            count_remaining()
+        else:
+            images[index] = image
+            remaining[page_of_item[index]] -= 1
+        if progress:
+            progress(index + 1, len(paths))
+        while len(pages) < len(layouts) and remaining[len(pages)] == 0:
+            page = MergedPage(layouts[len(pages)], images, source_paths=source_paths)
+            pages.append(page)
+            if page_ready:
+                page_ready(len(pages) - 1, page)
+    timings["prepare"] = time.perf_counter() - start_time
+
+    return MergeResult(pages, images, len(misses), timings, failed)
@@ -0,0 +1,302 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+流式 PDF 写入器
+
+每写入一个对象（图片、页面）就立即写到文件并记录偏移，页面树和交叉引用表在 close() 时写出，
+因此内存中只保留当前页的数据，页数再多也不会增加内存占用。
+JPEG 文件可以不经解码直接以 DCTDecode 嵌入，由页面变换矩阵负责缩放和定位。
+二值图像优先用 CCITT G4 (CCITTFaxDecode) 压缩，Pillow 不带 libtiff 时退回 Flate。
+"""
+import io
+import zlib
+
+from PIL import Image, features
+
+# 基线 / 扩展 / 渐进式 Huffman 编码的 SOF 标记，PDF 的 DCTDecode 都支持
+_DCT_SOF_MARKERS = (0xC0, 0xC1, 0xC2)
+# 其它 SOF 标记（无损、算术编码等），DCTDecode 不支持
+_OTHER_SOF_MARKERS = (0xC3, 0xC5, 0xC6, 0xC7, 0xC9, 0xCA, 0xCB, 0xCD, 0xCE, 0xCF)
+
+
+def _pdf_number(value):
+    """格式化 PDF 数值：整数原样输出，小数保留 4 位并去掉多余的 0"""
+    if isinstance(value, int):
+        return str(value)
+    return f"{value:.4f}".rstrip("0").rstrip(".")
+
+
+def jpeg_info(data):
+    """
+    只解析 JPEG 文件头中的 SOF 段，不解码像素
+
+    参数:
+        data (bytes): JPEG 文件内容（至少包含 SOF 段之前的部分）
+
+    返回:
+        tuple|None: (宽, 高, 分量数)；不是 DCTDecode 可直接嵌入的 JPEG 时返回 None
+    """
+    if data[:2] != b"\xff\xd8":
+        return None
+    pos = 2
+    while pos + 4 <= len(data):
+        if data[pos] != 0xFF:
+            return None
+        marker = data[pos + 1]
+        if marker == 0xFF:
+            # 填充字节
+            pos += 1
+            continue
+        if marker == 0x01 or 0xD0 <= marker <= 0xD7:
+            # 无长度字段的独立标记
+            pos += 2
+            continue
+        length = int.from_bytes(data[pos + 2:pos + 4], "big")
+        if marker in _DCT_SOF_MARKERS:
+            if pos + 10 > len(data):
+                return None
+            height = int.from_bytes(data[pos + 5:pos + 7], "big")
+            width = int.from_bytes(data[pos + 7:pos + 9], "big")
+            components = data[pos + 9]
+            if width == 0 or height == 0:
+                return None
+            return width, height, components
+        if marker in _OTHER_SOF_MARKERS or marker == 0xDA:
+            # 不支持的编码方式，或在 SOF 之前就遇到了扫描数据
+            return None
+        pos += 2 + length
+    return None
+
+
+def ccitt_g4_encode(img):
+    """
+    用 Pillow 的 libtiff 把二值图像编码为 CCITT G4 数据
+
+    将整幅图像写成只有一个条带的 G4 TIFF，再从条带偏移 / 长度标签中取出压缩数据，
+    即为 PDF CCITTFaxDecode 可直接使用的数据流。
+
+    参数:
+        img (PIL.Image): 模式为 '1' 的图像
+
+    返回:
+        tuple|None: (G4 数据, BlackIs1)；Pillow 不支持 libtiff 或结果不是单个条带时返回 None
+    """
+    if img.mode != "1" or not features.check("libtiff"):
+        return None
+    buffer = io.BytesIO()
+    # 278 = RowsPerStrip，整幅图像放在一个条带中
+    img.save(buffer, format="TIFF", compression="group4", tiffinfo={278: img.height})
+    buffer.seek(0)
+    with Image.open(buffer) as tiff:
+        offsets = tiff.tag_v2.get(273)
+        byte_counts = tiff.tag_v2.get(279)
+        photometric = tiff.tag_v2.get(262, 0)
+    if not offsets or len(offsets) != 1:
+        return None
+    data = buffer.getvalue()[offsets[0]:offsets[0] + byte_counts[0]]
+    # 传真编码中的“黑色”游程对应 TIFF 的 1 值（MinIsWhite）或 0 值（MinIsBlack，Pillow 的默认写法）
+    return data, photometric == 1
+
+
+class PdfStreamWriter:
+    """
+    按页追加内容的 PDF 写入器
+
+    用法:
+        with PdfStreamWriter(path) as pdf:
+            image_ref = pdf.add_image(pil_image)
+            pdf.add_page(595.28, 841.89, [(image_ref, x, y, w, h)])
+    """
+
+    # 对象 1 为文档目录，对象 2 为页面树，均在 close() 时写出
+    CATALOG_ID = 1
+    PAGES_ID = 2
+
+    def __init__(self, path_or_file):
+        """
+        参数:
+            path_or_file (str|file): 输出文件路径或以二进制方式打开的文件对象
+        """
+        if isinstance(path_or_file, (str, bytes)) or hasattr(path_or_file, "__fspath__"):
+            self._fp = open(path_or_file, "wb")
+            self._owns_fp = True
+        else:
+            self._fp = path_or_file
+            self._owns_fp = False
+        self._offsets = {}
+        self._next_id = 3
+        self._page_ids = []
+        self._closed = False
+        self._write(b"%PDF-1.4\n%\xe2\xe3\xcf\xd3\n")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    @property
+    def page_count(self):
+        return len(self._page_ids)
+
+    def _write(self, data):
+        self._fp.write(data)
+
+    def _tell(self):
+        return self._fp.tell()
+
+    def _allocate(self):
+        obj_id = self._next_id
+        self._next_id += 1
+        return obj_id
+
+    def _write_object(self, obj_id, dictionary, stream=None):
+        """写出一个间接对象；dictionary 为已格式化的 PDF 字典文本"""
+        self._offsets[obj_id] = self._tell()
+        self._write(f"{obj_id} 0 obj\n".encode("ascii"))
+        if stream is None:
+            self._write(dictionary.encode("ascii"))
+        else:
+            self._write(dictionary[:-2].encode("ascii"))
+            self._write(f" /Length {len(stream)} >>\nstream\n".encode("ascii"))
+            self._write(stream)
+            self._write(b"\nendstream")
+        self._write(b"\nendobj\n")
+
+    def add_image_stream(self, data, width, height, color_space, bits=8, filter_name=None, decode_parms=None):
+        """
+        写入已编码的图片数据
+
+        参数:
+            data (bytes): 编码后的图片数据
+            width (int): 像素宽度
+            height (int): 像素高度
+            color_space (str): DeviceRGB / DeviceGray / DeviceCMYK
+            bits (int): 每个分量的位数
+            filter_name (str): 解码过滤器，如 DCTDecode / FlateDecode / CCITTFaxDecode
+            decode_parms (str): 过滤器参数（已格式化的 PDF 字典文本）
+
+        返回:
+            int: 图片对象编号
+        """
+        obj_id = self._allocate()
+        entries = [f"/Type /XObject /Subtype /Image /Width {width} /Height {height}",
+                   f"/ColorSpace /{color_space} /BitsPerComponent {bits}"]
+        if filter_name:
+            entries.append(f"/Filter /{filter_name}")
+        if decode_parms:
+            entries.append(f"/DecodeParms {decode_parms}")
+        if color_space == "DeviceCMYK":
+            # Adobe 写出的 CMYK JPEG 为反相数据
+            entries.append("/Decode [1 0 1 0 1 0 1 0]")
+        self._write_object(obj_id, "<< " + " ".join(entries) + " >>", data)
+        return obj_id
+
+    def add_image(self, img, jpeg_quality=90):
+        """
+        编码并写入 PIL 图像：彩色和灰度图用 JPEG (DCTDecode)，二值图用 CCITT G4，
+        不支持 G4 时用 Flate 压缩
+
+        参数:
+            img (PIL.Image): 图像
+            jpeg_quality (int): JPEG 质量
+
+        返回:
+            int: 图片对象编号
+        """
+        if img.mode == "1":
+            encoded = ccitt_g4_encode(img)
+            if encoded is not None:
+                data, black_is_1 = encoded
+                decode_parms = (f"<< /K -1 /Columns {img.width} /Rows {img.height} "
+                                f"/BlackIs1 {'true' if black_is_1 else 'false'} >>")
+                return self.add_image_stream(data, img.width, img.height, "DeviceGray", 1,
+                                             "CCITTFaxDecode", decode_parms)
+            # PDF 中 1 位灰度 0 表示黑色，与 PIL 一致；每行按字节对齐
+            data = zlib.compress(img.tobytes(), 6)
+            return self.add_image_stream(data, img.width, img.height, "DeviceGray", 1, "FlateDecode")
+        if img.mode not in ("L", "RGB", "CMYK"):
+            img = img.convert("RGB")
+        buffer = io.BytesIO()
+        img.save(buffer, format="JPEG", quality=jpeg_quality)
+        color_space = {"L": "DeviceGray", "RGB": "DeviceRGB", "CMYK": "DeviceCMYK"}[img.mode]
+        return self.add_image_stream(buffer.getvalue(), img.width, img.height, color_space, 8, "DCTDecode")
+
+    def add_jpeg(self, data):
+        """
+        不经解码直接嵌入 JPEG 数据（DCTDecode）
+
+        参数:
+            data (bytes): 完整的 JPEG 文件内容
+
+        返回:
+            int: 图片对象编号
+
+        异常:
+            ValueError: 数据不是可直接嵌入的灰度或 RGB JPEG
+        """
+        info = jpeg_info(data)
+        if info is None or info[2] not in (1, 3):
+            # CMYK JPEG 是否反相取决于 Adobe 标记，统一交给调用方重新编码
+            raise ValueError("不是可直接嵌入的灰度 / RGB JPEG")
+        width, height, components = info
+        color_space = "DeviceGray" if components == 1 else "DeviceRGB"
+        return self.add_image_stream(data, width, height, color_space, 8, "DCTDecode")
+
+    def add_page(self, width, height, images):
+        """
+        写入一页
+
+        参数:
+            width (float): 页面宽度（点，1/72 英寸）
+            height (float): 页面高度（点）
+            images (list[tuple]): (图片对象编号, x, y, 宽, 高)，坐标为点，原点在页面左上角
+
+        返回:
+            int: 页面编号（从 0 开始）
+        """
+        content = []
+        resources = []
+        for number, (image_id, x, y, w, h) in enumerate(images):
+            name = f"Im{number}"
+            resources.append(f"/{name} {image_id} 0 R")
+            # PDF 坐标原点在左下角，需要翻转 y 轴
+            bottom = height - y - h
+            content.append(f"q {_pdf_number(w)} 0 0 {_pdf_number(h)} {_pdf_number(x)} {_pdf_number(bottom)} cm /{name} Do Q")
+        content_data = zlib.compress("\n".join(content).encode("ascii"))
+
+        content_id = self._allocate()
+        self._write_object(content_id, "<< /Filter /FlateDecode >>", content_data)
+
+        page_id = self._allocate()
+        self._write_object(
+            page_id,
+            f"<< /Type /Page /Parent {self.PAGES_ID} 0 R "
+            f"/MediaBox [0 0 {_pdf_number(width)} {_pdf_number(height)}] "
+            f"/Resources << /XObject << {' '.join(resources)} >> >> "
+            f"/Contents {content_id} 0 R >>")
+        self._page_ids.append(page_id)
+        self._fp.flush()
+        return len(self._page_ids) - 1
+
+    def close(self):
+        """写出页面树、目录、交叉引用表和文件尾"""
+        if self._closed:
+            return
+        self._closed = True
+        kids = " ".join(f"{page_id} 0 R" for page_id in self._page_ids)
+        self._write_object(self.PAGES_ID, f"<< /Type /Pages /Kids [{kids}] /Count {len(self._page_ids)} >>")
+        self._write_object(self.CATALOG_ID, f"<< /Type /Catalog /Pages {self.PAGES_ID} 0 R >>")
+
+        xref_offset = self._tell()
+        size = self._next_id
+        lines = [f"xref\n0 {size}\n", "0000000000 65535 f \n"]
+        for obj_id in range(1, size):
+            lines.append(f"{self._offsets[obj_id]:010d} 00000 n \n")
+        self._write("".join(lines).encode("ascii"))
+        self._write(f"trailer\n<< /Size {size} /Root {self.CATALOG_ID} 0 R >>\nstartxref\n{xref_offset}\n%%EOF\n"
+                    .encode("ascii"))
+        if self._owns_fp:
+            self._fp.close()
+        else:
+            self._fp.flush()
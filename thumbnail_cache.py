@@ -0,0 +1,271 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+图片预览缩略图缓存
+
+两级缓存：内存中按占用上限保留最近使用的缩略图，磁盘上按 (路径, 修改时间, 文件大小, 尺寸)
+的哈希保存 JPEG 缩略图，程序重启后再次预览同一批图片也不必重新解码原图；
+磁盘缓存有占用上限，按访问时间淘汰最久未用的文件。
+生成缩略图时通过 image_io 读取原图：JPEG 按 1/2、1/4、1/8 缩小解码，按 EXIF 方向旋转、保持宽高比，
+与其它工具共用进程内的已解码图像缓存。
+prefetch 在后台线程预先生成列表中相邻图片的缩略图，逐张浏览时预览可立即显示。
+"""
+import hashlib
+import os
+import tempfile
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+from loguru import logger
+from PIL import Image
+
+from image_io import image_nbytes, load_image
+
+THUMBNAIL_SIZE = (400, 400)
+DEFAULT_CACHE_DIR = os.path.join(tempfile.gettempdir(), "document_tools_thumbnails")
+
+
+def make_thumbnail(path, size=THUMBNAIL_SIZE):
+    """
+    生成缩略图：按 EXIF 方向旋转，等比缩小到不超过 size
+
+    参数:
+        path (str): 图片路径
+        size (tuple): 缩略图最大 (宽, 高)
+
+    返回:
+        PIL.Image: RGB 缩略图
+    """
+    # 共享的解码缓存中已有原图（如合并时解码过）时直接缩小，否则按缩略图尺寸缩小解码；
+    # 缓存中的图像不可原地修改，用 resize 生成新图像而不是 thumbnail
+    img = load_image(path, size)
+    ratio = min(size[0] / img.width, size[1] / img.height)
+    if ratio < 1:
+        img = img.resize((max(1, round(img.width * ratio)), max(1, round(img.height * ratio))),
+                         Image.Resampling.LANCZOS, reducing_gap=2.0)
+    if img.mode != "RGB":
+        if "A" in img.getbands() or "transparency" in img.info:
+            # 透明区域按白色背景显示
+            background = Image.new("RGB", img.size, "white")
+            background.paste(img, mask=img.convert("RGBA").getchannel("A"))
+            img = background
+        else:
+            img = img.convert("RGB")
+    return img
+
+
+class ThumbnailCache:
+    """
+    内存 + 磁盘两级缩略图缓存，线程安全
+
+    缓存键为 (绝对路径, 修改时间, 文件大小, 缩略图尺寸)，文件被修改后自动重新生成。
+    """
+
+    def __init__(self, size=THUMBNAIL_SIZE, max_bytes=64 * 1024 * 1024, cache_dir=DEFAULT_CACHE_DIR,
+                 workers=2, max_disk_bytes=256 * 1024 * 1024):
+        """
+        参数:
+            size (tuple): 缩略图最大 (宽, 高)
+            max_bytes (int): 内存缓存占用上限（字节）
+            cache_dir (str): 磁盘缓存目录，为 None 时只使用内存缓存
+            workers (int): 后台预取线程数
+            max_disk_bytes (int): 磁盘缓存占用上限（字节），创建时在后台、关闭时清理最久未访问的文件
+        """
+        self.size = tuple(size)
+        self.max_bytes = max_bytes
+        self.max_disk_bytes = max_disk_bytes
+        self.current_bytes = 0
+        self.cache_dir = cache_dir
+        self._items = OrderedDict()
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="thumbnail")
+        self._prefetching = []
+        if cache_dir:
+            try:
+                os.makedirs(cache_dir, exist_ok=True)
+            except OSError as e:
+                logger.warning(f"无法创建缩略图缓存目录 {cache_dir}：{e}")
+                self.cache_dir = None
+        if self.cache_dir:
+            self._executor.submit(self.prune_disk)
+
+    def make_key(self, path):
+        stat = os.stat(path)
+        return os.path.abspath(path), stat.st_mtime_ns, stat.st_size, self.size
+
+    def _disk_path(self, key):
+        digest = hashlib.blake2b(repr(key).encode("utf-8"), digest_size=16).hexdigest()
+        return os.path.join(self.cache_dir, f"{digest}.jpg")
+
+    def peek(self, path):
+        """
+        只查内存缓存，不读磁盘、不解码，可在界面线程中调用
+
+        返回:
+            PIL.Image|None: 缩略图，未缓存时返回 None
+        """
+        try:
+            key = self.make_key(path)
+        except OSError:
+            return None
+        with self._lock:
+            thumbnail = self._items.get(key)
+            if thumbnail is not None:
+                self._items.move_to_end(key)
+            return thumbnail
+
+    def get(self, path):
+        """
+        获取缩略图：依次查内存缓存、磁盘缓存，都未命中时解码原图生成
+
+        参数:
+            path (str): 图片路径
+
+        返回:
+            PIL.Image: RGB 缩略图
+
+        异常:
+            OSError: 图片无法读取或解码
+        """
+        key = self.make_key(path)
+        with self._lock:
+            thumbnail = self._items.get(key)
+            if thumbnail is not None:
+                self._items.move_to_end(key)
+                return thumbnail
+
+        disk_path = self._disk_path(key) if self.cache_dir else None
+        thumbnail = None
+        if disk_path and os.path.exists(disk_path):
+            try:
+                with Image.open(disk_path) as cached:
+                    thumbnail = cached.convert("RGB")
+                # 文件系统可能不更新访问时间（noatime），命中时手动更新，清理时按访问时间淘汰
+                os.utime(disk_path)
+            except OSError:
+                thumbnail = None
+        if thumbnail is None:
+            thumbnail = make_thumbnail(path, self.size)
+            if disk_path:
+                try:
+                    # 先写临时文件再改名，其它线程不会读到写了一半的缩略图
+                    temp_path = f"{disk_path}.{threading.get_ident()}.tmp"
+                    thumbnail.save(temp_path, format="JPEG", quality=90)
+                    os.replace(temp_path, disk_path)
+                except OSError as e:
+                    logger.warning(f"无法写入缩略图缓存：{e}")
+        self._put(key, thumbnail)
+        return thumbnail
+
+    def _put(self, key, thumbnail):
+        size = image_nbytes(thumbnail)
+        with self._lock:
+            if key in self._items:
+                self.current_bytes -= image_nbytes(self._items.pop(key))
+            self._items[key] = thumbnail
+            self.current_bytes += size
+            while self.current_bytes > self.max_bytes and len(self._items) > 1:
+                _, evicted = self._items.popitem(last=False)
+                self.current_bytes -= image_nbytes(evicted)
+
+    def _get_quietly(self, path):
+        try:
+            return self.get(path)
+        except Exception as e:
+            logger.debug(f"预取缩略图失败：{path}：{e}")
+            return None
+
+    def request(self, path, callback):
+        """
+        在后台线程获取缩略图，完成后调用 callback(path, 缩略图或 None)
+
+        回调在后台线程中执行，界面程序应在回调中用 wx.CallAfter 转回界面线程。
+        """
+        def worker():
+            callback(path, self._get_quietly(path))
+
+        self._executor.submit(worker)
+
+    def prefetch(self, paths):
+        """
+        在后台预先生成一组图片的缩略图；新的预取会取消上一次尚未开始的预取
+
+        参数:
+            paths (list[str]): 图片路径，按优先级排列
+        """
+        for future in self._prefetching:
+            future.cancel()
+        self._prefetching = [self._executor.submit(self._get_quietly, path) for path in paths]
+
+    def clear(self):
+        """清空内存缓存（磁盘缓存保留，按键区分新旧文件）"""
+        with self._lock:
+            self._items.clear()
+            self.current_bytes = 0
+
+    def prune_disk(self):
+        """
+        磁盘缓存超过 max_disk_bytes 时按访问时间从旧到新删除文件（包括中断留下的临时文件）
+
+        返回:
+            int: 删除的文件数
+        """
+        if not self.cache_dir:
+            return 0
+        entries = []
+        total = 0
+        try:
+            with os.scandir(self.cache_dir) as it:
+                for entry in it:
+                    try:
+                        if entry.is_file():
+                            stat = entry.stat()
+                            entries.append((max(stat.st_atime, stat.st_mtime), stat.st_size, entry.path))
+                            total += stat.st_size
+                    except OSError:
+                        continue
+        except OSError as e:
+            logger.warning(f"无法读取缩略图缓存目录：{e}")
+            return 0
+        removed = 0
+        for _, size, path in sorted(entries):
+            if total <= self.max_disk_bytes:
+                break
+            try:
+                os.remove(path)
+                total -= size
+                removed += 1
+            except OSError:
+                continue
+        if removed:
+            logger.debug(f"清理缩略图缓存：删除 {removed} 个文件")
+        return removed
+
+    def shutdown(self):
+        """停止后台线程，丢弃尚未开始的预取，并把磁盘缓存清理到上限以内"""
+        self._executor.shutdown(wait=False, cancel_futures=True)
+        self.prune_disk()
+
+    def __len__(self):
+        return len(self._items)
+
+
+def neighbour_paths(paths, index, radius=3):
+    """
+    列表中 index 附近的图片路径，由近及远排列（先后一张、再前一张……）
+
+    参数:
+        paths (list[str]): 图片列表
+        index (int): 当前选中的序号
+        radius (int): 前后各取的数量
+
+    返回:
+        list[str]: 相邻图片路径
+    """
+    result = []
+    for distance in range(1, radius + 1):
+        for neighbour in (index + distance, index - distance):
+            if 0 <= neighbour < len(paths):
+                result.append(paths[neighbour])
+    return result
@@ -2,7 +2,10 @@ import cv2
 import numpy as np
 from loguru import logger
 from PIL import Image,ImageEnhance
+import os
+import sys
 import time
+import inspect
 
 # 定义一个装饰器，用于计算函数的执行时间
 def measure_time(func):
@@ -79,13 +82,15 @@ def bleach_image2(img, blur_size=5):
         logger.error(f"处理图片时出错：{e}")
         return img
 
-def bleach_image(img, blur_size=5):
+def bleach_image(img, blur_size=5, block_size=35, c=15):
     """
     漂白图像：去除背景灰度、保留文字层次并二值化
 
     参数:
         img (PIL.Image): 输入图像
         blur_size (int): 高斯模糊核大小（用于去噪）
+        block_size (int): 自适应阈值的邻域大小（奇数）
+        c (int): 自适应阈值的常数偏移
 
     返回:
         PIL.Image: 漂白后的二值图像
@@ -111,7 +116,7 @@ def bleach_image(img, blur_size=5):
         # 使用自适应阈值进行二值化（比固定阈值更适应光照不均场景）
         binary = cv2.adaptiveThreshold(diff, 255,
                                        cv2.ADAPTIVE_THRESH_GAUSSIAN_C,
-                                       cv2.THRESH_BINARY, 35, 15)
+                                       cv2.THRESH_BINARY, block_size, c)
 
         # 反转图像：背景黑、文字白（可根据后续处理需求决定是否反转）
         # binary = cv2.bitwise_not(binary)
@@ -120,7 +125,7 @@ def bleach_image(img, blur_size=5):
     except  Exception as e:
         logger.error(f"处理图片时出错：{e}")
         return img
-def image_removed_background( img, bg_strength=0.8, blur_size=5):
+def image_removed_background( img, bg_strength=0.8, blur_size=5, block_size=35, c=10):
     """
     获取背景去除后的图像（仅保留前景文本）
 
@@ -128,6 +133,8 @@ def image_removed_background( img, bg_strength=0.8, blur_size=5):
         img (PIL.Image): 输入图像
         bg_strength (float): 背景去除强度
         blur_size (int): 高斯模糊核大小
+        block_size (int): 自适应阈值的邻域大小（奇数）
+        c (int): 自适应阈值的常数偏移
 
     返回:
         PIL.Image: 背景去除后的图像
@@ -140,7 +147,7 @@ def image_removed_background( img, bg_strength=0.8, blur_size=5):
         # Step 2: 高斯模糊 + 自适应阈值处理
         blurred = cv2.GaussianBlur(gray, (blur_size, blur_size), 0)
         binary = cv2.adaptiveThreshold(blurred, 255, cv2.ADAPTIVE_THRESH_GAUSSIAN_C,
-                                       cv2.THRESH_BINARY, 35, 10)
+                                       cv2.THRESH_BINARY, block_size, c)
         binary_inv = cv2.bitwise_not(binary)
 
         # Step 3: 创建背景掩码
@@ -157,7 +164,7 @@ def image_removed_background( img, bg_strength=0.8, blur_size=5):
     except  Exception as e:
         logger.error(f"处理图片时出错：{e}")
         return img
-def enhanced_image( img, bg_strength=0.8, text_strength=1.2, gray_preservation=0.6, blur_size=5):
+def enhanced_image( img, bg_strength=0.8, text_strength=1.2, gray_preservation=0.6, blur_size=5, block_size=35, c=10):
     """
     获取最终增强后的图像（结合对比度增强和灰度保留）
 
@@ -167,6 +174,8 @@ def enhanced_image( img, bg_strength=0.8, text_strength=1.2, gray_preservation=0
         text_strength (float): 文本增强强度
         gray_preservation (float): 灰度保留程度
         blur_size (int): 高斯模糊核大小
+        block_size (int): 自适应阈值的邻域大小（奇数）
+        c (int): 自适应阈值的常数偏移
 
     返回:
         PIL.Image: 增强后的图像
@@ -177,7 +186,7 @@ def enhanced_image( img, bg_strength=0.8, text_strength=1.2, gray_preservation=0
         gray = cv2.cvtColor(img_cv, cv2.COLOR_BGR2GRAY)
         blurred = cv2.GaussianBlur(gray, (blur_size, blur_size), 0)
         binary = cv2.adaptiveThreshold(blurred, 255, cv2.ADAPTIVE_THRESH_GAUSSIAN_C,
-                                       cv2.THRESH_BINARY, 35, 10)
+                                       cv2.THRESH_BINARY, block_size, c)
         binary_inv = cv2.bitwise_not(binary)
 
         # Step 2: 创建背景掩码
@@ -203,7 +212,91 @@ def enhanced_image( img, bg_strength=0.8, text_strength=1.2, gray_preservation=0
     except  Exception as e:
         logger.error(f"处理图片时出错：{e}")
         return img
-    
+
+# 漂白阶段名称与处理函数的对应关系，顺序与界面上的“黑白 / 背景去除 / 优化”一致
+BLEACH_STAGES = {
+    "bleach": bleach_image,
+    "remove_background": image_removed_background,
+    "enhance": enhanced_image,
+}
+
+def check_bleach_params(params):
+    """
+    检查漂白参数名称：只属于其它阶段的参数允许传入（自动参数包含所有阶段的参数），
+    任何阶段都不支持的参数（多为拼写错误）报错，而不是被静默忽略
+
+    异常:
+        ValueError: 存在未知的参数名称
+    """
+    known = {name for func in BLEACH_STAGES.values() for name in inspect.signature(func).parameters} - {"img"}
+    unknown = sorted(set(params or {}) - known)
+    if unknown:
+        raise ValueError(f"未知的漂白参数：{', '.join(unknown)}（可用参数：{', '.join(sorted(known))}）")
+
+
+def apply_bleach_stage(img, stage, params=None):
+    """
+    按阶段名称对图像执行漂白处理
+
+    参数:
+        img (PIL.Image): 输入图像
+        stage (str|int): 阶段名称（见 BLEACH_STAGES）或界面下拉框中的索引
+        params (dict): 处理参数，只传入该阶段函数支持的参数
+
+    返回:
+        PIL.Image: 处理后的图像
+    """
+    if isinstance(stage, int):
+        stage = list(BLEACH_STAGES)[stage]
+    if stage not in BLEACH_STAGES:
+        raise ValueError(f"未知的漂白阶段：{stage}")
+    func = BLEACH_STAGES[stage]
+    check_bleach_params(params)
+    accepted = inspect.signature(func).parameters
+    kwargs = {k: v for k, v in (params or {}).items() if k in accepted}
+    # 处理函数均按 RGB 输入编写，RGBA / 灰度图需先转换
+    if img.mode != "RGB":
+        img = img.convert("RGB")
+    return func(img, **kwargs)
+
+# 以像素为单位的漂白参数及其最小值，换算到其它分辨率时按比例缩放并保持为奇数
+PIXEL_BLEACH_PARAMS = {"blur_size": 1, "block_size": 3}
+
+
+def scale_bleach_params(stage, params, scale):
+    """
+    把以像素为单位的漂白参数（模糊核、阈值邻域）按分辨率比例换算，
+    使低分辨率预览的漂白效果与打印分辨率下一致
+
+    参数:
+        stage (str|int): 阶段名称或索引，未指定的参数取该阶段函数的默认值
+        params (dict): 漂白参数
+        scale (float): 目标分辨率 / 参数对应的分辨率
+
+    返回:
+        dict: 换算后的参数
+    """
+    if isinstance(stage, int):
+        stage = list(BLEACH_STAGES)[stage]
+    accepted = inspect.signature(BLEACH_STAGES[stage]).parameters
+    scaled = dict(params)
+    for name, minimum in PIXEL_BLEACH_PARAMS.items():
+        if name not in accepted:
+            continue
+        value = scaled.get(name, accepted[name].default)
+        value = max(minimum, int(round(value * scale)))
+        scaled[name] = value if value % 2 == 1 else value + 1
+    return scaled
+
+def get_model_path():
+    if hasattr(sys, '_MEIPASS'):
+        # 如果程序是打包后的状态
+        return os.path.join(sys._MEIPASS, os.path.join('models', 'carddetection_scrf.onnx'))
+    else:
+        # 如果是开发状态
+        return os.path.join('models', 'carddetection_scrf.onnx')
+
+
 class SCRFD():
     def __init__(self, onnxmodel, confThreshold=0.5, nmsThreshold=0.5):
         """